@@ -2,6 +2,7 @@
 
 import pandas as pd
 import numpy as np
+from core.data_store import read_ohlcv
 
 class CorrelationAnalysis:
     def __init__(self, data_path="core/data/historical/BTCUSDT_4h.csv"):
@@ -9,7 +10,7 @@ class CorrelationAnalysis:
         self.df = None
 
     def load_data(self):
-        self.df = pd.read_csv(self.data_path)
+        self.df = read_ohlcv(self.data_path)
         self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
 
     def calculate_indicators(self):
@@ -0,0 +1,231 @@
+# analysis/model_tuning.py
+# AI 模型超参数搜索：在训练数据集（core.dataset_builder 生成的版本化特征矩阵）上做带清洗 (purge) 和禁区 (embargo) 的
+# 时间序列交叉验证，进程池并行评估所有参数组合，报告每组参数的准确率和校准指标，并把最优参数在全量数据上重新训练后写入模型注册表。
+#
+# - 标签使用未来 5 根 K 线的收益：测试段之前 5 根以内的训练样本的标签与测试段重叠，训练时剔除 (purge)；
+#   测试段之后 embargo 根内的样本与测试段高度相关，也不参与训练；
+# - 早停：每个折的训练段再切出最后一部分作为早停验证集（与测试段无关，不泄漏测试信息）；
+# - 折缓存：每个工作进程中每个折的 QuantileDMatrix 只构建一次，所有参数组合共用；
+# - 每个工作进程的 XGBoost 使用单线程，进程数默认等于 CPU 核数；
+# - 形态概率特征按实盘推理的窗口长度 (SERVING_WINDOW) 计算，写入注册表的模型与实盘输入的特征口径一致。
+#
+# 用法：python -m analysis.model_tuning core/data/historical/BTCUSDT_4h_new.csv --param max_depth=3,5,7 --param learning_rate=0.05,0.1,0.3
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import accuracy_score, brier_score_loss, log_loss
+
+from analysis.param_sweep import expand_grid, parse_grid, sample_random
+from core.ai_model import MODEL_PARAMS, BoosterModel, native_params
+from core.dataset_builder import build_dataset
+from core.feature_frame import AI_FEATURES
+from core.model_registry import ModelRegistry, default_registry
+
+LABEL_HORIZON = 5 # 标签使用的未来 K 线数（与 FeatureFrame._build_label 一致）
+SERVING_WINDOW = 200 # 实盘计算特征的 K 线窗口长度（run_live.py 传给 LiveEngine 的 warmup_bars）
+
+DEFAULT_GRID = {
+    "max_depth": [3, 5, 7],
+    "learning_rate": [0.05, 0.1, 0.3],
+    "min_child_weight": [1, 5],
+}
+
+# 工作进程内共享的数据与折缓存（由 _init_worker 初始化）
+_WORKER_STATE = {}
+
+
+def purged_kfold(n, n_folds=5, horizon=LABEL_HORIZON, embargo=None, valid_frac=0.15):
+    """
+    带清洗和禁区的时间序列 K 折划分，返回 [(fit_idx, valid_idx, test_idx), ...]。
+    测试段为连续区间；训练样本剔除 [测试起点 - horizon, 测试终点 + embargo) 范围；
+    训练样本按时间排序后最后 valid_frac 作为早停验证集，与其余训练样本之间再隔开 horizon。
+    """
+    embargo = horizon if embargo is None else embargo
+    bounds = np.linspace(0, n, n_folds + 1, dtype=int)
+    index = np.arange(n)
+    folds = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        train = index[(index < lo - horizon) | (index >= hi + embargo)]
+        cut = int(len(train) * (1 - valid_frac))
+        fit, valid = train[:max(0, cut - horizon)], train[cut:]
+        folds.append((fit, valid, index[lo:hi]))
+    return folds
+
+
+def expected_calibration_error(y_true, prob, n_bins=10):
+    """按预测概率分箱的期望校准误差：各箱 |平均预测概率 - 实际正例比例| 的样本加权平均"""
+    bins = np.minimum((prob * n_bins).astype(int), n_bins - 1)
+    ece = 0.0
+    for b in range(n_bins):
+        mask = bins == b
+        if mask.any():
+            ece += mask.mean() * abs(prob[mask].mean() - y_true[mask].mean())
+    return float(ece)
+
+
+def _init_worker(X, y, folds):
+    _WORKER_STATE["X"] = X
+    _WORKER_STATE["y"] = y
+    _WORKER_STATE["folds"] = folds
+    _WORKER_STATE["cache"] = {}
+
+
+def _fold_matrices(k, max_bin):
+    """第 k 折的 (训练 DMatrix, 早停 DMatrix, 测试特征, 测试标签)，同一进程内按 (折, max_bin) 缓存"""
+    key = (k, max_bin)
+    if key not in _WORKER_STATE["cache"]:
+        X, y = _WORKER_STATE["X"], _WORKER_STATE["y"]
+        fit, valid, test = _WORKER_STATE["folds"][k]
+        dtrain = xgb.QuantileDMatrix(X[fit], label=y[fit], max_bin=max_bin, nthread=1)
+        dvalid = xgb.QuantileDMatrix(X[valid], label=y[valid], ref=dtrain, nthread=1)
+        _WORKER_STATE["cache"][key] = (dtrain, dvalid, np.ascontiguousarray(X[test]), y[test])
+    return _WORKER_STATE["cache"][key]
+
+
+def evaluate_params(point, early_stopping_rounds=20):
+    """对一组参数跑完所有折，返回指标行（各折平均）"""
+    params, max_rounds = native_params({**MODEL_PARAMS, **point})
+    max_bin = int(params.pop("max_bin", 256))
+    params.update({"objective": "binary:logistic", "tree_method": "hist", "eval_metric": "logloss", "nthread": 1})
+
+    scores = []
+    for k in range(len(_WORKER_STATE["folds"])):
+        dtrain, dvalid, X_test, y_test = _fold_matrices(k, max_bin)
+        booster = xgb.train(params, dtrain, num_boost_round=max_rounds, evals=[(dvalid, "valid")],
+                            early_stopping_rounds=early_stopping_rounds, verbose_eval=False)
+        best = booster.best_iteration + 1
+        prob = booster.inplace_predict(X_test, iteration_range=(0, best))
+        scores.append({
+            "accuracy": accuracy_score(y_test, prob > 0.5),
+            "log_loss": log_loss(y_test, np.clip(prob, 1e-7, 1 - 1e-7), labels=[0, 1]),
+            "brier": brier_score_loss(y_test, prob),
+            "ece": expected_calibration_error(y_test, prob),
+            "best_rounds": best,
+        })
+    summary = pd.DataFrame(scores)
+    row = dict(point)
+    for name in summary.columns:
+        row[name] = summary[name].mean()
+    row["accuracy_std"] = summary["accuracy"].std()
+    return row
+
+
+def _evaluate_job(job):
+    point, early_stopping_rounds = job
+    return evaluate_params(point, early_stopping_rounds)
+
+
+def run_tuning(X, y, points, n_folds=5, embargo=None, max_workers=None, early_stopping_rounds=20, sort_by="log_loss"):
+    """
+    并行评估所有参数组合，返回按 sort_by 排序的结果表（log_loss / brier / ece 升序，其余降序）。
+
+    Args:
+        X (np.ndarray): 特征矩阵（按时间排序）。
+        y (np.ndarray): 0/1 标签。
+        points (list): 参数字典列表（expand_grid / sample_random 的结果），键为 XGBoost 参数名。
+        n_folds (int): 交叉验证折数。
+        embargo (int): 测试段之后不参与训练的样本数，默认等于标签周期。
+        max_workers (int): 进程数，None 时使用 CPU 核数。
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    folds = purged_kfold(len(X), n_folds, embargo=embargo)
+    jobs = [(point, early_stopping_rounds) for point in points]
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(jobs)))
+    print(f"[Tuning] {len(points)} parameter sets x {n_folds} folds on {len(X)} samples, {max_workers} workers.")
+
+    if max_workers == 1:
+        _init_worker(X, y, folds)
+        rows = [_evaluate_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+            rows = list(pool.map(_evaluate_job, jobs))
+
+    table = pd.DataFrame(rows)
+    ascending = sort_by in ("log_loss", "brier", "ece")
+    return table.sort_values(sort_by, ascending=ascending, kind="stable").reset_index(drop=True)
+
+
+def row_params(row, param_names):
+    """从结果表的一行取出参数字典（结果表中整数参数会被 pandas 转为浮点数，这里转换回来）"""
+    point = {}
+    for name in param_names:
+        value = row[name].item() if hasattr(row[name], "item") else row[name]
+        point[name] = int(value) if isinstance(value, float) and value.is_integer() else value
+    return point
+
+
+def publish_best(X, y, best_row, param_names, registry=None, metadata=None, nthread=None):
+    """用最优参数在全部数据上训练（树的数量取交叉验证的平均早停轮数），保存为注册表的新版本，返回版本号"""
+    point = row_params(best_row, param_names)
+    params, _ = native_params({**MODEL_PARAMS, **point})
+    max_bin = int(params.pop("max_bin", 256))
+    params.update({"objective": "binary:logistic", "tree_method": "hist"})
+    if nthread:
+        params["nthread"] = nthread
+    rounds = max(1, int(round(best_row["best_rounds"])))
+    dtrain = xgb.QuantileDMatrix(np.ascontiguousarray(X, dtype=np.float32), label=np.asarray(y, dtype=np.float32), max_bin=max_bin)
+    model = BoosterModel(xgb.train(params, dtrain, num_boost_round=rounds))
+
+    cv = {name: float(best_row[name]) for name in ("accuracy", "accuracy_std", "log_loss", "brier", "ece") if name in best_row}
+    registry = registry or default_registry()
+    return registry.save(model, None, {"features": AI_FEATURES, "engine": "native",
+                                       "params": {**MODEL_PARAMS, **point, "n_estimators": rounds}, "cv": cv, **(metadata or {})})
+
+
+def load_training_data(data_file, max_workers=None, pattern_window=SERVING_WINDOW):
+    """
+    读取（或构建）数据文件的训练数据集，剔除特征缺失和未来收益未知（最后 5 根）的样本。
+    形态概率只统计最近 pattern_window 根 K 线，与实盘在固定窗口上计算的特征一致。
+    """
+    dataset, version = build_dataset(data_file, max_workers=max_workers, pattern_window=pattern_window)
+    dataset = dataset[dataset["future_return"].notna()]
+    X = dataset[AI_FEATURES].dropna()
+    y = dataset["label"].loc[X.index]
+    return X.to_numpy(dtype=np.float32), y.to_numpy(dtype=np.float32), version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartBTC AI 模型超参数搜索")
+    parser.add_argument("data_file", help="训练数据文件，例如 core/data/historical/BTCUSDT_4h_new.csv")
+    parser.add_argument("--param", action="append", default=[], help="搜索参数，格式 key=v1,v2,... 可重复（默认内置网格）")
+    parser.add_argument("--random", type=int, default=0, help="随机搜索点数 (0 表示完整网格)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--embargo", type=int, default=None)
+    parser.add_argument("--max-rounds", type=int, default=500, help="早停前的最大树数量")
+    parser.add_argument("--early-stopping", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--pattern-window", type=int, default=SERVING_WINDOW, help="形态概率特征的窗口长度（应与实盘窗口一致）")
+    parser.add_argument("--sort-by", default="log_loss")
+    parser.add_argument("--output", default="logs/ai_tuning_results.csv")
+    parser.add_argument("--registry", default=None, help="模型注册表目录（默认 models/registry）")
+    parser.add_argument("--no-publish", action="store_true", help="只报告结果，不把最优模型写入注册表")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.param) if args.param else DEFAULT_GRID
+    points = sample_random(grid, args.random, seed=args.seed) if args.random else expand_grid(grid)
+    points = [dict(point, n_estimators=args.max_rounds) for point in points]
+
+    X, y, version = load_training_data(args.data_file, max_workers=args.workers, pattern_window=args.pattern_window)
+    results = run_tuning(X, y, points, n_folds=args.folds, embargo=args.embargo, max_workers=args.workers,
+                         early_stopping_rounds=args.early_stopping, sort_by=args.sort_by)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"[Tuning] Results saved to: {args.output}")
+    print(results.head(20).to_string(index=False))
+
+    if not args.no_publish:
+        registry = ModelRegistry(args.registry) if args.registry else None
+        best = results.iloc[0]
+        saved = publish_best(X, y, best, list(grid), registry=registry,
+                             metadata={"dataset": f"{os.path.basename(args.data_file)} v{version}",
+                                       "pattern_window": args.pattern_window})
+        best_params = row_params(best, grid)
+        print(f"[Tuning] Best parameters {best_params} saved as registry version {saved}. "
+              f"Set ai_model.params to use them for rolling retraining.")
@@ -0,0 +1,212 @@
+# analysis/param_sweep.py
+# 参数扫描：对 settings.yaml 的风控 / 策略 / 市场状态参数做网格或随机搜索，进程池并行回测，结果写成列式表格便于排序。
+#
+# 扫描参数使用点号路径表示，例如：
+#   risk.sl_atr_multiplier, risk.tp_atr_multiplier, risk.max_position_risk_pct
+#   signal_generator.mean_reversion.rsi_low / rsi_high
+#   signal_generator.trend_following.short_ma / long_ma（adx_threshold 不参与 TrendFollowStrategy.check 的判断，扫描它不会改变信号）
+#   signal_generator.market_state.trend_cutoff / range_cutoff
+#
+# 只影响资金管理的参数（risk.* / 手续费 / 滑点）不改变策略规则，但会改变哪些 K 线跳过 AI 滚动训练（与逐根回测一致），
+# 因此同一组信号参数共用一个 SignalCollector：已训练的模型和已收集的信号在风控组合之间复用，
+# 再用向量化快速回测评估每个组合；与参数无关的特征帧在每个工作进程中只计算一次。
+
+import argparse
+import contextlib
+import copy
+import io
+import itertools
+import os
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core.config_loader import load_config
+from core.data_store import read_ohlcv
+from core.fast_backtest import SignalCollector, run_fast_backtest
+from core.feature_frame import FeatureFrame
+
+# 不影响信号生成、只影响资金曲线的参数
+RISK_ONLY_PREFIX = "risk."
+RISK_ONLY_KEYS = ("binance.commission_rate", "trading.slippage_base_rate")
+
+# 工作进程内共享的数据与特征（由 _init_worker 初始化）
+_WORKER_STATE = {}
+
+
+def expand_grid(grid):
+    """{"risk.sl_atr_multiplier": [1.5, 2.0], ...} -> 所有组合的覆盖字典列表"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def sample_random(space, n, seed=42):
+    """
+    随机搜索。space 中的值可以是候选列表（随机选取）或 (low, high) 元组（均匀采样；两端都是整数时采样整数）。
+    """
+    rng = random.Random(seed)
+    points = []
+    for _ in range(n):
+        point = {}
+        for key, spec in space.items():
+            if isinstance(spec, tuple):
+                low, high = spec
+                point[key] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+            else:
+                point[key] = rng.choice(list(spec))
+        points.append(point)
+    return points
+
+
+def apply_overrides(config, overrides):
+    """返回应用了点号路径覆盖后的配置副本（Config 对象返回新的 Config）"""
+    if hasattr(config, "with_overrides"):
+        return config.with_overrides(overrides)
+    config = copy.deepcopy(config)
+    for path, value in overrides.items():
+        node = config
+        *parents, leaf = path.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return config
+
+
+def is_risk_only(key):
+    return key.startswith(RISK_ONLY_PREFIX) or key in RISK_ONLY_KEYS
+
+
+def group_by_signal_params(points):
+    """按影响信号的参数分组：同组内只需生成一次信号"""
+    groups = OrderedDict()
+    for point in points:
+        signal_key = tuple(sorted((k, v) for k, v in point.items() if not is_risk_only(k)))
+        groups.setdefault(signal_key, []).append(point)
+    return groups
+
+
+def _init_worker(data_file, base_config):
+    df = read_ohlcv(data_file)
+    _WORKER_STATE["data_file"] = data_file
+    _WORKER_STATE["df"] = df
+    _WORKER_STATE["config"] = base_config
+    _WORKER_STATE["features"] = FeatureFrame(df)
+
+
+def evaluate_group(df, config, signal_overrides, points, start_index, data_file="", features=None, quiet=True, liquidate_at_end=False):
+    """
+    评估一组信号参数：组内共用一个 SignalCollector，按每个风控组合收集信号（复用已训练的模型和信号）并快速回测。
+    返回 (rows, signals)，rows 为每个参数点的摘要字典，signals 为最后一个参数点的信号数组。
+    """
+    config = apply_overrides(config, dict(signal_overrides))
+    output = io.StringIO() if quiet else None
+    rows, signals = [], None
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        try:
+            collector = SignalCollector(df, config, start_index, features=features)
+        except Exception as e:
+            print(f"[Sweep] ERROR: signal generation failed for {dict(signal_overrides)}: {e}")
+            return [{**point, "error": str(e)} for point in points], None
+
+        for point in points:
+            point_config = apply_overrides(config, point)
+            try:
+                signals = collector.signals(point_config)
+            except Exception as e:
+                print(f"[Sweep] ERROR: signal generation failed for {point}: {e}")
+                rows.append({**point, "error": str(e)})
+                continue
+            summary = run_fast_backtest(df, signals, point_config, start_index=start_index, data_file=data_file,
+                                        atr=collector.atr, liquidate_at_end=liquidate_at_end)
+            rows.append({**point, **summary})
+    return rows, signals
+
+
+def _run_group(job):
+    """在工作进程中运行一组信号参数"""
+    signal_overrides, points, quiet = job
+    config = _WORKER_STATE["config"]
+    start_index = config.get("ai_model", {}).get("window_size", 180) + 20
+    rows, _ = evaluate_group(_WORKER_STATE["df"], config, signal_overrides, points, start_index,
+                             data_file=_WORKER_STATE["data_file"], features=_WORKER_STATE["features"], quiet=quiet)
+    return rows
+
+
+def run_sweep(data_file, base_config, points, max_workers=None, output_path="logs/sweep_results.parquet", sort_by="pnl_pct", quiet=True):
+    """
+    运行参数扫描。
+
+    Args:
+        data_file (str): 回测数据文件。
+        base_config (dict): 基础配置。
+        points (list): 覆盖字典列表（expand_grid / sample_random 的结果）。
+        max_workers (int): 进程数，None 时读取 backtest.max_workers，仍为空则使用 CPU 核数。
+        output_path (str): 结果表保存路径（.parquet 需要 pyarrow，否则自动改存 .csv）。
+        sort_by (str): 排序指标。
+        quiet (bool): 是否屏蔽工作进程中信号生成的逐根日志。
+
+    Returns:
+        pd.DataFrame: 每个参数点一行，按 sort_by 降序排列。
+    """
+    groups = group_by_signal_params(points)
+    jobs = [(signal_key, group_points, quiet) for signal_key, group_points in groups.items()]
+    if max_workers is None:
+        max_workers = base_config.get("backtest", {}).get("max_workers") or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(jobs)))
+    print(f"[Sweep] {len(points)} parameter points in {len(jobs)} signal groups, {max_workers} workers.")
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(data_file, base_config)) as pool:
+        for group_rows in pool.map(_run_group, jobs):
+            rows.extend(group_rows)
+
+    table = pd.DataFrame(rows)
+    if sort_by in table.columns:
+        table = table.sort_values(sort_by, ascending=False, kind="stable").reset_index(drop=True)
+
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        try:
+            table.to_parquet(output_path, index=False)
+        except ImportError:
+            output_path = os.path.splitext(output_path)[0] + ".csv"
+            table.to_csv(output_path, index=False)
+        print(f"[Sweep] Results saved to: {output_path}")
+    return table
+
+
+def _parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_grid(specs):
+    """["risk.sl_atr_multiplier=1.5,2,2.5", ...] -> {"risk.sl_atr_multiplier": [1.5, 2, 2.5], ...}"""
+    grid = {}
+    for spec in specs:
+        key, values = spec.split("=", 1)
+        grid[key] = [_parse_value(v) for v in values.split(",")]
+    return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartBTC 参数扫描")
+    parser.add_argument("data_file", help="回测数据文件，例如 core/data/historical/BTCUSDT_4h_split_part_1.csv")
+    parser.add_argument("--param", action="append", default=[], help="扫描参数，格式 key=v1,v2,... 可重复")
+    parser.add_argument("--random", type=int, default=0, help="随机搜索点数 (0 表示完整网格)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="logs/sweep_results.parquet")
+    parser.add_argument("--sort-by", default="pnl_pct")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.param)
+    points = sample_random(grid, args.random, seed=args.seed) if args.random else expand_grid(grid)
+    results = run_sweep(args.data_file, load_config(), points, max_workers=args.workers, output_path=args.output, sort_by=args.sort_by)
+    print(results.head(20).to_string(index=False))
@@ -0,0 +1,188 @@
+# analysis/walk_forward.py
+# 滚动前推（walk-forward）优化：在样本内（IS）窗口上扫描参数选出最优组合，再在紧随其后的样本外（OOS）窗口上回测。
+# 各窗口的优化相互独立，使用进程池并行；OOS 资金曲线按时间顺序拼接（上一窗口的期末资金作为下一窗口的初始资金），
+# 得到一条连续的组合资金曲线，替代 run_backtest 中“各分段 PnL 简单相加”的近似做法。
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from analysis.param_sweep import apply_overrides, evaluate_group, expand_grid, group_by_signal_params, parse_grid
+from core.config_loader import load_config
+from core.data_store import read_ohlcv
+from core.fast_backtest import run_fast_backtest
+from core.feature_frame import FeatureFrame
+
+_WORKER_STATE = {}
+
+
+def walk_forward_windows(total_rows, in_sample, out_of_sample, warmup, anchored=False, step=None):
+    """
+    生成 (is_start, is_end, oos_start, oos_end) 索引窗口（左闭右开）。
+
+    Args:
+        total_rows (int): 数据总行数。
+        in_sample (int): 样本内窗口长度（含 warmup）。
+        out_of_sample (int): 样本外窗口长度。
+        warmup (int): 指标 / AI 特征的预热长度，OOS 回测会向前借用这么多根 K 线作为预热。
+        anchored (bool): True 时样本内窗口起点固定为 0（锚定式），否则随窗口滚动。
+        step (int): 窗口步长，默认等于 out_of_sample。
+    """
+    if in_sample < warmup:
+        return []
+    step = step or out_of_sample
+    windows = []
+    is_end = in_sample
+    while is_end < total_rows:
+        is_start = 0 if anchored else is_end - in_sample
+        windows.append((is_start, is_end, is_end, min(is_end + out_of_sample, total_rows)))
+        is_end += step
+    return windows
+
+
+def _init_worker(df, base_config):
+    _WORKER_STATE["df"] = df
+    _WORKER_STATE["config"] = base_config
+    _WORKER_STATE["features"] = FeatureFrame(df) # 整段特征每个进程只计算一次，各窗口切片复用
+
+
+def _optimize_window(job):
+    """在工作进程中处理一个窗口：样本内扫描参数，选出最优后生成样本外信号"""
+    window_id, (is_start, is_end, oos_start, oos_end), points, warmup, metric = job
+    df = _WORKER_STATE["df"]
+    features = _WORKER_STATE["features"]
+    base_config = _WORKER_STATE["config"]
+
+    # 1. 样本内：逐组生成信号并评估所有参数点
+    is_df = df.iloc[is_start:is_end]
+    is_features = features.tail(is_end - 1, is_end - is_start)
+    rows = []
+    for signal_key, group_points in group_by_signal_params(points).items():
+        group_rows, _ = evaluate_group(is_df, base_config, signal_key, group_points, warmup, features=is_features)
+        rows.extend(group_rows)
+    table = pd.DataFrame(rows)
+    if metric in table.columns:
+        table = table.sort_values(metric, ascending=False, kind="stable")
+    best = {k: v for k, v in table.iloc[0].items() if k in points[0]} if len(table) else {}
+    best_is_metric = table.iloc[0].get(metric) if len(table) else None
+
+    # 2. 样本外：用最优参数生成信号（向前借 warmup 根 K 线预热，不使用 OOS 之后的数据）。
+    #    训练点的跳过按配置的初始资金模拟；仓位与资金同比例缩放，拼接时换成上一窗口的期末资金不改变开平仓判断
+    #    （仅数量保留 6 位小数的舍入可能有极小差异）
+    oos_from = oos_start - warmup
+    oos_df = df.iloc[oos_from:oos_end]
+    oos_features = features.tail(oos_end - 1, oos_end - oos_from)
+    signal_key = tuple(sorted(best.items()))
+    _, signals = evaluate_group(oos_df, base_config, signal_key, [{}], warmup, features=oos_features)
+    return {
+        "window": window_id,
+        "is_range": (is_start, is_end),
+        "oos_range": (oos_start, oos_end),
+        "best_params": best,
+        "best_is_metric": best_is_metric,
+        "oos_signals": signals,
+    }
+
+
+def run_walk_forward(df, base_config, points, in_sample=730, out_of_sample=180, anchored=False, step=None,
+                     metric="pnl_pct", max_workers=None):
+    """
+    运行滚动前推优化。
+
+    Args:
+        df (pd.DataFrame): 完整历史数据。
+        base_config (dict): 基础配置。
+        points (list): 候选参数点（覆盖字典列表）；为空时只做样本外回测，不做优化。
+        in_sample / out_of_sample (int): 样本内 / 样本外窗口长度（K 线数）。
+        anchored (bool): 是否锚定样本内起点。
+        metric (str): 样本内选优指标。
+        max_workers (int): 进程数，None 时读取 backtest.max_workers，仍为空则使用 CPU 核数。
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): 每个窗口的摘要表、拼接后的 OOS 资金曲线。
+    """
+    df = df.reset_index(drop=True)
+    points = points or [{}]
+    warmup = base_config.get("ai_model", {}).get("window_size", 180) + 20
+    windows = walk_forward_windows(len(df), in_sample, out_of_sample, warmup, anchored=anchored, step=step)
+    if not windows:
+        print(f"[WalkForward] ❌ Not enough data for one window (rows: {len(df)}, in-sample: {in_sample}, warmup: {warmup}).")
+        return pd.DataFrame(), pd.DataFrame()
+
+    if max_workers is None:
+        max_workers = base_config.get("backtest", {}).get("max_workers") or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(windows)))
+    print(f"[WalkForward] {len(windows)} windows ({'anchored' if anchored else 'rolling'}), {len(points)} candidate points, {max_workers} workers.")
+
+    jobs = [(k, window, points, warmup, metric) for k, window in enumerate(windows, 1)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(df, base_config)) as pool:
+        results = list(pool.map(_optimize_window, jobs))
+
+    # 3. 按时间顺序拼接 OOS 资金曲线：资金在窗口之间连续传递，窗口结束时平掉未平仓头寸
+    balance = base_config.get("risk", {}).get("initial_balance", 10000.0)
+    atr = FeatureFrame(df)['atr'].to_numpy()
+    summary_rows = []
+    equity = [{"timestamp": df['timestamp'].iloc[windows[0][2]], "balance": balance, "window": 0}]
+    for result in results:
+        oos_start, oos_end = result["oos_range"]
+        oos_from = oos_start - warmup
+        if result["oos_signals"] is None:
+            print(f"[WalkForward] WARNING: window {result['window']} has no OOS signals, skipping.")
+            continue
+        config = apply_overrides(base_config, result["best_params"])
+        config = apply_overrides(config, {"risk.initial_balance": balance})
+        summary, trades = run_fast_backtest(df.iloc[oos_from:oos_end], result["oos_signals"], config, start_index=warmup,
+                                            atr=atr[oos_from:oos_end], return_trades=True, liquidate_at_end=True)
+        for trade in trades:
+            if trade["pnl"] is not None:
+                equity.append({"timestamp": df['timestamp'].iloc[oos_from + trade["exit_index"]],
+                               "balance": equity[-1]["balance"] + trade["pnl"], "window": result["window"]})
+        summary_rows.append({
+            "window": result["window"],
+            "is_start": df['timestamp'].iloc[result["is_range"][0]],
+            "oos_start": df['timestamp'].iloc[oos_start],
+            "oos_end": df['timestamp'].iloc[oos_end - 1],
+            **{f"best.{k}": v for k, v in result["best_params"].items()},
+            "best_is_metric": result["best_is_metric"],
+            "oos_initial_balance": balance,
+            "oos_final_balance": summary["final_balance"],
+            "oos_pnl_pct": summary["pnl_pct"],
+            "oos_num_trades": summary["num_trades"],
+        })
+        balance = summary["final_balance"]
+
+    equity_curve = pd.DataFrame(equity)
+    return pd.DataFrame(summary_rows), equity_curve
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartBTC 滚动前推优化")
+    parser.add_argument("--data-file", default="core/data/historical/BTCUSDT_4h_new.csv")
+    parser.add_argument("--param", action="append", default=[], help="样本内扫描参数，格式 key=v1,v2,... 可重复")
+    parser.add_argument("--in-sample", type=int, default=730)
+    parser.add_argument("--out-of-sample", type=int, default=180)
+    parser.add_argument("--anchored", action="store_true")
+    parser.add_argument("--metric", default="pnl_pct")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output-dir", default="logs")
+    args = parser.parse_args()
+
+    config = load_config()
+    data = read_ohlcv(args.data_file)
+    windows_table, equity_curve = run_walk_forward(
+        data, config, expand_grid(parse_grid(args.param)) if args.param else [],
+        in_sample=args.in_sample, out_of_sample=args.out_of_sample, anchored=args.anchored,
+        metric=args.metric, max_workers=args.workers
+    )
+    if not windows_table.empty:
+        print("\n====== Walk-Forward Summary ======")
+        print(windows_table.to_string(index=False))
+        initial = config.get("risk", {}).get("initial_balance", 10000.0)
+        final = equity_curve["balance"].iloc[-1]
+        print(f"\nStitched OOS equity: {initial:.2f} -> {final:.2f} USDT ({(final / initial - 1) * 100:.2f}%)")
+        os.makedirs(args.output_dir, exist_ok=True)
+        windows_table.to_csv(os.path.join(args.output_dir, "walk_forward_windows.csv"), index=False)
+        equity_curve.to_csv(os.path.join(args.output_dir, "walk_forward_equity.csv"), index=False)
+        print(f"Results saved to: {args.output_dir}/walk_forward_windows.csv, {args.output_dir}/walk_forward_equity.csv")
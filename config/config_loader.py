@@ -1,5 +1,3 @@
-import yaml
-import os
-def load_config(path="config/settings.yaml"):
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
\ No newline at end of file
+# config/config_loader.py
+# 兼容旧的导入路径：统一使用 core.config_loader（缓存、合并默认值并校验后的不可变 Config）
+from core.config_loader import Config, ConfigError, load_config
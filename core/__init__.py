@@ -1,9 +1,10 @@
 # core/__init__.py
 
 from .ai_model import AIPredictor
-from .config_loader import load_config
+from .config_loader import Config, ConfigError, load_config
 from .data_loader import MarketDataLoader
 from .executor import TradeExecutor
+from .feature_frame import FeatureFrame
 from .market_state import MarketStateDetector
 from .notifier import Notifier
 from .risk_manager import RiskManager
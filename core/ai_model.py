@@ -1,100 +1,313 @@
 # ai_model.py
 
+import numpy as np
 import pandas as pd
-import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import accuracy_score
-import joblib
-from utils.indicators import calculate_rsi, calculate_bollinger_bands, calculate_adx, detect_hammer, detect_doji, detect_engulfing, calculate_pattern_probability, calc_macd, calc_stochrsi
+import os
+from core.feature_frame import FeatureFrame, AI_FEATURES
+from core.data_store import read_ohlcv
+from core.inference import EXPORT_PATH, FastPredictor, export_model, meta_path
+from core.model_registry import default_registry, training_key
+
+# xgboost / sklearn 只在训练或加载 pickle 模型时导入：xgboost 包导入时会连带导入 sklearn（约 2 秒），
+# 实盘使用导出的模型 (FastPredictor) 时完全不需要它们。
+
+# prepare_features 输出的特征列（训练只使用其中的 AI_FEATURES）
+FEATURE_COLUMNS = ['rsi', 'ma', 'std', 'upper', 'lower', 'bb_width', 'adx', 'volume_change', 'macd', 'macd_signal', 'stoch_rsi', 'hammer_up_prob', 'doji_up_prob', 'engulfing_up_prob', 'trend', 'volume_trend', 'volatility', 'price_range']
+
+# XGBoost 模型参数（参与缓存键：参数变化后不会命中旧模型）
+MODEL_PARAMS = {"max_depth": 5, "n_estimators": 100, "random_state": 42}
+
+
+class BoosterModel:
+    """
+    原生 XGBoost Booster 的轻量包装，提供与 XGBClassifier 相同的 predict_proba / get_booster 接口。
+    推理直接对连续的 float32 数组调用 inplace_predict，不构建 DMatrix，也不经过 sklearn 包装层。
+    """
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def get_booster(self):
+        return self.booster
+
+    def predict_proba(self, X):
+        p1 = self.booster.inplace_predict(np.ascontiguousarray(X, dtype=np.float32))
+        return np.column_stack([1 - p1, p1])
+
+
+def fit_booster(X, y, params=None, num_boost_round=100, xgb_model=None, nthread=None):
+    """
+    原生训练路径：float32 连续数组 + QuantileDMatrix + hist。树模型对单调缩放不敏感，因此不需要 scaler。
+
+    Args:
+        X: 特征矩阵（任意数值数组，内部转为 C 连续的 float32）。
+        params (dict): XGBoost 原生参数（max_depth / seed 等），会补上 objective / tree_method / nthread。
+        xgb_model: 在此 Booster 的基础上继续训练（warm start）。
+        nthread (int): 训练 / 推理线程数，None 表示使用全部核心。
+    """
+    import xgboost as xgb
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float32)
+    params = {"objective": "binary:logistic", "tree_method": "hist", **(params or {})}
+    if nthread:
+        params["nthread"] = nthread
+    dtrain = xgb.QuantileDMatrix(X, label=y, nthread=nthread or -1)
+    return BoosterModel(xgb.train(params, dtrain, num_boost_round=num_boost_round, xgb_model=xgb_model))
+
+
+def native_params(params):
+    """把 MODEL_PARAMS 风格的 sklearn 参数转换为 xgb.train 参数，返回 (params, num_boost_round)"""
+    params = dict(params)
+    rounds = params.pop("n_estimators", 100)
+    if "random_state" in params:
+        params["seed"] = params.pop("random_state")
+    return params, rounds
 
 class AIPredictor:
-    def __init__(self, data_path="core/data/historical/BTCUSDT_4h.csv", model_path="models/xgboost_model.pkl", window_size=180):
+    def __init__(self, data_path="core/data/historical/BTCUSDT_4h.csv", model_path="models/xgboost_model.pkl", window_size=180,
+                 scaler_path="models/scaler.pkl", registry=None, config=None):
+        """
+        Args:
+            model_path / scaler_path: 旧版单文件模型路径（不再加载：这些模型训练时的形态概率特征与当前的逐根因果计算不同）。
+            registry (ModelRegistry): 模型注册表，默认使用进程内共享的注册表。
+            config (dict): 完整配置；ai_model 段可覆盖 window_size / model_path / scaler_path，并设置滚动训练方式：
+                retrain_mode: "full" 每次从头训练 (默认) / "warm_start" 在上一个模型的基础上追加树；
+                warm_start_rounds: warm_start 每次追加的树数量；
+                max_trees: warm_start 模型的树总数上限，超过后重新完整训练一次；
+                engine: "native" 使用 float32 + QuantileDMatrix 的原生训练 / 推理且不做缩放 (默认)，
+                        "sklearn" 使用 XGBClassifier + MinMaxScaler；
+                nthread: XGBoost 线程数，留空使用全部核心；
+                export_path: export() 导出的原生格式模型路径，存在且不旧于注册表最新版本时 load() 优先使用；
+                params: 覆盖 MODEL_PARAMS 的模型参数（例如 analysis.model_tuning 搜索得到的最优参数）。
+        """
+        ai_cfg = (config or {}).get("ai_model", {})
         self.data_path = data_path
-        self.model_path = model_path
-        self.window_size = window_size
+        self.model_path = ai_cfg.get("model_path", model_path)
+        self.scaler_path = ai_cfg.get("scaler_path", scaler_path)
+        self.window_size = ai_cfg.get("window_size", window_size)
+        self.retrain_mode = ai_cfg.get("retrain_mode", "full")
+        self.warm_start_rounds = ai_cfg.get("warm_start_rounds", 20)
+        self.max_trees = ai_cfg.get("max_trees", 400)
+        self.engine = ai_cfg.get("engine", "native")
+        self.nthread = ai_cfg.get("nthread")
+        self.model_params = {**MODEL_PARAMS, **(ai_cfg.get("params") or {})}
+        self.export_path = ai_cfg.get("export_path", EXPORT_PATH)
+        self.registry = registry or default_registry()
         self.model = None
-        self.scaler = MinMaxScaler()
+        self.model_version = None
+        self.scaler = None
+        self.model_key = None # 当前模型对应的训练缓存键（从磁盘加载时为 None）
         self.df = None
+        self.retrain_interval = ai_cfg.get("retrain_interval", 7 * 6)
+        self._batch_features = None # attach_batch 绑定的整段特征帧
+        self._batch_root = None
+        self._batch_offset = 0
+        self._batch_matrix = None
+        self._batch_pred = None # 按 K 线索引缓存的批量预测结果（-1 表示尚未计算）
+        self._batch_conf = None
 
     def load_data(self):
-        self.df = pd.read_csv(self.data_path)
+        self.df = read_ohlcv(self.data_path)
         self.df['timestamp'] = pd.to_datetime(self.df['timestamp'])
 
-    def prepare_features(self, df=None):
+    def prepare_features(self, df=None, features=None):
         if df is None:
             if self.df is None:
                 self.load_data()
-            df = self.df.copy()
-        else:
-            df = df.copy()
-
-        # 计算特征
-        df['rsi'] = calculate_rsi(df['close'], window=14)
-        df = calculate_bollinger_bands(df, window=20)
-        df['bb_width'] = (df['upper'] - df['lower']) / df['ma']
-        df['adx'] = calculate_adx(df)
-        df['volume_change'] = df['volume'] / df['volume'].shift(1)
-        df['macd'], df['macd_signal'], _ = calc_macd(df['close'])
-        df['stoch_rsi'] = calc_stochrsi(df['close'])
-        df['hammer_up_prob'], _ = calculate_pattern_probability(df, detect_hammer, lookback=5)
-        df['doji_up_prob'], _ = calculate_pattern_probability(df, detect_doji, lookback=5)
-        df['engulfing_up_prob'], _ = calculate_pattern_probability(df, lambda d: detect_engulfing(d)[0] and detect_engulfing(d)[1] == "bullish", lookback=5)
-        df['trend'] = df['close'].pct_change(5).shift(1)
-        df['volume_trend'] = df['volume'].pct_change(5).shift(1)
-        df['volatility'] = df['close'].rolling(20).std()
-        df['price_range'] = (df['high'] - df['low']) / df['close']
-
-        # 标签：未来5根K线的涨跌分类
-        df['future_return'] = df['close'].shift(-5) / df['close'] - 1
-        df['label'] = (df['future_return'] > 0).astype(int)
-
-        return df
-
-    def train_rolling(self, df):
+            df = self.df
+
+        # 复用调用方传入的特征帧（同一数据窗口），否则自行构建
+        if features is None or not features.matches(df):
+            features = FeatureFrame(df)
+
+        # 计算特征；标签：未来5根K线的涨跌分类
+        return features.frame(FEATURE_COLUMNS + ['future_return', 'label'])
+
+    def _use(self, entry, key=None):
+        self.model = entry["model"]
+        self.scaler = entry["scaler"]
+        self.model_key = key
+        self.model_version = entry["metadata"].get("version") # 注册表版本（内存中训练的模型为 None）
+        self._batch_pred = self._batch_conf = None # 模型变化后批量预测缓存失效
+
+    def _num_trees(self):
+        return self.model.get_booster().num_boosted_rounds() if self.model is not None else 0
+
+    def train_rolling(self, df, features=None):
+        """
+        用最近 window_size 根 K 线训练模型。结果只放入注册表的内存缓存（不写磁盘）：
+        同一训练窗口和特征集再次训练时直接复用缓存的模型。需要持久化时调用 save()。
+
+        retrain_mode 为 "warm_start" 时（且当前模型由本进程训练得到）：
+        - 复用调用方传入的特征帧 features（对应 df 的整段特征，只切片不重算，标签按窗口重新计算）；
+        - 沿用上一个模型的 scaler，在上一个 booster 的基础上只追加 warm_start_rounds 棵树 (xgb_model=)；
+        - 树的总数超过 max_trees 时重新完整训练，避免模型无限增长。
+        """
         if len(df) < self.window_size + 5:
             print("Not enough data for training")
             return False
 
-        df = self.prepare_features(df.iloc[-self.window_size:])
-        features = ['rsi', 'bb_width', 'adx', 'volume_change', 'macd', 'stoch_rsi', 'hammer_up_prob', 'engulfing_up_prob', 'trend', 'volume_trend', 'volatility', 'price_range']
-        X = df[features].dropna()
-        y = df['label'].loc[X.index]
+        warm = (self.retrain_mode == "warm_start" and self.model_key is not None
+                and self._num_trees() + self.warm_start_rounds <= self.max_trees)
+        window = df.iloc[-self.window_size:]
+        params = dict(self.model_params, engine=self.engine)
+        if warm:
+            # 缓存键包含上一个模型的键：同一条训练链（相同数据、相同节奏）才会命中
+            params.update(n_estimators=self.warm_start_rounds, warm_start_from="|".join(map(str, self.model_key)))
+        key = training_key(window, AI_FEATURES, params)
+        cached = self.registry.get(key)
+        if cached is not None:
+            self._use(cached, key)
+            return True
+
+        if warm and features is not None and features.matches(df):
+            window_features = features.tail(len(df) - 1, self.window_size)
+        else:
+            window_features = FeatureFrame(window)
+        # 只取训练用的 12 个特征和标签（不复制整张特征表）
+        X = pd.DataFrame({name: window_features[name] for name in AI_FEATURES}).dropna()
+        y = window_features['label'].loc[X.index]
 
         if len(X) < 50:
             print("Not enough data points for training after feature preparation")
             return False
 
-        X_scaled = self.scaler.fit_transform(X)
-        X_scaled = pd.DataFrame(X_scaled, columns=X.columns, index=X.index)
+        model_params = {k: v for k, v in params.items() if k not in ("engine", "warm_start_from")}
+        previous = self.model.get_booster() if warm else None
+        if self.engine == "native":
+            scaler = None
+            xgb_params, rounds = native_params(model_params)
+            model = fit_booster(X.to_numpy(dtype=np.float32), y.to_numpy(), xgb_params, rounds, xgb_model=previous, nthread=self.nthread)
+        else:
+            import xgboost as xgb
+            from sklearn.preprocessing import MinMaxScaler
 
-        self.model = xgb.XGBClassifier(max_depth=5, n_estimators=100, random_state=42)
-        self.model.fit(X_scaled, y)
+            if warm:
+                scaler = self.scaler # 已有的树基于这个缩放训练，追加的树必须使用相同的缩放
+                X_scaled = scaler.transform(X)
+            else:
+                scaler = MinMaxScaler()
+                X_scaled = scaler.fit_transform(X)
+            X_scaled = pd.DataFrame(X_scaled, columns=X.columns, index=X.index)
+            model = xgb.XGBClassifier(**model_params, n_jobs=self.nthread)
+            model.fit(X_scaled, y, xgb_model=previous)
 
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, "models/scaler.pkl")
+        metadata = {"features": AI_FEATURES, "params": params, "window": [str(v) for v in key[:3]], "rows": len(X),
+                    "trees": model.get_booster().num_boosted_rounds()}
+        self._use(self.registry.put(key, model, scaler, metadata), key)
         return True
 
-    def predict(self, df):
+    def save(self):
+        """把当前模型保存为注册表中的新版本（原子写入），返回版本号"""
         if self.model is None:
-            print("No model found, training with rolling window...")
-            self.train_rolling(df)
+            raise ValueError("No model to save; train or load one first")
+        entry = self.registry.get(self.model_key) if self.model_key is not None else None
+        metadata = entry["metadata"] if entry else {"features": AI_FEATURES, "params": self.model_params}
+        self.model_version = self.registry.save(self.model, self.scaler, metadata)
+        return self.model_version
 
-        df = self.prepare_features(df)
-        features = ['rsi', 'bb_width', 'adx', 'volume_change', 'macd', 'stoch_rsi', 'hammer_up_prob', 'engulfing_up_prob', 'trend', 'volume_trend', 'volatility', 'price_range']
-        X = df[features].iloc[-1:]
+    def load(self, version=None, prefer_export=True):
+        """
+        从注册表加载指定版本（默认最新），注册表为空时返回 False（predict 随后用当前窗口训练）。
+        旧版 model_path / scaler_path 的 pickle 模型不会被加载：它们基于变更前的形态概率特征训练，与实盘输入的特征不一致。
+        未指定版本且 export_path 上有来自注册表、且不旧于注册表最新版本的导出模型时，直接加载为 FastPredictor（不导入 xgboost / sklearn）。
+        """
+        if version is None and prefer_export and self._load_export():
+            return True
+        entry = self.registry.load(version)
+        if entry is None:
+            return False
+        self._use(entry)
+        return True
 
+    def _load_export(self):
+        if not os.path.exists(self.export_path) or not os.path.exists(meta_path(self.export_path)):
+            return False
+        model = FastPredictor(self.export_path)
+        exported, latest = model.metadata.get("registry_version"), self.registry.latest_version()
+        if model.features != AI_FEATURES or exported is None or (latest is not None and exported < latest):
+            print(f"[AIPredictor] Exported model {self.export_path} is stale (registry version {latest}); run python export_model.py to re-export.")
+            model.close()
+            return False
+        self._use({"model": model, "scaler": None, "metadata": model.metadata})
+        self.model_version = exported
+        return True
+
+    def export(self, path=None):
+        """把当前模型导出为 XGBoost 原生格式（scaler 折算进元数据），返回导出路径"""
         if self.model is None:
-            self.model = joblib.load(self.model_path)
-            self.scaler = joblib.load("models/scaler.pkl")
+            raise ValueError("No model to export; train or load one first")
+        return export_model(self.model, self.scaler, path or self.export_path, AI_FEATURES,
+                            {"registry_version": self.model_version})
+
+    # --- 推理 ---
+    def predict_batch(self, X):
+        """
+        对特征矩阵 X（列顺序为 AI_FEATURES）的每一行做一次性推理（单次 predict_proba 调用）。
+        返回 (predictions: int64 数组, confidences: 预测类别的概率)。
+        """
+        if self.scaler is not None:
+            X = self.scaler.transform(pd.DataFrame(X, columns=AI_FEATURES))
+        prob = self.model.predict_proba(X)
+        predictions = (prob[:, 1] > 0.5).astype(np.int64) # 与 XGBClassifier.predict 的二分类阈值一致
+        confidences = np.where(predictions == 1, prob[:, 1], prob[:, 0])
+        return predictions, confidences
+
+    def attach_batch(self, features, segment=None):
+        """
+        绑定回测整段的特征帧。之后 predict 收到该特征帧的 tail() 子窗口时，
+        按 K 线索引查表：缓存未命中时一次性为从该索引开始的 segment 根 K 线（默认一个滚动训练周期）批量推理。
+        模型重新训练后缓存自动失效。
+        """
+        self._batch_features = features
+        # features 本身也可能是 tail() 子窗口（走步分析）：查询时的 end 是相对整段的索引，需要减去偏移
+        self._batch_root = features.parent if features.parent is not None else features
+        self._batch_offset = features.end + 1 - len(features.df) if features.parent is not None else 0
+        self._batch_matrix = None
+        self._batch_pred = self._batch_conf = None
+        self.batch_segment = segment or self.retrain_interval
+
+    def _batch_lookup(self, i):
+        if self._batch_matrix is None:
+            dtype = np.float32 if self.engine == "native" else np.float64
+            self._batch_matrix = np.column_stack([self._batch_features[name].to_numpy(dtype=dtype) for name in AI_FEATURES])
+        if self._batch_pred is None:
+            n = len(self._batch_matrix)
+            self._batch_pred = np.full(n, -1, dtype=np.int64)
+            self._batch_conf = np.zeros(n, dtype=np.float32)
+        if self._batch_pred[i] < 0:
+            stop = min(i + self.batch_segment, len(self._batch_matrix))
+            self._batch_pred[i:stop], self._batch_conf[i:stop] = self.predict_batch(self._batch_matrix[i:stop])
+        return self._batch_pred[i], self._batch_conf[i]
+
+    def predict(self, df, features=None):
+        if self.model is None and not self.load():
+            # 没有任何已保存的模型：用当前窗口训练一次（只在内存中）
+            print("No saved model found, training with rolling window...")
+            if not self.train_rolling(df):
+                raise ValueError("No AI model available and not enough data to train one")
+
+        # 回测：特征帧是 attach_batch 绑定的整段特征帧的子窗口时直接查表
+        if self._batch_features is not None and features is not None and features.parent is self._batch_root and features.matches(df):
+            i = features.end - self._batch_offset
+            if 0 <= i < len(self._batch_features.df):
+                return self._batch_lookup(i)
 
-        X_scaled = self.scaler.transform(X)
-        prediction = self.model.predict(X_scaled)[0]
-        prob = self.model.predict_proba(X_scaled)[0]
-        confidence = prob[1] if prediction == 1 else prob[0]
-        return prediction, confidence
+        if features is None or not features.matches(df):
+            features = FeatureFrame(df)
+        if isinstance(self.model, FastPredictor):
+            # 实盘：特征直接写入预分配的 float32 行缓冲区，单次 C 调用推理
+            row = self.model.row[0]
+            for j, name in enumerate(AI_FEATURES):
+                row[j] = features[name].iloc[-1]
+            return self.model.predict_row()
+        X = np.array([[features[name].iloc[-1] for name in AI_FEATURES]], dtype=np.float32 if self.engine == "native" else np.float64)
+        predictions, confidences = self.predict_batch(X)
+        return predictions[0], confidences[0]
 
 if __name__ == "__main__":
     predictor = AIPredictor()
     predictor.load_data()
-    predictor.train_rolling(predictor.df)
\ No newline at end of file
+    if predictor.train_rolling(predictor.df):
+        predictor.save()
\ No newline at end of file
@@ -0,0 +1,233 @@
+# core/backtest_engine.py
+# 事件驱动回测引擎：整段数据的特征只计算一次，逐根 K 线按索引推进，不再每步复制前缀窗口。
+# 每根 K 线的处理顺序与原 run_backtest 循环完全一致：先检查 SL/TP 退出，再处理信号，最后滚动训练 AI 模型。
+
+import pandas as pd
+from core.feature_frame import FeatureFrame
+
+
+class BacktestEngine:
+    def __init__(self, df, config, signal_generator, executor, risk, start_index, window_length=None, retrain_interval=7 * 6):
+        """
+        Args:
+            df (pd.DataFrame): 完整的回测数据。
+            config (dict): 配置字典。
+            signal_generator / executor / risk: 已初始化好的组件。
+            start_index (int): 回测起点索引。
+            window_length (int): 每根 K 线交给信号生成器的尾部窗口长度，需覆盖最长的指标/训练回看期，默认等于 start_index。
+            retrain_interval (int): AI 模型滚动训练间隔（K 线数）。
+        """
+        self.df = df.reset_index(drop=True)
+        self.symbol = config.get("trading", {}).get("symbol", "BTC/USDT")
+        self.signal_generator = signal_generator
+        self.executor = executor
+        self.risk = risk
+        self.start_index = start_index
+        self.window_length = window_length or start_index
+        self.retrain_interval = retrain_interval
+
+        # 整段数据只计算一次特征（所有指标均为因果计算，与逐段前缀计算结果一致）
+        self.features = FeatureFrame(self.df)
+        self.high = self.df['high'].to_numpy()
+        self.low = self.df['low'].to_numpy()
+        self.close = self.df['close'].to_numpy()
+        self.timestamps = self.df['timestamp'].tolist()
+
+        self.logs = []
+        self.active_trade = None # None 表示无持仓, 否则存储交易详情 e.g., {'entry_price': X, 'amount': Y, 'sl': Z, 'tp': W}
+
+    def run(self):
+        """运行主循环，返回交易日志列表"""
+        atr = self.features['atr'].to_numpy()
+        # AI 推理按滚动训练周期批量计算并按索引缓存，信号生成时直接查表
+        self.signal_generator.predictor.attach_batch(self.features, segment=self.retrain_interval)
+        print(f"[Backtest] Starting main loop from index {self.start_index}...")
+        for i in range(self.start_index, len(self.df)):
+            latest_atr = atr[i] if pd.notna(atr[i]) else 0.0
+            self._on_bar(i, latest_atr)
+        return self.logs
+
+    def _window(self, i):
+        """第 i 根 K 线对应的尾部窗口及其特征帧（切片视图，不复制整段历史）"""
+        start = max(0, i + 1 - self.window_length)
+        return self.df.iloc[start:i + 1], self.features.tail(i, self.window_length)
+
+    def _on_bar(self, i, atr):
+        risk = self.risk
+        executor = self.executor
+        symbol = self.symbol
+
+        window_df, window_features = self._window(i)
+        executor.update_data(window_df, atr=atr) # 更新 executor 的数据用于滑点计算
+
+        current_price_high = self.high[i]
+        current_price_low = self.low[i]
+        current_price_close = self.close[i] # 通常用收盘价做决策，但 SL/TP 可能被 H/L 触发
+        current_timestamp = self.timestamps[i]
+
+        # 打印进度 (可选)
+        if i % 100 == 0:
+            print(f"[Backtest] Processing index {i}/{len(self.df)-1} | Time: {current_timestamp} | Balance: {risk.current_balance:.2f}")
+
+        # --- 检查是否触发止损或止盈 (优先处理退出) ---
+        if self.active_trade:
+            triggered_exit_price = None
+            exit_reason = None
+
+            # 检查止损 (假设做多，检查最低价是否低于止损价)
+            if current_price_low <= self.active_trade['sl']:
+                triggered_exit_price = self.active_trade['sl'] # 假设在止损价精确成交 (更保守)
+                exit_reason = "Stop Loss"
+            # 检查止盈 (假设做多，检查最高价是否高于止盈价)
+            elif current_price_high >= self.active_trade['tp']:
+                triggered_exit_price = self.active_trade['tp'] # 假设在止盈价精确成交 (更保守)
+                exit_reason = "Take Profit"
+
+            if triggered_exit_price is not None:
+                print(f"[Backtest] {i}: {exit_reason} triggered at price ~{triggered_exit_price:.2f}!")
+                exit_order = {
+                    "symbol": symbol,
+                    "action": "sell",
+                    "amount": self.active_trade['amount'], # 卖出持有的全部数量
+                    "price": triggered_exit_price, # 使用触发价格作为信号价 (模拟时执行价会被滑点调整)
+                    "timestamp": current_timestamp,
+                    "structure": f"exit_{exit_reason.lower().replace(' ', '_')}",
+                    "confidence": 1.0 # 强制退出
+                }
+                print(f"[Backtest] {i}: Attempting to execute {exit_reason} exit SELL order. Amount: {self.active_trade['amount']:.8f}")
+                result = executor.execute(exit_order)
+                if result and result.get("pnl") is not None:
+                    self.logs.append(result)
+                    pnl_from_trade = result["pnl"]
+                    risk.update_balance(pnl_from_trade) # 更新余额
+                    print(f"[Backtest] {i}: {exit_reason} SELL executed. PnL: {pnl_from_trade:.2f}, New Balance: {risk.current_balance:.2f}")
+                else:
+                    print(f"[Backtest] {i}: {exit_reason} SELL execution failed or no PnL returned. Critical error simulation might be needed.")
+                    # 在真实交易中，如果退出失败是非常严重的问题
+                # 即使执行失败，也假设已尝试平仓，避免循环尝试
+                self.active_trade = None
+                # 本轮已执行退出，跳过后续的入场信号检查
+                return
+
+        # --- 检查风控是否暂停交易 ---
+        # (将检查放在这里，避免在触发SL/TP退出后还阻止退出)
+        if not risk.validate_trade(0, 0): # 传入虚拟值触发检查 trading_paused
+            if self.active_trade: # 如果有持仓，即使暂停也要允许因信号平仓
+                print(f"[Backtest] {i}: Trading paused (Max Drawdown), but holding position. Checking for SELL signal...")
+            else:
+                return # 如果无持仓且暂停，则跳过
+
+        # --- 生成交易信号 ---
+        signal = None
+        try:
+            signal = self.signal_generator.generate(window_df, features=window_features)
+        except Exception as e:
+            print(f"[Backtest] {i}: ERROR during signal generation: {e}")
+
+        # --- 处理入场和信号平仓 ---
+        if signal:
+            action = signal["action"]
+            confidence = signal.get("confidence", 0.0) # 确保 confidence 存在
+            structure = signal.get("structure", "unknown")
+
+            if action == "buy" and self.active_trade is None:
+                if not self._enter(i, atr, confidence, structure, current_price_close, current_timestamp):
+                    return
+            elif action == "sell" and self.active_trade is not None:
+                self._exit_on_signal(i, confidence, structure, current_price_close, current_timestamp)
+
+        # --- AI 模型滚动训练 ---
+        if i > self.start_index and i % self.retrain_interval == 0:
+            print(f"[Backtest] {i}: Updating AI model...")
+            try:
+                self.signal_generator.predictor.train_rolling(window_df, features=window_features)
+            except Exception as e:
+                print(f"[Backtest] WARNING: AI model rolling update failed at index {i}: {e}")
+
+    def _enter(self, i, atr, confidence, structure, current_price_close, current_timestamp):
+        """处理买入信号 (仅当无持仓时)。返回 False 表示本根 K 线剩余步骤（含滚动训练）应被跳过"""
+        risk = self.risk
+        if risk.trading_paused: # 再次检查，如果刚才是因为持仓而没跳过
+            print(f"[Backtest] {i}: Trading paused (Max Drawdown). Skipping BUY signal.")
+            return False
+
+        print(f"[Backtest] {i}: BUY signal received. Confidence: {confidence:.2f}. Current Price: {current_price_close:.2f}")
+
+        # a. ATR (已预先计算)
+        if atr <= 0:
+            print(f"[Backtest] {i}: ATR calculation failed or returned zero. Skipping BUY.")
+            return False
+
+        # b. 计算止损价
+        stop_loss_price, take_profit_price = risk.calculate_sl_tp_prices(current_price_close, atr, "buy")
+        if stop_loss_price is None or stop_loss_price <= 0 or take_profit_price is None or take_profit_price <= stop_loss_price:
+            print(f"[Backtest] {i}: Failed to calculate valid SL/TP prices (SL: {stop_loss_price}, TP: {take_profit_price}). Skipping BUY.")
+            return False
+        print(f"[Backtest] {i}: Calculated SL: {stop_loss_price:.2f}, TP: {take_profit_price:.2f} (ATR: {atr:.4f})")
+
+        # c. 计算基于风险的头寸规模 (单位: BTC)
+        order_size_btc = risk.calculate_position_size(
+            entry_price=current_price_close,
+            stop_loss_price=stop_loss_price,
+            symbol=self.symbol
+        )
+        if order_size_btc <= 0:
+            print(f"[Backtest] {i}: Calculated position size is zero or negative ({order_size_btc:.8f}). Check risk settings or balance. Skipping BUY.")
+            return False
+        print(f"[Backtest] {i}: Calculated dynamic position size: {order_size_btc:.8f} BTC")
+
+        # d. 验证交易 (风控暂停和资金)
+        if not risk.validate_trade(order_size_btc, current_price_close):
+            required_quote_approx = order_size_btc * current_price_close
+            print(f"[Backtest] {i}: Trade validation failed (Risk paused or insufficient funds). Required USDT: ~{required_quote_approx:.2f}, Balance: {risk.current_balance:.2f}. Skipping BUY.")
+            return False
+
+        # e. 创建并执行订单
+        order = {
+            "symbol": self.symbol,
+            "action": "buy",
+            "amount": order_size_btc,  # 使用动态计算的 BTC 数量
+            "price": current_price_close, # 信号价格
+            "timestamp": current_timestamp,
+            "structure": structure,
+            "confidence": confidence,
+        }
+        print(f"[Backtest] {i}: Attempting to execute BUY order...")
+        result = self.executor.execute(order)
+
+        if result and result.get('amount') > 0: # 确保成功执行且数量大于0
+            self.logs.append(result)
+            self.active_trade = {
+                'entry_price': result['price'], # 记录实际执行价格
+                'amount': result['amount'],     # 记录实际执行数量
+                'sl': stop_loss_price,          # 记录止损价
+                'tp': take_profit_price,        # 记录止盈价
+                'entry_time': current_timestamp
+            }
+            print(f"[Backtest] {i}: BUY executed successfully. Amount: {result['amount']:.8f}, Exec Price: {result['price']:.2f}. Active Trade: {self.active_trade}")
+        else:
+            print(f"[Backtest] {i}: BUY execution failed or resulted in zero amount.")
+        return True
+
+    def _exit_on_signal(self, i, confidence, structure, current_price_close, current_timestamp):
+        """处理卖出信号 (仅当有持仓时，作为平仓信号)"""
+        print(f"[Backtest] {i}: SELL signal received (Exit Signal). Confidence: {confidence:.2f}. Exiting current position.")
+        exit_order = {
+            "symbol": self.symbol,
+            "action": "sell",
+            "amount": self.active_trade['amount'], # 卖出持有的全部数量
+            "price": current_price_close,    # 使用当前收盘价作为信号价
+            "timestamp": current_timestamp,
+            "structure": f"exit_signal_{structure}", # 标记为信号退出
+            "confidence": confidence
+        }
+        print(f"[Backtest] {i}: Attempting to execute SELL order (Signal Exit). Amount: {self.active_trade['amount']:.8f}")
+        result = self.executor.execute(exit_order)
+        if result and result.get("pnl") is not None:
+            self.logs.append(result)
+            pnl_from_trade = result["pnl"]
+            self.risk.update_balance(pnl_from_trade) # 更新余额
+            print(f"[Backtest] {i}: SELL executed (Signal Exit). PnL: {pnl_from_trade:.2f}, New Balance: {self.risk.current_balance:.2f}")
+        else:
+            print(f"[Backtest] {i}: SELL execution (Signal Exit) failed or no PnL returned.")
+        self.active_trade = None # 即使失败也假设尝试退出
@@ -1,6 +1,13 @@
 # core/config_loader.py
-import yaml
+# 配置加载：settings.yaml 只解析一次（按路径和修改时间缓存），与 DEFAULT_CONFIG 深度合并并校验后，
+# 返回不可变的 Config 对象。Config 同时支持字典式访问 (config.get("risk", {}).get(...)) 和属性访问 (config.risk.initial_balance)，
+# 可以直接 pickle 传给回测 / 参数扫描的子进程。
+import copy
 import os
+import threading
+from collections.abc import Mapping
+
+import yaml
 
 DEFAULT_CONFIG = {
     "binance": {
@@ -33,43 +40,210 @@ DEFAULT_CONFIG = {
         "model_path": "models/xgboost_model.pkl",
         "scaler_path": "models/scaler.pkl",
         "window_size": 180,
-        "confidence_threshold": 0.6 # AI 预测置信度阈值示例
+        "confidence_threshold": 0.6, # AI 预测置信度阈值示例
+        "retrain_interval": 42, # 回测中滚动训练的间隔 (K 线数)
+        "retrain_mode": "full", # full: 每次从头训练; warm_start: 在上一个模型上追加树
+        "warm_start_rounds": 20,
+        "max_trees": 400,
+        "engine": "native", # native: float32 + QuantileDMatrix, 不做缩放; sklearn: XGBClassifier + MinMaxScaler
+        "nthread": None, # XGBoost 线程数 (留空使用全部核心)
+        "export_path": "models/export/xgboost.ubj", # 实盘推理使用的导出模型 (python export_model.py 生成)
+        "params": {} # 覆盖默认模型参数 (max_depth / n_estimators / learning_rate ...)，可使用 analysis.model_tuning 的搜索结果
     },
      "trading": { # 新增：交易相关配置
         "symbol": "BTC/USDT",
         "timeframe": "4h",
         "slippage_base_rate": 0.0005 # 基础滑点率
+    },
+    "live": { # 实盘引擎
+        "mode": "stream",
+        "ws_url": None,
+        "paper_trading": False,
+        "balance_interval": 60,
+        "order_poll_interval": 5
+    },
+    "backtest": {
+        "max_workers": None
     }
 }
 
+
+class ConfigError(ValueError):
+    """配置校验失败"""
+
+
+def _freeze(value):
+    if isinstance(value, Config):
+        return value
+    if isinstance(value, Mapping):
+        return Config(value)
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, Config):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class Config(Mapping):
+    """
+    不可变的配置对象（嵌套字典自动转换为 Config，列表转换为元组）。
+    兼容 dict 的只读接口，因此现有的 config.get("risk", {}).get(...) 写法无需修改；
+    需要修改时用 with_overrides() 得到新对象，或用 to_dict() 得到可变副本。
+    """
+    __slots__ = ("_data",)
+
+    def __init__(self, data=None):
+        object.__setattr__(self, "_data", {str(k): _freeze(v) for k, v in (data or {}).items()})
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getattr__(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise TypeError("Config is immutable; use with_overrides() or to_dict()")
+
+    def __delattr__(self, name):
+        raise TypeError("Config is immutable; use with_overrides() or to_dict()")
+
+    def __reduce__(self):
+        # 子进程中直接用已冻结的数据重建，不重复合并 / 校验
+        return (self.__class__, (self._data,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"Config({self.to_dict()!r})"
+
+    def to_dict(self):
+        """返回可变的普通字典（深拷贝）"""
+        return _thaw(self)
+
+    def with_overrides(self, overrides):
+        """返回应用了点号路径覆盖 ({"risk.initial_balance": 500}) 后的新 Config"""
+        data = self.to_dict()
+        for path, value in overrides.items():
+            node = data
+            *parents, leaf = path.split(".")
+            for key in parents:
+                node = node.setdefault(key, {})
+            node[leaf] = value
+        return Config(data)
+
+
+def deep_merge(base, override):
+    """递归合并两个字典，override 中的值优先；返回新字典，不修改输入"""
+    merged = copy.deepcopy(dict(base))
+    for key, value in (override or {}).items():
+        if isinstance(merged.get(key), Mapping) and (value is None or isinstance(value, Mapping)):
+            merged[key] = deep_merge(merged[key], value) # 空的 YAML 段落 (None) 保留默认值
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def validate_config(config):
+    """检查关键参数的类型和取值范围，有问题时抛出 ConfigError（列出全部问题）"""
+    errors = []
+
+    def number(section, key, low=None, high=None, inclusive_low=False):
+        value = config.get(section, {}).get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append(f"{section}.{key} must be a number, got {value!r}")
+            return
+        if low is not None and (value < low or (value == low and not inclusive_low)):
+            errors.append(f"{section}.{key} must be {'>=' if inclusive_low else '>'} {low}, got {value}")
+        if high is not None and value > high:
+            errors.append(f"{section}.{key} must be <= {high}, got {value}")
+
+    number("risk", "initial_balance", 0)
+    number("risk", "sl_atr_multiplier", 0)
+    number("risk", "tp_atr_multiplier", 0)
+    number("risk", "max_drawdown_pct", 0, 1)
+    number("risk", "max_position_risk_pct", 0, 1)
+    number("binance", "commission_rate", 0, 1, inclusive_low=True)
+    number("trading", "slippage_base_rate", 0, 1, inclusive_low=True)
+    number("ai_model", "window_size", 0)
+    number("ai_model", "retrain_interval", 0)
+    number("ai_model", "warm_start_rounds", 0)
+    number("ai_model", "max_trees", 0)
+    number("live", "balance_interval", 0)
+    number("live", "order_poll_interval", 0)
+
+    trading_cfg = config.get("trading", {})
+    if "/" not in str(trading_cfg.get("symbol", "")):
+        errors.append(f"trading.symbol must look like 'BASE/QUOTE', got {trading_cfg.get('symbol')!r}")
+    try:
+        from core.downloader import timeframe_to_ms
+        timeframe_to_ms(str(trading_cfg.get("timeframe")))
+    except (ValueError, KeyError):
+        errors.append(f"trading.timeframe is not a valid timeframe: {trading_cfg.get('timeframe')!r}")
+    if config.get("ai_model", {}).get("retrain_mode") not in ("full", "warm_start"):
+        errors.append(f"ai_model.retrain_mode must be 'full' or 'warm_start', got {config.get('ai_model', {}).get('retrain_mode')!r}")
+    if config.get("ai_model", {}).get("engine") not in ("native", "sklearn"):
+        errors.append(f"ai_model.engine must be 'native' or 'sklearn', got {config.get('ai_model', {}).get('engine')!r}")
+    if config.get("live", {}).get("mode") not in ("stream", "poll"):
+        errors.append(f"live.mode must be 'stream' or 'poll', got {config.get('live', {}).get('mode')!r}")
+
+    if errors:
+        raise ConfigError("Invalid configuration:\n  - " + "\n  - ".join(errors))
+    return config
+
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
 def load_config(path="config/settings.yaml"):
     """
-    加载配置。如果文件不存在或无法解析，则返回默认配置。
+    加载配置并返回不可变的 Config 对象。
+    文件内容与 DEFAULT_CONFIG 深度合并后校验；结果按 (路径, 修改时间) 缓存，重复调用不会重新读取和解析文件。
+    如果文件不存在或无法解析，则使用默认配置。
     """
-    if os.path.exists(path):
+    abs_path = os.path.abspath(path)
+    mtime = os.stat(abs_path).st_mtime_ns if os.path.exists(abs_path) else None
+    key = (abs_path, mtime)
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            return _CACHE[key]
+
+    loaded_config = {}
+    if mtime is not None:
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                loaded_config = yaml.safe_load(f)
-                # 可以考虑在这里合并默认配置和加载的配置，以确保所有键都存在
-                # 但为了简单起见，这里仅加载文件内容
-                return loaded_config
+            with open(abs_path, "r", encoding="utf-8") as f:
+                loaded_config = yaml.safe_load(f) or {}
         except Exception as e:
             print(f"[Config] 无法加载配置文件 '{path}': {e}. 使用默认配置。")
-            return DEFAULT_CONFIG
     else:
         print(f"[Config] 配置文件 '{path}' 不存在. 使用默认配置。")
-        # 首次运行时可以考虑保存一份默认配置文件
-        # try:
-        #     os.makedirs(os.path.dirname(path), exist_ok=True)
-        #     with open(path, "w", encoding="utf-8") as f:
-        #         yaml.dump(DEFAULT_CONFIG, f, allow_unicode=True)
-        #     print(f"[Config] 已在 '{path}' 创建默认配置文件。请填入您的 API 密钥等信息。")
-        # except Exception as e:
-        #      print(f"[Config] 创建默认配置文件失败: {e}")
-        return DEFAULT_CONFIG
+
+    config = Config(validate_config(deep_merge(DEFAULT_CONFIG, loaded_config)))
+    with _CACHE_LOCK:
+        _CACHE[key] = config
+    return config
 
 # 在其他模块中这样使用:
 # from core.config_loader import load_config
 # config = load_config()
-# api_key = config.get("binance", {}).get("api_key")
-# initial_balance = config.get("risk", {}).get("initial_balance", 10000.0)
\ No newline at end of file
+# api_key = config.binance.api_key
+# initial_balance = config.risk.initial_balance
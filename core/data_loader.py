@@ -4,14 +4,28 @@ class MarketDataLoader:
     def __init__(self, symbol="BTC/USDT", timeframe="4h", limit=1000):
         self.symbol = symbol
         self.timeframe = timeframe
-        self.limit = limit
+        self.limit = limit # 未指定时间范围时最多返回最近 limit 根 K 线，None 表示不限制
         self.data_path = "core/data/historical/BTCUSDT_4h.csv"  # 默认路径
 
-    def get_ohlcv(self):
-        import pandas as pd
-        df = pd.read_csv(self.data_path)
-        if len(df) < 100:
+    def get_ohlcv(self, start=None, end=None, columns=None, last_n=None, min_rows=None):
+        """
+        按时间范围 / 列查询 K 线数据（已转换为列式存储时只读取所需的行和列）。
+
+        Args:
+            start / end: 时间范围（闭区间），可传字符串、datetime 或毫秒时间戳。
+            columns (list): 需要的列，timestamp 始终返回；None 表示全部 OHLCV 列。
+            last_n (int): 只返回范围内最后 N 根；未指定且没有给出时间范围时使用 self.limit。
+            min_rows (int): 少于该行数时返回 None；默认只对不带范围的整段查询要求至少 100 行，
+                指定了 start / end / last_n 的查询按请求返回。
+        """
+        from core.data_store import read_ohlcv
+        bounded = start is not None or end is not None or last_n is not None
+        if min_rows is None:
+            min_rows = 0 if bounded else 100
+        if not bounded:
+            last_n = self.limit
+        df = read_ohlcv(self.data_path, columns=columns, start=start, end=end, last_n=last_n)
+        if len(df) < min_rows:
             print(f"[DataLoader] 警告：数据量不足，仅有 {len(df)} 条数据")
             return None
         return df
-    
\ No newline at end of file
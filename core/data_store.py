@@ -0,0 +1,196 @@
+# core/data_store.py
+# 列式 OHLCV 存储：Arrow IPC (Feather v2, 不压缩) 文件，列类型固定为 int64 时间戳 (epoch 毫秒) + float64 OHLCV。
+# 读取时通过内存映射零拷贝访问，只取需要的列；并提供从现有 CSV 一次性转换的工具。
+# 依赖 pyarrow (可选)：未安装时 read_ohlcv 自动回退到 CSV。
+
+import os
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
+STORE_SUFFIX = ".arrow"
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc # noqa: F401
+    except ImportError as e:
+        raise ImportError("OHLCVStore 需要 pyarrow，请先执行: pip install pyarrow") from e
+    return pa
+
+
+def to_epoch_ms(timestamps):
+    """把字符串 / datetime / 毫秒整数时间戳统一转换为 int64 epoch 毫秒"""
+    series = pd.Series(timestamps)
+    if pd.api.types.is_integer_dtype(series):
+        return series.to_numpy(dtype=np.int64)
+    parsed = pd.to_datetime(series)
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_convert(None) # 带时区的时间统一转换为 UTC
+    return parsed.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+
+
+def bisect_rows(ts, start=None, end=None, last_n=None):
+    """
+    在升序 epoch 毫秒时间戳数组上二分查找，返回行区间 [lo, hi)。
+    start / end 为闭区间（可传字符串、datetime 或毫秒整数），last_n 表示只取区间内最后 N 行。
+    """
+    lo = 0 if start is None else int(np.searchsorted(ts, to_epoch_ms([start])[0], side="left"))
+    hi = len(ts) if end is None else int(np.searchsorted(ts, to_epoch_ms([end])[0], side="right"))
+    if last_n is not None:
+        lo = max(lo, hi - last_n)
+    return lo, max(lo, hi)
+
+
+class OHLCVStore:
+    """
+    单个交易对 / 周期的列式存储文件。
+    数据按时间戳升序、去重保存；文件整体替换写入（先写临时文件再原子重命名），读取时内存映射。
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    # --- 写入 ---
+    def write(self, df, metadata=None):
+        """覆盖写入。df 需包含 timestamp/open/high/low/close/volume 列；metadata 为写入文件 schema 的字符串字典"""
+        pa = _require_pyarrow()
+        ts = to_epoch_ms(df["timestamp"])
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        # 同一时间戳保留最后一条
+        keep = np.append(ts[1:] != ts[:-1], True) if len(ts) else np.array([], dtype=bool)
+        arrays = {"timestamp": pa.array(ts[keep], type=pa.int64())}
+        for col in PRICE_COLUMNS:
+            values = df[col].to_numpy(dtype=np.float64)[order][keep]
+            arrays[col] = pa.array(values, type=pa.float64())
+        table = pa.table(arrays)
+        if metadata:
+            table = table.replace_schema_metadata({str(k): str(v) for k, v in metadata.items()})
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self.path)
+        return table.num_rows
+
+    def append(self, df, metadata=None):
+        """追加新数据（按时间戳去重，新数据覆盖旧数据），返回写入后的总行数"""
+        if self.exists():
+            existing = self.read(as_datetime=False)
+            df = pd.concat([existing, df.assign(timestamp=to_epoch_ms(df["timestamp"]))], ignore_index=True)
+        return self.write(df, metadata=metadata)
+
+    def metadata(self):
+        """读取 write 时保存的 schema 元数据（字符串字典），文件不存在时返回空字典"""
+        if not self.exists():
+            return {}
+        meta = self._open().schema.metadata or {}
+        return {k.decode(): v.decode() for k, v in meta.items()}
+
+    # --- 读取 ---
+    def _open(self):
+        pa = _require_pyarrow()
+        source = pa.memory_map(self.path, "r")
+        return pa.ipc.open_file(source).read_all()
+
+    def read_arrays(self, columns=None):
+        """零拷贝读取：返回 {列名: 只读 numpy 数组}，数组直接指向内存映射的文件内容"""
+        table = self._open()
+        columns = columns or OHLCV_COLUMNS
+        return {col: table.column(col).to_numpy() for col in columns}
+
+    def row_range(self, start=None, end=None, last_n=None, table=None):
+        """
+        按时间范围定位行区间 [lo, hi)（参数含义见 bisect_rows）。
+        时间戳列是内存映射的，二分查找只会访问 O(log n) 个页面。
+        """
+        table = table if table is not None else self._open()
+        return bisect_rows(table.column("timestamp").to_numpy(), start, end, last_n)
+
+    def read(self, columns=None, as_datetime=True, start=None, end=None, last_n=None):
+        """
+        读取为 DataFrame。columns 用于列投影（timestamp 列始终保留）；
+        start / end / last_n 按时间范围取行（见 row_range），只有被切出的行对应的文件页面会被实际读取；
+        as_datetime=True 时 timestamp 以 datetime64[ms] 视图返回，否则为 int64 毫秒。
+        """
+        columns = columns or PRICE_COLUMNS
+        wanted = ["timestamp"] + [c for c in columns if c != "timestamp"]
+        table = self._open()
+        if start is not None or end is not None or last_n is not None:
+            lo, hi = self.row_range(start, end, last_n, table=table)
+            table = table.slice(lo, hi - lo) # 零拷贝切片
+        arrays = {col: table.column(col).to_numpy() for col in wanted}
+        if as_datetime:
+            arrays["timestamp"] = arrays["timestamp"].view("datetime64[ms]")
+        return pd.DataFrame(arrays, copy=False)
+
+    def last_timestamp(self):
+        """最后一根 K 线的时间戳 (epoch 毫秒)，文件不存在或为空时返回 None"""
+        if not self.exists():
+            return None
+        ts = self.read_arrays(["timestamp"])["timestamp"]
+        return int(ts[-1]) if len(ts) else None
+
+    def __len__(self):
+        return self._open().num_rows if self.exists() else 0
+
+
+def store_path_for(csv_path):
+    """CSV 对应的列式文件路径（同目录、同名，后缀 .arrow）"""
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+
+def convert_csv(csv_path, store_path=None):
+    """一次性把 CSV 转换为列式存储，返回写入行数"""
+    store_path = store_path or store_path_for(csv_path)
+    df = pd.read_csv(csv_path)
+    rows = OHLCVStore(store_path).write(df)
+    print(f"[DataStore] Converted {csv_path} -> {store_path} ({rows} rows)")
+    return rows
+
+
+def read_ohlcv(path, columns=None, start=None, end=None, last_n=None):
+    """
+    统一的数据读取入口：
+    - .arrow / .feather 文件直接内存映射读取；
+    - CSV 文件若存在同名且不旧于它的 .arrow 文件（已转换），则读取列式文件；
+    - 否则回退到 pd.read_csv（需要整文件解析后再按时间范围切片）。
+    start / end / last_n 的含义见 bisect_rows。
+    """
+    if path.endswith((STORE_SUFFIX, ".feather")):
+        return OHLCVStore(path).read(columns=columns, start=start, end=end, last_n=last_n)
+
+    arrow_path = store_path_for(path)
+    if os.path.exists(arrow_path) and (not os.path.exists(path) or os.path.getmtime(arrow_path) >= os.path.getmtime(path)):
+        try:
+            return OHLCVStore(arrow_path).read(columns=columns, start=start, end=end, last_n=last_n)
+        except ImportError:
+            pass
+
+    df = pd.read_csv(path)
+    if columns:
+        df = df[["timestamp"] + [c for c in columns if c != "timestamp"]]
+    if start is not None or end is not None or last_n is not None:
+        lo, hi = bisect_rows(to_epoch_ms(df["timestamp"]), start, end, last_n)
+        df = df.iloc[lo:hi].reset_index(drop=True)
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="把 OHLCV CSV 一次性转换为列式存储 (.arrow)")
+    parser.add_argument("paths", nargs="*", default=["core/data/historical/*.csv"], help="CSV 文件或通配符")
+    args = parser.parse_args()
+    for pattern in args.paths:
+        for csv_file in sorted(glob.glob(pattern)):
+            convert_csv(csv_file)
@@ -0,0 +1,220 @@
+# core/dataset_builder.py
+# AI 训练数据集构建：把整段历史切成带重叠的分块，在进程池中并行计算特征，拼接后得到与 FeatureFrame 整段计算相同的
+# 12 个 AI 特征 + 标签，并保存为版本化的 Arrow 文件 (core/data/datasets/<name>/v0001.arrow)，供不同实验直接复用。
+#
+# - 滚动 / EWM 类指标只依赖有限的回看期：每个分块向前多取 FEATURE_LOOKBACK 根 K 线预热，丢弃预热部分后与整段计算一致
+#   （MACD 的 EWM 理论上有无限记忆，500 根后残余权重 < 1e-16）；
+# - 形态概率是从数据起点开始的累积统计（已向量化为 O(n)），不能分块计算，在主进程中整段计算一次；
+#   指定 pattern_window 时改为与推理一致的口径：第 t 行等于只用最近 pattern_window 根 K 线构建特征帧时的取值
+#   （实盘在固定长度的窗口上计算特征，整段累积的概率会造成训练 / 推理特征不一致）；
+# - 标签只依赖未来 5 根收盘价，也在主进程中计算。
+#
+# 用法：python -m core.dataset_builder core/data/historical/BTCUSDT_4h_new.csv --workers 4
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from core.data_store import _require_pyarrow, read_ohlcv, to_epoch_ms
+from core.feature_frame import AI_FEATURES, FeatureFrame, window_key
+from utils.indicators import calculate_pattern_probabilities, detect_pattern_masks
+
+DATASET_DIR = "core/data/datasets"
+BUILDER_VERSION = 1 # 特征计算方式变化时递增，旧版本的数据集不再被复用
+FEATURE_LOOKBACK = 500 # 分块预热长度：覆盖最长的滚动窗口，并让 EWM 收敛到浮点精度
+PATTERN_FEATURES = ['hammer_up_prob', 'engulfing_up_prob'] # 累积统计，整段计算
+# 形态掩码在窗口开头若干根内无法判定（锤头线需要前 4 根的趋势，吞没形态需要前一根）
+PATTERN_MASKS = {'hammer_up_prob': ('hammer', 4), 'engulfing_up_prob': ('bullish_engulfing', 1)}
+LOCAL_FEATURES = [name for name in AI_FEATURES if name not in PATTERN_FEATURES]
+LABEL_COLUMNS = ['future_return', 'label']
+
+
+def plan_chunks(n, chunk_size, overlap=FEATURE_LOOKBACK):
+    """返回 [(预热起点, 输出起点, 输出终点), ...]，输出区间 [lo, hi) 首尾相接覆盖 0..n"""
+    return [(max(0, lo - overlap), lo, min(lo + chunk_size, n)) for lo in range(0, n, chunk_size)]
+
+
+def _chunk_features(chunk, skip):
+    """子进程：计算一个分块的局部特征，丢弃前 skip 行预热"""
+    features = FeatureFrame(chunk.reset_index(drop=True))
+    return {name: features[name].to_numpy(dtype=np.float64)[skip:] for name in LOCAL_FEATURES}
+
+
+def trailing_pattern_probability(df, mask, window, skip=0, lookback=5):
+    """
+    第 t 行等于 calculate_pattern_probabilities(df.iloc[t-window+1:t+1]) 最后一行的上涨概率：
+    只统计窗口内已实现结果的形态位置 i ∈ [窗口起点 + skip, t - lookback]，用累积和相减得到，O(n)。
+    """
+    close = df['close'].to_numpy(dtype=float)
+    mask = np.asarray(mask, dtype=bool)
+    n = len(close)
+    hits = np.zeros(n, dtype=float)
+    ups = np.zeros(n, dtype=float)
+    if n > lookback:
+        hits[:-lookback] = mask[:-lookback]
+        ups[:-lookback] = mask[:-lookback] & (close[lookback:] > close[:-lookback])
+    hit_sum = np.concatenate([[0.0], np.cumsum(hits)])
+    up_sum = np.concatenate([[0.0], np.cumsum(ups)])
+
+    t = np.arange(n)
+    first = np.maximum(t - window + 1, 0) + skip
+    last = np.maximum(t - lookback + 1, first) # 不含
+    count = hit_sum[last] - hit_sum[first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count > 0, (up_sum[last] - up_sum[first]) / count, 0.0)
+
+
+def build_features(df, chunk_size=250000, overlap=FEATURE_LOOKBACK, max_workers=None, pattern_window=None):
+    """
+    计算整段数据的训练特征矩阵，返回 DataFrame：timestamp + AI_FEATURES + future_return + label。
+    结果与 FeatureFrame(df) 整段计算的对应列一致（分块计算的滚动标准差与整段计算相差约 1e-8 相对误差，
+    来自 pandas 滚动算法的累积舍入）。
+
+    Args:
+        chunk_size (int): 每个分块输出的行数。
+        overlap (int): 每个分块向前多取的预热行数。
+        max_workers (int): 进程数，None 时使用 CPU 核数；1 或只有一个分块时在当前进程中计算。
+        pattern_window (int): 形态概率只统计最近 pattern_window 根 K 线（与推理窗口一致），None 表示从数据起点累积。
+    """
+    df = df.reset_index(drop=True)
+    chunks = plan_chunks(len(df), chunk_size, overlap)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(chunks)))
+    if max_workers == 1:
+        parts = [_chunk_features(df, 0)] # 单进程时不分块，避免重复计算预热部分
+    else:
+        jobs = [(df.iloc[start:hi], lo - start) for start, lo, hi in chunks]
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parts = list(pool.map(_chunk_features, *zip(*jobs)))
+
+    out = pd.DataFrame({"timestamp": df["timestamp"].to_numpy()})
+    for name in LOCAL_FEATURES:
+        out[name] = np.concatenate([part[name] for part in parts]) if parts else np.array([], dtype=np.float64)
+    labels = FeatureFrame(df)
+    if pattern_window:
+        masks = detect_pattern_masks(df)
+        for name, (mask, skip) in PATTERN_MASKS.items():
+            out[name] = trailing_pattern_probability(df, masks[mask], pattern_window, skip)
+    else:
+        probs = calculate_pattern_probabilities(df, lookback=5)
+        for name in PATTERN_FEATURES:
+            out[name] = probs[name].to_numpy()
+    for name in LABEL_COLUMNS:
+        out[name] = labels[name].to_numpy()
+    return out[["timestamp"] + AI_FEATURES + LABEL_COLUMNS]
+
+
+def training_xy(dataset):
+    """与 AIPredictor.train_rolling 相同的取法：删除特征缺失的行，返回 (X, y)"""
+    X = dataset[AI_FEATURES].dropna()
+    return X, dataset['label'].loc[X.index]
+
+
+def dataset_key(df, pattern_window=None):
+    """数据集标识：源数据窗口 + 特征列 + 构建参数，任何一项变化都会生成新版本"""
+    payload = json.dumps({"window": [str(v) for v in window_key(df)], "features": AI_FEATURES,
+                          "builder": BUILDER_VERSION, "lookback": FEATURE_LOOKBACK, "pattern_window": pattern_window}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class DatasetStore:
+    """
+    版本化的训练数据集：每次构建保存为 <root>/<name>/vNNNN.arrow（先写临时文件再原子重命名），
+    文件 schema 元数据记录数据集标识；源数据未变化时直接复用已有版本。
+    """
+
+    def __init__(self, name, root=DATASET_DIR):
+        self.name = name
+        self.dir = os.path.join(root, name)
+
+    def versions(self):
+        if not os.path.isdir(self.dir):
+            return []
+        return sorted(int(f[1:-6]) for f in os.listdir(self.dir) if f.startswith("v") and f.endswith(".arrow") and f[1:-6].isdigit())
+
+    def path_for(self, version):
+        return os.path.join(self.dir, f"v{version:04d}.arrow")
+
+    def metadata(self, version):
+        pa = _require_pyarrow()
+        with pa.memory_map(self.path_for(version), "r") as source:
+            meta = pa.ipc.open_file(source).schema.metadata or {}
+        return {k.decode(): v.decode() for k, v in meta.items()}
+
+    def find(self, key):
+        """返回标识为 key 的最新版本号，没有时返回 None"""
+        for version in reversed(self.versions()):
+            if self.metadata(version).get("dataset_key") == key:
+                return version
+        return None
+
+    def save(self, dataset, metadata=None):
+        """保存为新版本，返回版本号"""
+        pa = _require_pyarrow()
+        arrays = {"timestamp": pa.array(to_epoch_ms(dataset["timestamp"]), type=pa.int64())}
+        for name in AI_FEATURES + ['future_return']:
+            arrays[name] = pa.array(dataset[name].to_numpy(dtype=np.float64), type=pa.float64())
+        arrays['label'] = pa.array(dataset['label'].to_numpy(dtype=np.int8), type=pa.int8())
+        table = pa.table(arrays).replace_schema_metadata({str(k): str(v) for k, v in (metadata or {}).items()})
+
+        os.makedirs(self.dir, exist_ok=True)
+        version = max(self.versions(), default=0) + 1
+        path = self.path_for(version)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        print(f"[Dataset] Saved {len(dataset)} rows to {path}")
+        return version
+
+    def load(self, version=None):
+        """读取指定版本（默认最新），列为内存映射的零拷贝数组"""
+        pa = _require_pyarrow()
+        version = version or max(self.versions(), default=None)
+        if version is None:
+            raise FileNotFoundError(f"No dataset versions in {self.dir}")
+        table = pa.ipc.open_file(pa.memory_map(self.path_for(version), "r")).read_all()
+        arrays = {name: table.column(name).to_numpy() for name in table.column_names}
+        arrays["timestamp"] = arrays["timestamp"].view("datetime64[ms]")
+        return pd.DataFrame(arrays, copy=False)
+
+
+def build_dataset(data_path, name=None, root=DATASET_DIR, chunk_size=250000, max_workers=None, rebuild=False, pattern_window=None):
+    """
+    为数据文件构建（或复用）训练数据集，返回 (dataset DataFrame, 版本号)。
+    源数据和特征定义未变化时直接读取已有版本，不重新计算。
+    """
+    df = read_ohlcv(data_path)
+    store = DatasetStore(name or os.path.splitext(os.path.basename(data_path))[0], root=root)
+    key = dataset_key(df, pattern_window)
+    version = None if rebuild else store.find(key)
+    if version is not None:
+        print(f"[Dataset] Reusing {store.path_for(version)}")
+        return store.load(version), version
+
+    dataset = build_features(df, chunk_size=chunk_size, max_workers=max_workers, pattern_window=pattern_window)
+    version = store.save(dataset, metadata={"dataset_key": key, "source": data_path, "rows": len(df), "pattern_window": pattern_window,
+                                            "builder": BUILDER_VERSION, "features": ",".join(AI_FEATURES)})
+    return store.load(version), version
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="构建 AI 训练数据集（并行计算特征，保存为版本化 Arrow 文件）")
+    parser.add_argument("data_file")
+    parser.add_argument("--name", default=None, help="数据集名称，默认使用数据文件名")
+    parser.add_argument("--chunk-size", type=int, default=250000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有版本，重新构建")
+    parser.add_argument("--pattern-window", type=int, default=None, help="形态概率只统计最近 N 根 K 线（与推理窗口一致）")
+    args = parser.parse_args()
+
+    dataset, version = build_dataset(args.data_file, name=args.name, chunk_size=args.chunk_size,
+                                     max_workers=args.workers, rebuild=args.rebuild, pattern_window=args.pattern_window)
+    X, y = training_xy(dataset)
+    print(f"[Dataset] Version {version}: {len(X)} training rows, {len(AI_FEATURES)} features, label mean {y.mean():.3f}")
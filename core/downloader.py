@@ -0,0 +1,229 @@
+# core/downloader.py
+# 并发、可断点续传的历史 K 线下载器：
+# 1. 把时间范围切分为固定大小的分块，线程池并发下载；
+# 2. 所有请求共享一个令牌桶限速器，避免触发交易所频率限制；
+# 3. 每个分块下载完成后立即写入检查点文件，中断后重新运行只下载缺失的分块；
+# 4. 全部完成后合并写入列式存储 (OHLCVStore)，然后清理检查点。
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from core.data_store import OHLCVStore, OHLCV_COLUMNS, convert_csv, to_epoch_ms
+
+HISTORICAL_DIR = "core/data/historical"
+DOWNLOAD_SUFFIX = ".store.arrow" # 不能用 .arrow：{SYMBOL}_{tf}.arrow 是同名 CSV 的列式文件，read_ohlcv 会优先读取它
+
+_TIMEFRAME_UNITS = {"m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000, "w": 7 * 24 * 60 * 60 * 1000}
+
+
+def timeframe_to_ms(timeframe):
+    """'1m' / '15m' / '4h' / '1d' -> 毫秒"""
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in _TIMEFRAME_UNITS or not amount.isdigit():
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(amount) * _TIMEFRAME_UNITS[unit]
+
+
+def symbol_to_filename(symbol):
+    """'BTC/USDT' -> 'BTCUSDT'"""
+    return symbol.replace("/", "").replace(":", "")
+
+
+def default_store_path(symbol, timeframe):
+    """下载器默认的存储路径：core/data/historical/{SYMBOL}_{timeframe}.store.arrow"""
+    return os.path.join(HISTORICAL_DIR, f"{symbol_to_filename(symbol)}_{timeframe}{DOWNLOAD_SUFFIX}")
+
+
+def find_gaps(timestamps, step):
+    """在升序毫秒时间戳中查找内部缺口，返回缺失区间列表 [(start_ms, end_ms), ...]（左闭右开）"""
+    ts = np.asarray(timestamps, dtype=np.int64)
+    if len(ts) < 2:
+        return []
+    idx = np.flatnonzero(np.diff(ts) > step)
+    return [(int(ts[i]) + step, int(ts[i + 1])) for i in idx]
+
+
+class TokenBucket:
+    """线程安全的令牌桶：每秒补充 rate 个令牌，最多累积 capacity 个；acquire 在令牌不足时阻塞等待"""
+
+    def __init__(self, rate=10.0, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HistoricalDownloader:
+    def __init__(self, exchange, symbol="BTC/USDT", timeframe="4h", store_path=None, checkpoint_dir=None,
+                 page_limit=1000, pages_per_chunk=10, max_workers=8, rate=10.0, max_retries=5, backoff=1.0):
+        """
+        Args:
+            exchange: 实现 ccxt fetch_ohlcv(symbol, timeframe, since, limit) 接口的对象（ccxt 交易所或 FakeExchange）。
+            store_path (str): 列式存储文件路径，默认 core/data/historical/{SYMBOL}_{timeframe}.store.arrow。
+                若指定的是某个 CSV 的同名列式文件（read_ohlcv 会用它代替 CSV）且尚不存在，先用 CSV 初始化再追加，
+                避免读取该 CSV 的代码只看到新下载的部分数据。
+            checkpoint_dir (str): 分块检查点目录，默认 store_path + ".chunks"。
+            page_limit (int): 单次请求的 K 线数。
+            pages_per_chunk (int): 每个分块包含的请求页数。
+            max_workers (int): 并发下载线程数。
+            rate (float): 令牌桶限速（每秒请求数），所有线程共享。
+            max_retries (int): 单页请求失败后的重试次数（指数退避）。
+        """
+        self.exchange = exchange
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.step = timeframe_to_ms(timeframe)
+        self.store_path = store_path or default_store_path(symbol, timeframe)
+        self.checkpoint_dir = checkpoint_dir or self.store_path + ".chunks"
+        self.page_limit = page_limit
+        self.chunk_ms = page_limit * pages_per_chunk * self.step
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.store = OHLCVStore(self.store_path)
+        csv_path = os.path.splitext(self.store_path)[0] + ".csv"
+        if not self.store.exists() and os.path.exists(csv_path):
+            convert_csv(csv_path, self.store_path)
+        self.requests = 0 # 已发出的请求数（含重试）
+
+    # --- 分块规划 ---
+    def plan_chunks(self, start_ms, end_ms):
+        """把 [start_ms, end_ms) 按 K 线边界切分为分块列表"""
+        start_ms = -(-start_ms // self.step) * self.step
+        return [(s, min(s + self.chunk_ms, end_ms)) for s in range(start_ms, end_ms, self.chunk_ms)]
+
+    def _checkpoint_path(self, chunk):
+        return os.path.join(self.checkpoint_dir, f"{chunk[0]}_{chunk[1]}.arrow")
+
+    # --- 下载 ---
+    def _fetch_page(self, since):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self.requests += 1
+            try:
+                return self.exchange.fetch_ohlcv(self.symbol, self.timeframe, since, self.page_limit)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                print(f"[Downloader] WARNING: fetch_ohlcv(since={since}) failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    def fetch_range(self, start_ms, end_ms):
+        """逐页下载 [start_ms, end_ms) 内的全部 K 线（单线程），返回 DataFrame（timestamp 为毫秒整数）"""
+        rows = []
+        since = start_ms
+        while since < end_ms:
+            page = self._fetch_page(since)
+            page = [r for r in page or [] if start_ms <= r[0] < end_ms]
+            if not page:
+                break # 该时间段之后交易所没有数据
+            rows.extend(page)
+            since = int(page[-1][0]) + self.step
+        return pd.DataFrame(rows, columns=OHLCV_COLUMNS)
+
+    def _download_chunk(self, chunk):
+        path = self._checkpoint_path(chunk)
+        if os.path.exists(path):
+            return chunk, True
+        OHLCVStore(path).write(self.fetch_range(*chunk)) # 空分块也写入，避免续传时重复请求
+        return chunk, False
+
+    def download(self, start, end=None):
+        """
+        下载 [start, end) 的 K 线并追加到列式存储；中断后重复调用会跳过已完成的分块。
+
+        Args:
+            start / end: 字符串、datetime 或毫秒时间戳；end 为 None 时下载到当前时间。
+
+        Returns:
+            int: 写入后存储中的总行数。
+        """
+        start_ms = int(to_epoch_ms([start])[0])
+        end_ms = int(to_epoch_ms([end])[0]) if end is not None else int(time.time() * 1000)
+        chunks = self.plan_chunks(start_ms, end_ms)
+        if not chunks:
+            return len(self.store)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        print(f"[Downloader] {self.symbol} {self.timeframe}: {len(chunks)} chunks, {self.max_workers} workers, {self.bucket.rate:g} req/s.")
+
+        done = resumed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._download_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                _, from_checkpoint = future.result() # 任一分块最终失败时抛出异常，已完成的检查点保留
+                done += 1
+                resumed += from_checkpoint
+                if done % 10 == 0 or done == len(chunks):
+                    print(f"[Downloader] {done}/{len(chunks)} chunks ready ({resumed} resumed from checkpoints).")
+
+        # 合并检查点并一次性追加到存储
+        frames = [OHLCVStore(self._checkpoint_path(chunk)).read(as_datetime=False) for chunk in chunks]
+        frames = [f for f in frames if len(f)]
+        total = self.store.append(pd.concat(frames, ignore_index=True)) if frames else len(self.store)
+        for chunk in chunks:
+            os.remove(self._checkpoint_path(chunk))
+        if not os.listdir(self.checkpoint_dir):
+            os.rmdir(self.checkpoint_dir)
+        print(f"[Downloader] ✅ {sum(len(f) for f in frames)} candles downloaded, store now has {total} rows: {self.store_path}")
+        return total
+
+    # --- 增量同步 ---
+    def sync(self, start=None, fill_gaps=True):
+        """
+        增量同步：读取存储中最后一根 K 线的时间，只下载之后已收盘的 K 线；同时检测并补齐内部缺口。
+        存储为空时从 start 开始完整下载。新数据按时间戳去重后追加。
+
+        Returns:
+            int: 新写入的 K 线数。
+        """
+        now_ms = int(time.time() * 1000)
+        end_ms = now_ms // self.step * self.step # 当前未收盘 K 线的开盘时间，不下载
+        last = self.store.last_timestamp()
+        if last is None:
+            if start is None:
+                print(f"[Sync] ❌ Store {self.store_path} is empty, please provide a start time.")
+                return 0
+            return self.download(start, end_ms)
+
+        ranges = []
+        if fill_gaps:
+            ranges = find_gaps(self.store.read_arrays(["timestamp"])["timestamp"], self.step)
+            if ranges:
+                missing = sum((e - s) // self.step for s, e in ranges)
+                print(f"[Sync] Found {len(ranges)} internal gaps ({missing} missing candles).")
+        if last + self.step < end_ms:
+            ranges.append((last + self.step, end_ms))
+        if not ranges:
+            print(f"[Sync] ✅ {self.symbol} {self.timeframe} is up to date (last candle: {pd.to_datetime(last, unit='ms')}).")
+            return 0
+
+        before, requests = len(self.store), self.requests
+        frames = [self.fetch_range(s, e) for s, e in ranges] # 通常只有少量区间，逐个请求即可
+        frames = [f for f in frames if len(f)]
+        if frames:
+            self.store.append(pd.concat(frames, ignore_index=True))
+        added = len(self.store) - before
+        still_missing = find_gaps(self.store.read_arrays(["timestamp"])["timestamp"], self.step) if fill_gaps else []
+        print(f"[Sync] ✅ {added} candles added with {self.requests - requests} requests, "
+              f"{len(still_missing)} gaps not available on the exchange.")
+        return added
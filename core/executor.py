@@ -7,6 +7,7 @@ class TradeExecutor:
     def __init__(self, config, simulate=False, df=None):
         self.simulate = simulate
         self.df = df # 用于计算动态滑点的数据
+        self.latest_atr = None # 外部预先计算好的最新 ATR (可选)
         binance_cfg = config.get("binance", {})
         trading_cfg = config.get("trading", {})
 
@@ -23,9 +24,10 @@ class TradeExecutor:
         self.average_entry_price = 0.0 # 平均持仓成本
         # 注意：在真实交易中，持仓状态应主要从交易所查询获取
 
-    def update_data(self, df):
-        """允许外部更新用于计算滑点的数据"""
+    def update_data(self, df, atr=None):
+        """允许外部更新用于计算滑点的数据；若已预先计算好最新 ATR，可直接传入以避免重复计算"""
         self.df = df
+        self.latest_atr = atr
 
     def calculate_dynamic_slippage(self, price):
         """计算动态滑点 (基于 ATR)"""
@@ -34,8 +36,11 @@ class TradeExecutor:
             return price * self.base_slippage_rate
 
         try:
-            atr = AverageTrueRange(high=self.df['high'], low=self.df['low'], close=self.df['close'], window=14).average_true_range()
-            latest_atr = atr.iloc[-1]
+            if self.latest_atr is not None:
+                latest_atr = self.latest_atr
+            else:
+                atr = AverageTrueRange(high=self.df['high'], low=self.df['low'], close=self.df['close'], window=14).average_true_range()
+                latest_atr = atr.iloc[-1]
 
             if pd.isna(latest_atr) or price <= 0:
                  # print("[Exec] WARN: Invalid ATR or price for slippage calc, using base rate.")
@@ -0,0 +1,280 @@
+# core/fast_backtest.py
+# 向量化“快速模式”回测：输入预先计算好的信号数组，用 NumPy 在数组上做状态机扫描，
+# 直接定位每笔交易的入场 / SL / TP / 信号平仓位置，适合大规模参数研究。
+# 交易规则与 BacktestEngine 保持一致：只做多、SL 优先于 TP、同一根 K 线触发 SL/TP 后不再处理信号、
+# 仓位按 RiskManager 的风险比例计算、滑点按 TradeExecutor 的 ATR 动态规则计算、超过最大回撤后暂停开仓。
+# AI 模型的滚动训练节奏也与 BacktestEngine 一致（见 SignalCollector），交易记录与逐根回测相同。
+
+import os
+import numpy as np
+import pandas as pd
+from ta.volatility import AverageTrueRange
+
+BUY = 1
+SELL = -1
+
+
+def _slippage(price, atr, base_rate):
+    """与 TradeExecutor.calculate_dynamic_slippage 相同的 ATR 动态滑点"""
+    if pd.isna(atr) or price <= 0:
+        return price * base_rate
+    atr_ratio = atr / price
+    if atr_ratio > 0.02:
+        return price * base_rate * 2
+    if atr_ratio < 0.005:
+        return price * base_rate * 0.5
+    return price * base_rate
+
+
+def signals_to_array(signals, length):
+    """把 {index: "buy"/"sell"} 或动作列表转换为 int8 信号数组（1=买入，-1=卖出，0=无信号）"""
+    arr = np.zeros(length, dtype=np.int8)
+    items = signals.items() if isinstance(signals, dict) else enumerate(signals)
+    for i, action in items:
+        if action in ("buy", BUY):
+            arr[i] = BUY
+        elif action in ("sell", SELL):
+            arr[i] = SELL
+    return arr
+
+
+def run_vectorized_backtest(df, signals, sl_atr_multiplier=2.0, tp_atr_multiplier=3.0, max_position_risk_pct=0.02,
+                            initial_balance=10000.0, max_drawdown_pct=0.20, commission_rate=0.00075,
+                            slippage_base_rate=0.0005, atr=None, start_index=0, data_file="", return_trades=False,
+                            liquidate_at_end=False, blocked=None):
+    """
+    Args:
+        df (pd.DataFrame): 含 high/low/close 的 K 线数据。
+        signals (np.ndarray): 与 df 等长的信号数组（1=买入，-1=卖出，0=无信号）。
+        atr (np.ndarray): 可选，预先计算好的 ATR(14)；参数扫描时复用可省去重复计算。
+        start_index (int): 从该索引开始处理信号。
+        return_trades (bool): 为 True 时额外返回交易列表。
+        liquidate_at_end (bool): 为 True 时在最后一根 K 线按收盘价平掉未平仓头寸（拼接多段资金曲线时使用）。
+        blocked (list): 可选，追加 BacktestEngine 会提前返回（跳过滚动训练）的 K 线索引：
+            SL/TP 平仓、买入被拒绝、暂停开仓后的空仓 K 线。
+
+    Returns:
+        dict: 与 run_backtest 相同结构的摘要字典（return_trades=True 时返回 (summary, trades)）。
+    """
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+    if atr is None:
+        atr = AverageTrueRange(high=df['high'], low=df['low'], close=df['close'], window=14).average_true_range().to_numpy(dtype=float)
+    signals = np.asarray(signals)
+    n = len(close)
+
+    # 入场候选：有买入信号的 K 线
+    buy_idx = np.flatnonzero(signals == BUY)
+    buy_idx = buy_idx[buy_idx >= start_index]
+    blocked = [] if blocked is None else blocked
+    is_sell = signals == SELL
+
+    balance = peak = float(initial_balance)
+    paused = False
+    trades = []
+    pos = start_index
+    while not paused:
+        # 1. 下一个可入场的买入信号
+        k = np.searchsorted(buy_idx, pos)
+        if k >= len(buy_idx):
+            break
+        i = int(buy_idx[k])
+        pos = i + 1
+        if not atr[i] > 0: # ATR 无效（含 NaN），与 BacktestEngine 一样拒绝买入
+            blocked.append(i)
+            continue
+        entry_signal_price = close[i]
+        sl = entry_signal_price - sl_atr_multiplier * atr[i]
+        tp = entry_signal_price + tp_atr_multiplier * atr[i]
+        if sl <= 0 or tp <= sl:
+            blocked.append(i)
+            continue
+        amount = round(balance * max_position_risk_pct / abs(entry_signal_price - sl), 6)
+        if amount <= 0 or amount * entry_signal_price > balance * 0.99:
+            blocked.append(i)
+            continue
+        entry_price = entry_signal_price + _slippage(entry_signal_price, atr[i], slippage_base_rate)
+
+        # 2. 入场后第一根触发 SL / TP / 卖出信号的 K 线
+        sl_hit = low[i + 1:] <= sl
+        tp_hit = high[i + 1:] >= tp
+        exit_mask = sl_hit | tp_hit | is_sell[i + 1:]
+        if exit_mask.any():
+            offset = int(np.argmax(exit_mask))
+            j = i + 1 + offset
+            if sl_hit[offset]:
+                exit_signal_price, reason = sl, "stop_loss"
+            elif tp_hit[offset]:
+                exit_signal_price, reason = tp, "take_profit"
+            else:
+                exit_signal_price, reason = close[j], "signal"
+        elif liquidate_at_end and i < n - 1:
+            j = n - 1
+            exit_signal_price, reason = close[j], "end_of_data"
+        else:
+            trades.append({"entry_index": i, "exit_index": None, "entry_price": entry_price, "amount": amount, "pnl": None})
+            break # 持仓到数据结束，与逐根回测一致不做强制平仓
+        exit_price = exit_signal_price - _slippage(exit_signal_price, atr[j], slippage_base_rate)
+        pnl = (exit_price - entry_price) * amount - amount * exit_price * commission_rate
+
+        # 3. 更新资金与回撤
+        balance += pnl
+        peak = max(peak, balance)
+        if reason in ("stop_loss", "take_profit"):
+            blocked.append(j)
+        if peak > 0 and 1 - balance / peak > max_drawdown_pct:
+            paused = True
+            blocked.extend(range(j + 1, n)) # 暂停后一直空仓，引擎在之后的每根 K 线都提前返回
+        trades.append({"entry_index": i, "exit_index": j, "entry_price": entry_price, "exit_price": exit_price,
+                       "amount": amount, "pnl": pnl, "reason": reason})
+        pos = j + 1
+
+    closed = [t for t in trades if t["pnl"] is not None]
+    total_pnl = balance - initial_balance
+    summary = {
+        "data_file": os.path.basename(data_file),
+        "initial_balance": initial_balance,
+        "final_balance": balance,
+        "total_pnl": total_pnl if trades else 0.0,
+        "pnl_pct": (total_pnl / initial_balance) * 100 if initial_balance and trades else 0.0,
+        "peak_balance": peak if trades else initial_balance,
+        "final_drawdown_pct": (1 - balance / peak) * 100 if peak > 0 and trades else 0.0,
+        "num_trades": len(closed)
+    }
+    if return_trades:
+        return summary, trades
+    return summary
+
+
+def run_fast_backtest(df, signals, config, start_index=0, data_file="", atr=None, return_trades=False, liquidate_at_end=False,
+                      blocked=None):
+    """从配置字典读取风控 / 费率参数后调用 run_vectorized_backtest"""
+    risk_cfg = config.get("risk", {})
+    return run_vectorized_backtest(
+        df, signals,
+        sl_atr_multiplier=risk_cfg.get("sl_atr_multiplier", 2.0),
+        tp_atr_multiplier=risk_cfg.get("tp_atr_multiplier", 3.0),
+        max_position_risk_pct=risk_cfg.get("max_position_risk_pct", 0.02),
+        initial_balance=risk_cfg.get("initial_balance", 10000.0),
+        max_drawdown_pct=risk_cfg.get("max_drawdown_pct", 0.20),
+        commission_rate=config.get("binance", {}).get("commission_rate", 0.00075),
+        slippage_base_rate=config.get("trading", {}).get("slippage_base_rate", 0.0005),
+        atr=atr, start_index=start_index, data_file=data_file, return_trades=return_trades,
+        liquidate_at_end=liquidate_at_end, blocked=blocked
+    )
+
+
+class SignalCollector:
+    """
+    逐根 K 线运行 SignalGenerator，记录信号数组，供 run_fast_backtest 使用。
+    特征整段只计算一次（也可传入已计算好的 features 在多组参数间共享）。
+
+    AI 模型按 retrain_interval 滚动训练，但与 BacktestEngine 一样，引擎提前返回的 K 线（SL/TP 平仓、
+    买入被拒绝、暂停后空仓）不训练。这些 K 线由按风控参数模拟出的交易决定，所以信号也依赖风控参数：
+    signals(config) 先用已收集的信号做快速回测，找出会被跳过的训练点，再从第一个不一致的训练点起重新收集，
+    直到跳过的训练点不再变化（每轮第一个不一致的训练点都会后移，最多迭代训练点个数轮，通常 1~2 轮）。
+    收集结果按跳过集合缓存，同一组信号参数下的多个风控组合共享已训练的模型和已收集的信号。
+    """
+
+    def __init__(self, df, config, start_index, window_length=None, retrain_interval=None, features=None):
+        """
+        Args:
+            df (pd.DataFrame): 回测数据。
+            config (dict): 信号参数所在的配置（风控参数由 signals(config) 传入）。
+            start_index (int): 回测起点索引，之前的数据用于初始训练。
+            window_length (int): 交给信号生成器的尾部窗口长度，默认等于 start_index。
+            retrain_interval (int): 滚动训练间隔，None 时读取 ai_model.retrain_interval。
+        """
+        from core.feature_frame import FeatureFrame
+        from core.signal_generator import SignalGenerator
+
+        self.df = df.reset_index(drop=True)
+        self.start_index = start_index
+        self.window_length = window_length or start_index
+        self.retrain_interval = retrain_interval or config.get("ai_model", {}).get("retrain_interval", 7 * 6)
+        if features is None or not features.matches(self.df):
+            features = FeatureFrame(self.df)
+        self.features = features
+        self.atr = features['atr'].to_numpy()
+        self.retrain_bars = frozenset(i for i in range(start_index + 1, len(self.df)) if i % self.retrain_interval == 0)
+        self._runs = {} # 跳过的训练点 -> (信号数组, {训练点: 到达该 K 线时的模型状态})
+
+        self.signal_generator = SignalGenerator(config)
+        self.predictor = self.signal_generator.predictor
+        self.predictor.attach_batch(features, segment=self.retrain_interval) # AI 推理按段批量计算、按索引查表
+        # 与 run_backtest 相同：用回测起点之前的数据做初始训练（模型缓存在注册表内存中，同一数据的多个信号组共享）
+        try:
+            self.predictor.train_rolling(self.df.iloc[:start_index])
+        except Exception as e:
+            print(f"[FastBacktest] WARNING: Initial AI training failed: {e}")
+        self._initial = self._state()
+
+    def _state(self):
+        p = self.predictor
+        return p.model, p.scaler, p.model_key, p.model_version
+
+    def _restore(self, state):
+        model, scaler, key, version = state
+        self.predictor._use({"model": model, "scaler": scaler, "metadata": {"version": version}}, key)
+
+    def collect(self, skipped=frozenset()):
+        """按给定的跳过训练点收集信号；从已有结果中与之一致最久的那次收集的分叉点继续"""
+        skipped = frozenset(skipped)
+        if skipped in self._runs:
+            return self._runs[skipped][0]
+        resume, base = None, None
+        for other in self._runs:
+            diverge = min(other ^ skipped)
+            if resume is None or diverge > resume:
+                resume, base = diverge, other
+        if base is None:
+            signals, states, begin = np.zeros(len(self.df), dtype=np.int8), {}, self.start_index
+            self._restore(self._initial)
+        else:
+            signals = self._runs[base][0].copy()
+            states = {r: state for r, state in self._runs[base][1].items() if r <= resume}
+            begin = resume
+            self._restore(states[resume])
+
+        for i in range(begin, len(self.df)):
+            start = max(0, i + 1 - self.window_length)
+            window_df = self.df.iloc[start:i + 1]
+            window_features = self.features.tail(i, self.window_length)
+            if i in self.retrain_bars:
+                states[i] = self._state()
+            try:
+                signal = self.signal_generator.generate(window_df, features=window_features)
+            except Exception as e:
+                print(f"[FastBacktest] {i}: ERROR during signal generation: {e}")
+                signal = None
+            signals[i] = 0
+            if signal:
+                signals[i] = BUY if signal["action"] == "buy" else SELL if signal["action"] == "sell" else 0
+            if i in self.retrain_bars and i not in skipped:
+                try:
+                    self.predictor.train_rolling(window_df, features=window_features)
+                except Exception as e:
+                    print(f"[FastBacktest] WARNING: AI model rolling update failed at index {i}: {e}")
+        self._runs[skipped] = (signals, states)
+        return signals
+
+    def signals(self, config):
+        """与按 config 的风控参数逐根回测时相同模型轨迹下的信号数组"""
+        skipped = frozenset()
+        for _ in range(len(self.retrain_bars) + 1):
+            signals = self.collect(skipped)
+            blocked = []
+            run_fast_backtest(self.df, signals, config, start_index=self.start_index, atr=self.atr, blocked=blocked)
+            actual = self.retrain_bars.intersection(blocked)
+            if actual == skipped:
+                break
+            skipped = actual
+        return signals
+
+
+def collect_signals(df, config, start_index, window_length=None, retrain_interval=None, features=None):
+    """用 config 的信号参数和风控参数收集信号数组（SignalCollector 的单次用法）"""
+    collector = SignalCollector(df, config, start_index, window_length=window_length,
+                                retrain_interval=retrain_interval, features=features)
+    return collector.signals(config)
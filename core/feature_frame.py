@@ -0,0 +1,144 @@
+# core/feature_frame.py
+# 共享特征帧：同一个数据窗口的指标只计算一次，
+# SignalGenerator / AIPredictor / MarketStateDetector 都从这里读取，列在首次访问时才计算。
+
+import pandas as pd
+from ta.trend import ADXIndicator
+from ta.volatility import AverageTrueRange
+from utils.indicators import calculate_rsi, calculate_bollinger_bands, calculate_adx, calculate_pattern_probabilities, calc_macd, calc_stochrsi
+
+# AI 模型使用的 12 个特征（顺序即训练时的列顺序）
+AI_FEATURES = ['rsi', 'bb_width', 'adx', 'volume_change', 'macd', 'stoch_rsi', 'hammer_up_prob', 'engulfing_up_prob', 'trend', 'volume_trend', 'volatility', 'price_range']
+
+# SignalGenerator 需要挂到 DataFrame 上的列（策略内部会读取 macd / macd_signal 等）
+SIGNAL_COLUMNS = ['rsi', 'ma', 'std', 'upper', 'lower', 'bb_width', 'adx', 'volume_change',
+                  'macd', 'macd_signal', 'macd_hist', 'stoch_rsi',
+                  'hammer_up_prob', 'doji_up_prob', 'engulfing_up_prob', 'engulfing_down_prob',
+                  'trend', 'volume_trend', 'volatility', 'price_range']
+
+
+def window_key(df):
+    """数据窗口的标识：长度 + 首尾时间戳 + 最后收盘价"""
+    if df is None or len(df) == 0:
+        return (0, None, None, None)
+    if 'timestamp' in df.columns:
+        first, last = df['timestamp'].iloc[0], df['timestamp'].iloc[-1]
+    else:
+        first, last = df.index[0], df.index[-1]
+    return (len(df), str(first), str(last), float(df['close'].iloc[-1]))
+
+
+class FeatureFrame:
+    """
+    惰性特征帧。feature_frame[name] 返回对应列（pd.Series），首次访问时计算并缓存。
+    一组相关的列（如布林带的 ma/std/upper/lower）由同一个构建函数一次性产出。
+    """
+
+    def __init__(self, df, atr_window=14):
+        self.df = df
+        self.key = window_key(df)
+        self.atr_window = atr_window
+        self.parent = None # tail() 产生的子窗口指向整段特征帧，end 为子窗口最后一行在整段中的索引
+        self.end = len(df) - 1 if df is not None else -1
+        self._columns = {}
+        self._builders = {}
+        self._register(['rsi'], self._build_rsi)
+        self._register(['ma', 'std', 'upper', 'lower'], self._build_bollinger)
+        self._register(['bb_width'], self._build_bb_width)
+        self._register(['adx'], self._build_adx)
+        self._register(['volume_change'], self._build_volume_change)
+        self._register(['macd', 'macd_signal', 'macd_hist'], self._build_macd)
+        self._register(['stoch_rsi'], self._build_stoch_rsi)
+        self._register(['hammer_up_prob', 'doji_up_prob', 'engulfing_up_prob', 'engulfing_down_prob'], self._build_pattern_probs)
+        self._register(['trend'], lambda: {'trend': self.df['close'].pct_change(5).shift(1)})
+        self._register(['volume_trend'], lambda: {'volume_trend': self.df['volume'].pct_change(5).shift(1)})
+        self._register(['volatility'], lambda: {'volatility': self.df['close'].rolling(20).std()})
+        self._register(['price_range'], lambda: {'price_range': (self.df['high'] - self.df['low']) / self.df['close']})
+        self._register(['future_return', 'label'], self._build_label)
+        self._register(['ta_adx'], self._build_ta_adx)
+        self._register(['atr'], self._build_atr)
+
+    def _register(self, names, builder):
+        for name in names:
+            self._builders[name] = builder
+
+    def matches(self, df):
+        """判断该特征帧是否对应给定的数据窗口"""
+        return df is self.df or window_key(df) == self.key
+
+    def __contains__(self, name):
+        return name in self._builders
+
+    def __getitem__(self, name):
+        if name not in self._columns:
+            if name not in self._builders:
+                raise KeyError(f"Unknown feature: {name}")
+            self._columns.update(self._builders[name]())
+        return self._columns[name]
+
+    def tail(self, end, length):
+        """
+        返回以第 end 行（含）结尾、长度为 length 的子窗口特征帧。
+        子窗口的列直接切片自本特征帧（整段只计算一次），适用于所有因果指标；
+        future_return / label 依赖未来数据，因此在子窗口中按窗口重新计算。
+        """
+        start = max(0, end + 1 - length)
+        view = FeatureFrame(self.df.iloc[start:end + 1], atr_window=self.atr_window)
+        offset = self.end + 1 - len(self.df) if self.parent is not None else 0 # 本帧第一行在整段中的索引
+        view.parent = self.parent if self.parent is not None else self
+        view.end = offset + end
+        for name, builder in self._builders.items():
+            if builder != self._build_label:
+                view._builders[name] = self._slice_builder(name, start, end + 1)
+        return view
+
+    def _slice_builder(self, name, start, stop):
+        return lambda: {name: self[name].iloc[start:stop]}
+
+    def frame(self, columns):
+        """返回原始 OHLCV 加上指定特征列的新 DataFrame"""
+        out = self.df.copy()
+        for name in columns:
+            out[name] = self[name]
+        return out
+
+    # --- 构建函数 ---
+    def _build_rsi(self):
+        return {'rsi': calculate_rsi(self.df['close'], window=14)}
+
+    def _build_bollinger(self):
+        bb = calculate_bollinger_bands(self.df[['close']], window=20)
+        return {name: bb[name] for name in ('ma', 'std', 'upper', 'lower')}
+
+    def _build_bb_width(self):
+        return {'bb_width': (self['upper'] - self['lower']) / self['ma']}
+
+    def _build_adx(self):
+        return {'adx': calculate_adx(self.df)}
+
+    def _build_volume_change(self):
+        return {'volume_change': self.df['volume'] / self.df['volume'].shift(1)}
+
+    def _build_macd(self):
+        macd, macd_signal, macd_hist = calc_macd(self.df['close'])
+        return {'macd': macd, 'macd_signal': macd_signal, 'macd_hist': macd_hist}
+
+    def _build_stoch_rsi(self):
+        return {'stoch_rsi': calc_stochrsi(self.df['close'])}
+
+    def _build_pattern_probs(self):
+        probs = calculate_pattern_probabilities(self.df, lookback=5)
+        return {name: probs[name] for name in probs.columns}
+
+    def _build_label(self):
+        future_return = self.df['close'].shift(-5) / self.df['close'] - 1
+        return {'future_return': future_return, 'label': (future_return > 0).astype(int)}
+
+    def _build_ta_adx(self):
+        # MarketStateDetector 使用 ta 库的 Wilder ADX，与 calculate_adx 的口径不同
+        adx = ADXIndicator(high=self.df['high'], low=self.df['low'], close=self.df['close'], window=14).adx()
+        return {'ta_adx': adx}
+
+    def _build_atr(self):
+        atr = AverageTrueRange(high=self.df['high'], low=self.df['low'], close=self.df['close'], window=self.atr_window).average_true_range()
+        return {'atr': atr}
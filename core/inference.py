@@ -0,0 +1,180 @@
+# core/inference.py
+# 轻量推理：把训练好的模型导出为 XGBoost 原生格式 (UBJ / JSON) + 一个小的元数据文件，
+# 实盘用 FastPredictor 加载并推理：
+# - 不导入 xgboost / sklearn / joblib 包（xgboost 包在导入时会连带导入 sklearn，冷启动约 2 秒），
+#   直接通过 ctypes 调用 xgboost 包自带的 libxgboost 动态库；
+# - MinMaxScaler 折算为逐列的 scale / offset 保存在元数据中，推理时原地计算；
+# - 单根 K 线推理使用预分配的 float32 行缓冲区，数组接口描述和预测参数只构建一次，
+#   每次推理只有一次 C 调用，不复制输入，不构建 DMatrix。
+#
+# 导出：python export_model.py               （导出注册表最新版本）
+#       python export_model.py --version 3 --output models/export/xgboost.json
+
+import ctypes
+import importlib.util
+import json
+import os
+
+import numpy as np
+
+EXPORT_PATH = "models/export/xgboost.ubj" # 扩展名决定格式：.ubj (二进制，更小更快) 或 .json
+
+
+def meta_path(path):
+    """模型文件对应的元数据文件路径 (xgboost.ubj -> xgboost.meta.json)"""
+    return os.path.splitext(path)[0] + ".meta.json"
+
+
+def export_model(model, scaler=None, path=EXPORT_PATH, features=None, metadata=None):
+    """
+    把模型（XGBClassifier / BoosterModel / Booster）导出为原生格式，返回模型文件路径。
+    模型文件和元数据都先写临时文件再原子替换，实盘进程不会读到写了一半的文件。
+
+    Args:
+        scaler: 训练时使用的 MinMaxScaler（native 引擎为 None），折算为 scale / offset 写入元数据。
+        features (list): 特征列顺序，默认 AI_FEATURES。
+        metadata (dict): 附加信息（注册表版本等）。
+    """
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    if features is None:
+        from core.feature_frame import AI_FEATURES
+        features = AI_FEATURES
+    meta = {"features": list(features), "format": os.path.splitext(path)[1].lstrip("."),
+            "trees": booster.num_boosted_rounds(), **(metadata or {})}
+    if scaler is not None:
+        meta["scale"] = np.asarray(scaler.scale_, dtype=np.float64).tolist()
+        meta["offset"] = np.asarray(scaler.min_, dtype=np.float64).tolist()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    stem, ext = os.path.splitext(path)
+    tmp_model = f"{stem}.tmp-{os.getpid()}{ext}" # xgboost 按扩展名选择保存格式
+    booster.save_model(tmp_model)
+    tmp_meta = f"{meta_path(path)}.tmp-{os.getpid()}"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, default=str)
+    os.replace(tmp_model, path)
+    os.replace(tmp_meta, meta_path(path))
+    print(f"[Inference] Exported model ({meta['trees']} trees) to {path}")
+    return path
+
+
+def _load_library():
+    """定位并加载 xgboost 包自带的动态库（find_spec 只查找路径，不执行 xgboost/__init__.py）"""
+    spec = importlib.util.find_spec("xgboost")
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError("xgboost is not installed")
+    names = {"posix": ["libxgboost.so", "libxgboost.dylib"], "nt": ["xgboost.dll"]}.get(os.name, ["libxgboost.so"])
+    for base in spec.submodule_search_locations:
+        for folder in (os.path.join(base, "lib"), base):
+            for name in names:
+                if os.path.exists(os.path.join(folder, name)):
+                    lib = ctypes.cdll.LoadLibrary(os.path.join(folder, name))
+                    lib.XGBGetLastError.restype = ctypes.c_char_p
+                    return lib
+    raise ImportError("libxgboost shared library not found")
+
+
+_LIB = None
+
+
+def _lib():
+    global _LIB
+    if _LIB is None:
+        _LIB = _load_library()
+    return _LIB
+
+
+def _check(ret):
+    if ret != 0:
+        raise RuntimeError(f"XGBoost error: {_LIB.XGBGetLastError().decode()}")
+
+
+class FastPredictor:
+    """
+    导出模型的最小推理器，接口与 AIPredictor 的预测结果一致：返回 (预测类别, 预测类别的概率)。
+
+    单根 K 线：把特征写入 self.row（形状为 (1, 特征数) 的 float32 缓冲区，带 scaler 的旧模型为 float64）后调用 predict_row()，
+    或把任意 C 连续 float32 行直接传给 predict_row(row)（不复制）。
+    """
+
+    def __init__(self, path=EXPORT_PATH, nthread=1):
+        """
+        Args:
+            path (str): export_model 导出的模型文件。
+            nthread (int): 推理线程数；单行推理用 1 个线程最快（避免线程池调度开销）。
+        """
+        with open(meta_path(path), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        self.path = path
+        self.features = self.metadata["features"]
+        n = len(self.features)
+        # 缩放按 float64 计算后再转为 float32，与 MinMaxScaler.transform + XGBoost 推理的数值完全一致
+        self.scale = np.asarray(self.metadata["scale"], dtype=np.float64) if "scale" in self.metadata else None
+        self.offset = np.asarray(self.metadata["offset"], dtype=np.float64) if "offset" in self.metadata else None
+
+        lib = _lib()
+        self._handle = ctypes.c_void_p()
+        _check(lib.XGBoosterCreate(None, ctypes.c_uint64(0), ctypes.byref(self._handle)))
+        _check(lib.XGBoosterLoadModel(self._handle, os.fsencode(path)))
+        _check(lib.XGBoosterSetParam(self._handle, b"nthread", str(nthread).encode()))
+        self._predict = lib.XGBoosterPredictFromDense
+        self._config = json.dumps({"type": 0, "training": False, "iteration_begin": 0, "iteration_end": 0,
+                                   "missing": float("nan"), "strict_shape": False, "cache_id": 0}).encode()
+
+        # 预分配的行缓冲区（缩放后的数据写入 _scaled），数组接口描述只构建一次；
+        # 带 scaler 的旧模型在缩放前不能先截断为 float32，行缓冲区使用 float64
+        self.row = np.zeros((1, n), dtype=np.float64 if self.scale is not None else np.float32)
+        self._scaled = np.zeros((1, n), dtype=np.float32)
+        self._work = np.zeros((1, n), dtype=np.float64)
+        self._row_interface = self._interface(self._scaled if self.scale is not None else self.row)
+        self._shape = ctypes.POINTER(ctypes.c_uint64)()
+        self._dims = ctypes.c_uint64()
+        self._out = ctypes.POINTER(ctypes.c_float)()
+
+    @staticmethod
+    def _interface(X):
+        return json.dumps({"data": [X.ctypes.data, False], "shape": list(X.shape), "strides": None,
+                           "typestr": "<f4", "version": 3}).encode()
+
+    def _run(self, interface):
+        _check(self._predict(self._handle, interface, self._config, None, ctypes.byref(self._shape),
+                             ctypes.byref(self._dims), ctypes.byref(self._out)))
+
+    def predict_row(self, row=None):
+        """对一行特征推理；row 为 None 时使用 self.row 中的数据"""
+        if row is None:
+            source, interface = self.row, self._row_interface
+        else:
+            source = np.asarray(row, dtype=self.row.dtype).reshape(1, -1) # 与行缓冲区同类型的连续输入时只是视图
+            interface = None
+        if self.scale is not None:
+            np.multiply(source, self.scale, out=self._work)
+            np.add(self._work, self.offset, out=self._work)
+            self._scaled[...] = self._work
+            interface = self._row_interface
+        elif interface is None:
+            source = np.ascontiguousarray(source)
+            interface = self._interface(source)
+        self._run(interface)
+        p1 = float(self._out[0])
+        return (1, p1) if p1 > 0.5 else (0, 1.0 - p1)
+
+    def predict_proba(self, X):
+        """批量推理，返回 [[P(0), P(1)], ...]（与 XGBClassifier.predict_proba 相同的形状）"""
+        if self.scale is not None:
+            X = np.asarray(X, dtype=np.float64) * self.scale + self.offset
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        self._run(self._interface(X))
+        p1 = np.ctypeslib.as_array(self._out, shape=(len(X),)).copy() # 结果缓冲区属于 booster，下次推理会被覆盖
+        return np.column_stack([1 - p1, p1])
+
+    def close(self):
+        if self._handle:
+            _LIB.XGBoosterFree(self._handle)
+            self._handle = ctypes.c_void_p()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,160 @@
+# core/kline_stream.py
+# 基于 asyncio 的 WebSocket K 线订阅：维护已收盘 K 线的内存环形缓冲区 (OHLCVRingBuffer)，
+# 在交易所推送“K 线已收盘”消息的瞬间触发回调（替代按整根 K 线周期 sleep + REST 轮询）。
+# 连接断开后指数退避重连，重连后通过 backfill 回调（通常是 REST fetch_ohlcv）补齐断线期间缺失的 K 线。
+# 消息格式为 Binance kline 流；本地测试可使用 core/replay_server.py 回放历史数据。
+
+import asyncio
+import inspect
+import json
+import time
+
+import pandas as pd
+
+from core.data_store import OHLCV_COLUMNS
+from core.downloader import symbol_to_filename, timeframe_to_ms
+from core.ring_buffer import OHLCVRingBuffer
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443/ws"
+
+
+def stream_url(symbol, timeframe, base_url=BINANCE_WS_URL):
+    """'BTC/USDT', '4h' -> wss://.../btcusdt@kline_4h"""
+    return f"{base_url.rstrip('/')}/{symbol_to_filename(symbol).lower()}@kline_{timeframe}"
+
+
+def parse_kline(message):
+    """
+    解析 Binance kline 消息，返回 (row, is_closed)；row 为 [开盘时间毫秒, open, high, low, close, volume]。
+    非 kline 消息返回 (None, False)。同时兼容组合流 {"stream": ..., "data": {...}} 格式。
+    """
+    data = json.loads(message) if isinstance(message, (str, bytes)) else message
+    data = data.get("data", data)
+    if data.get("e") != "kline" or "k" not in data:
+        return None, False
+    k = data["k"]
+    row = [int(k["t"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]), float(k["v"])]
+    return row, bool(k["x"])
+
+
+async def _maybe_await(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class KlineStream:
+    def __init__(self, symbol="BTC/USDT", timeframe="4h", url=None, capacity=500, on_close=None, backfill=None,
+                 reconnect_delay=1.0, max_reconnect_delay=60.0):
+        """
+        Args:
+            url (str): WebSocket 地址，默认 Binance 现货 kline 流；测试时指向本地回放服务器。
+            capacity (int): 缓冲区保留的已收盘 K 线数量。
+            on_close: K 线收盘回调 on_close(stream)，可以是普通函数或协程函数。
+            backfill: 补数据回调 backfill(since_ms) -> [[ts, o, h, l, c, v], ...]，普通函数会在线程中执行。
+        """
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.step = timeframe_to_ms(timeframe)
+        self.url = url or stream_url(symbol, timeframe)
+        self.buffer = OHLCVRingBuffer(capacity)
+        self.on_close = on_close
+        self.backfill = backfill
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.latest = None # 最新一条（可能未收盘的）K 线
+        self.last_latency_ms = None # 最近一次收盘消息的事件时间到回调完成的耗时
+        self.closed_count = 0
+        self._stopped = False
+
+    # --- 缓冲区 ---
+    def seed(self, rows):
+        """用历史 K 线（ccxt 列表或 DataFrame）预热缓冲区；只应包含已收盘的 K 线"""
+        if isinstance(rows, pd.DataFrame):
+            from core.data_store import to_epoch_ms
+            rows = rows.assign(timestamp=to_epoch_ms(rows["timestamp"]))[OHLCV_COLUMNS].values.tolist()
+        for row in rows:
+            self._push([int(row[0])] + [float(v) for v in row[1:6]])
+
+    def _push(self, row):
+        """追加一根已收盘 K 线（按开盘时间去重，重复推送时以新数据为准），返回是否为新 K 线"""
+        last = self.buffer.last_timestamp()
+        if last is not None and row[0] <= last:
+            if row[0] == last:
+                self.buffer.update_last(*row)
+            return False
+        self.buffer.append(*row)
+        return True
+
+    def last_closed_timestamp(self):
+        return self.buffer.last_timestamp()
+
+    def frame(self, n=None):
+        """缓冲区内最近 n 根已收盘 K 线的零拷贝 DataFrame（timestamp 为 datetime），供 SignalGenerator 使用"""
+        return self.buffer.frame(n)
+
+    # --- 事件处理 ---
+    async def _fill_gap(self, until_ms):
+        """缓冲区最后一根与 until_ms 之间缺失 K 线时调用 backfill 补齐"""
+        last = self.last_closed_timestamp()
+        if self.backfill is None or last is None or until_ms - last <= self.step:
+            return
+        try:
+            rows = await _maybe_await(self.backfill(last + self.step))
+        except Exception as e:
+            print(f"[Stream] WARNING: backfill since {pd.to_datetime(last + self.step, unit='ms')} failed: {e}")
+            return
+        rows = [r for r in rows or [] if last < r[0] < until_ms]
+        for row in rows:
+            self._push([int(row[0])] + [float(v) for v in row[1:6]])
+        if rows:
+            print(f"[Stream] Backfilled {len(rows)} missed candles.")
+
+    async def handle_message(self, message):
+        data = json.loads(message) if isinstance(message, (str, bytes)) else message
+        row, closed = parse_kline(data)
+        if row is None:
+            return
+        self.latest = row
+        if not closed:
+            return
+        await self._fill_gap(row[0])
+        if not self._push(row):
+            return # 重复的收盘消息（例如重连后重发）不重复触发
+        self.closed_count += 1
+        if self.on_close is not None:
+            await _maybe_await(self.on_close(self))
+        event_ms = data.get("data", data).get("E")
+        if event_ms:
+            self.last_latency_ms = time.time() * 1000 - event_ms
+
+    def stop(self):
+        self._stopped = True
+
+    async def run(self):
+        """连接并持续消费 K 线消息，断线（包括服务端关闭连接）后指数退避重连，直到调用 stop()"""
+        import websockets
+
+        if self.backfill is not None and not inspect.iscoroutinefunction(self.backfill):
+            sync_backfill = self.backfill
+            self.backfill = lambda since: asyncio.to_thread(sync_backfill, since) # 阻塞的 REST 请求放到线程中执行
+
+        delay = self.reconnect_delay
+        while not self._stopped:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    print(f"[Stream] Connected: {self.url}")
+                    delay = self.reconnect_delay
+                    async for message in ws:
+                        await self.handle_message(message)
+                        if self._stopped:
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Stream] WARNING: connection error: {e}")
+            if self._stopped:
+                break
+            print(f"[Stream] Reconnecting in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
@@ -0,0 +1,295 @@
+# core/live_engine.py
+# 基于 asyncio 的实盘引擎：行情、账户状态轮询和订单状态跟踪作为相互独立的并发任务运行，通知由 Notifier 的后台线程发送，
+# 慢速的余额查询或 Telegram 通知不会推迟新 K 线上的交易决策。
+# 所有交易所调用都通过异步接口完成：可以直接传入 ccxt.async_support 的交易所，
+# 也可以传入同步的 ccxt 交易所 / FakeExchange（由 AsyncExchange 放到线程中执行），便于用模拟交易所测试。
+
+import asyncio
+import inspect
+import time
+import traceback
+
+import pandas as pd
+
+from core.downloader import timeframe_to_ms
+from core.feature_frame import FeatureFrame
+from core.kline_stream import KlineStream
+
+
+class AsyncExchange:
+    """把同步交易所对象的方法包装为协程（在线程中执行）；本身就是协程的方法原样返回"""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def __getattr__(self, name):
+        attr = getattr(self.exchange, name)
+        if not callable(attr) or inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+
+class LiveEngine:
+    def __init__(self, config, exchange, signal_generator, executor, risk, notifier, warmup_bars=200):
+        """
+        Args:
+            exchange: ccxt 交易所（同步或 async_support）或 FakeExchange。
+            warmup_bars (int): 信号计算使用的 K 线窗口长度（环形缓冲区容量）。
+        """
+        trading_cfg = config.get("trading", {})
+        live_cfg = config.get("live", {})
+        self.symbol = trading_cfg.get("symbol", "BTC/USDT")
+        self.timeframe = trading_cfg.get("timeframe", "4h")
+        self.base_currency, self.quote_currency = self.symbol.split("/")[:2]
+        self.mode = live_cfg.get("mode", "stream")
+        self.balance_interval = live_cfg.get("balance_interval", 60) # 账户状态轮询间隔（秒）
+        self.order_poll_interval = live_cfg.get("order_poll_interval", 5) # 订单状态轮询间隔（秒）
+        self.initial_balance = config.get("risk", {}).get("initial_balance", 10000.0)
+        self.warmup_bars = warmup_bars
+
+        self.exchange = AsyncExchange(exchange)
+        self.signal_generator = signal_generator
+        self.executor = executor
+        self.risk = risk
+        self.notifier = notifier
+        self.stream = KlineStream(self.symbol, self.timeframe, url=live_cfg.get("ws_url"), capacity=warmup_bars,
+                                  on_close=self._on_close, backfill=self._backfill)
+
+        self.paper = executor.simulate # 模拟执行器：资金和持仓由本地维护，不轮询交易所账户
+        self.holdings = 0.0 # 策略自己的持仓：只由本引擎订单的成交量更新，不包含账户中原有的基础货币
+        self.account_holdings = 0.0 # 交易所账户中基础货币的总量（由账户轮询更新，只用于核对和展示）
+        self.min_amount = 0.0 # 交易对的最小下单数量 / 最小成交额（load_markets 获取），低于它们的持仓视为空仓
+        self.min_cost = 0.0
+        self.pending_orders = {} # order_id -> 下单时的订单字典
+        self._submitting = 0 # 已决定但下单请求尚未返回的订单数
+        self._tasks = set()
+        self._stopped = False
+
+    # --- 通知 ---
+    def notify(self, message):
+        """非阻塞：Notifier 把消息放入队列，由其后台线程批量发送"""
+        try:
+            self.notifier.notify(message)
+        except Exception as e:
+            print(f"[Live] WARN: Failed to queue notification: {e}")
+
+    # --- 行情 ---
+    async def _backfill(self, since_ms):
+        return await self.exchange.fetch_ohlcv(self.symbol, timeframe=self.timeframe, since=since_ms, limit=self.warmup_bars)
+
+    async def warm_up(self):
+        """用 REST 加载最近 warmup_bars 根已收盘 K 线"""
+        step = timeframe_to_ms(self.timeframe)
+        try:
+            ohlcv = await self.exchange.fetch_ohlcv(self.symbol, timeframe=self.timeframe, limit=self.warmup_bars + 1)
+            now_ms = int(time.time() * 1000)
+            self.stream.seed([row for row in ohlcv or [] if row[0] + step <= now_ms])
+            print(f"[Live] Warm-up: {len(self.stream.buffer)} closed candles loaded.")
+        except Exception as e:
+            print(f"[Live] WARN: Warm-up fetch failed: {e}. Signals start once enough candles have arrived.")
+
+    async def _poll_loop(self):
+        """轮询模式：在每根 K 线收盘时刻之后发起 REST 请求（对齐收盘时间，不会随执行时间漂移）"""
+        step = timeframe_to_ms(self.timeframe)
+        while not self._stopped:
+            now_ms = time.time() * 1000
+            next_close = (now_ms // step + 1) * step
+            await asyncio.sleep((next_close - now_ms) / 1000 + 1.0) # 收盘后 1 秒再请求，确保交易所已生成该 K 线
+            try:
+                ohlcv = await self.exchange.fetch_ohlcv(self.symbol, timeframe=self.timeframe, limit=5)
+            except Exception as e:
+                print(f"[Live] Error fetching data: {e}")
+                continue
+            now_ms = int(time.time() * 1000)
+            for row in ohlcv or []:
+                if row[0] + step <= now_ms:
+                    await self.stream.handle_message({"e": "kline", "E": now_ms, "k": {
+                        "t": row[0], "o": row[1], "h": row[2], "l": row[3], "c": row[4], "v": row[5], "x": True}})
+
+    # --- 账户与订单 ---
+    async def load_market_limits(self):
+        try:
+            markets = await self.exchange.load_markets()
+            limits = ((markets or {}).get(self.symbol) or {}).get("limits") or {}
+            self.min_amount = float((limits.get("amount") or {}).get("min") or 0.0)
+            self.min_cost = float((limits.get("cost") or {}).get("min") or 0.0)
+        except Exception as e:
+            print(f"[Live] WARN: Could not load market limits: {e}")
+
+    def is_flat(self, price):
+        """策略持仓低于最小下单数量或最小成交额（无法卖出的零头）时视为空仓"""
+        return self.holdings < max(self.min_amount, 1e-9) or self.holdings * price < self.min_cost
+
+    async def refresh_account(self):
+        try:
+            balance = await self.exchange.fetch_balance()
+            quote_total = balance["total"][self.quote_currency]
+            self.account_holdings = balance["total"].get(self.base_currency, 0.0) or 0.0
+            # 手续费从基础货币中扣除或账户被手动转出时，策略最多只能卖出账户中实际存在的数量
+            self.holdings = min(self.holdings, self.account_holdings)
+            self.risk.set_balance(quote_total)
+            return True
+        except Exception as e:
+            print(f"[Live] WARN: Could not fetch balance/holdings: {e}")
+            return False
+
+    async def _account_loop(self):
+        while True:
+            await asyncio.sleep(self.balance_interval)
+            await self.refresh_account()
+
+    async def _order_loop(self):
+        """跟踪已提交订单的状态，成交或撤销后更新持仓并通知"""
+        while True:
+            await asyncio.sleep(self.order_poll_interval)
+            for order_id, order in list(self.pending_orders.items()):
+                try:
+                    status = await self.exchange.fetch_order(order_id, self.symbol)
+                except Exception as e:
+                    print(f"[Live] WARN: fetch_order({order_id}) failed: {e}")
+                    continue
+                if status.get("status") in ("closed", "canceled", "expired", "rejected"):
+                    self.pending_orders.pop(order_id, None)
+                    filled = status.get("filled") or 0.0
+                    if filled:
+                        self.holdings = max(0.0, self.holdings + (filled if order["action"] == "buy" else -filled))
+                        await self.refresh_account() # 以交易所账户为准更新余额
+                    self.notify(f"📌 Order {order_id} {status['status']}: {order['action']} {filled:.6f} {self.symbol} @ {status.get('average') or status.get('price')}")
+
+    # --- 决策与下单 ---
+    def decide(self, df):
+        """基于已收盘 K 线窗口生成信号并返回要执行的订单（无操作时返回 None）。纯计算，不做 I/O，由 _on_close 放到线程中执行"""
+        if not self.risk.validate_trade(0, 0):
+            print("[Live] Trading is paused due to max drawdown. Waiting for the next candle.")
+            return None
+        if df is None or len(df) < 100: # 确保有足够数据计算指标
+            print(f"[Live] ⚠️ Data insufficient (need > 100, got: {len(df) if df is not None else 0}), skipping this candle.")
+            return None
+
+        # 指标只计算一次：信号生成、执行器滑点和止损止盈共用同一个特征帧 / ATR
+        features = FeatureFrame(df)
+        latest_atr = features['atr'].iloc[-1]
+        latest_atr = float(latest_atr) if pd.notna(latest_atr) else 0.0
+        self.executor.update_data(df, atr=latest_atr)
+        current_price = float(df['close'].iloc[-1])
+        current_timestamp = df['timestamp'].iloc[-1]
+        print(f"[Live] Candle closed. Current Price: {current_price:.2f}, Timestamp: {current_timestamp}")
+
+        signal = self.signal_generator.generate(df, features=features)
+        if not signal:
+            print("[Live] No signal generated.")
+            return None
+        print(f"[Live] Signal generated: {signal}")
+        action = signal["action"]
+        order = {"symbol": self.symbol, "action": action, "price": current_price, "timestamp": current_timestamp,
+                 "structure": signal["structure"], "confidence": signal["confidence"]}
+
+        if action == "buy" and self.is_flat(current_price) and not self._busy(): # 只在无持仓时买入
+            stop_loss_price, take_profit_price = self.risk.calculate_sl_tp_prices(current_price, latest_atr, action)
+            if stop_loss_price is None:
+                print("[Live] Could not calculate Stop Loss.")
+                return None
+            order_size = self.risk.calculate_position_size(current_price, stop_loss_price, self.symbol)
+            if order_size <= 0:
+                print("[Live] Calculated order size is zero.")
+                return None
+            if not self.risk.validate_trade(order_size, current_price):
+                print("[Live] Trade validation failed (Risk).")
+                return None
+            return {**order, "amount": order_size}
+        if action == "sell" and not self.is_flat(current_price) and not self._busy(): # 卖出策略自己的全部持仓 (平仓)
+            return {**order, "amount": self.holdings, "structure": "exit_signal"}
+        return None
+
+    def _busy(self):
+        """有订单正在提交或尚未终结时不再下新单（避免同一持仓被重复买入 / 卖出）"""
+        return bool(self.pending_orders) or self._submitting > 0
+
+    async def _execute(self, order):
+        """在线程中执行订单（下单 I/O 不阻塞行情处理），根据结果登记跟踪或直接更新持仓"""
+        print(f"[Live] Attempting to execute {order['action'].upper()} order: {order}")
+        try:
+            result = await asyncio.to_thread(self.executor.execute, order)
+        except Exception as e:
+            self.notify(f"❌ Live {order['action'].upper()} order failed: {e}")
+            return
+        finally:
+            self._submitting -= 1
+        if result and result.get("status") == "submitted" and result.get("order_id"):
+            self.pending_orders[result["order_id"]] = order
+            self.notify(f"✅ Live {order['action'].upper()} Order Submitted: {order['amount']:.6f} {self.symbol}. Order ID: {result['order_id']}")
+        elif result and "status" not in result:
+            # 模拟执行器：立即成交
+            self.holdings = self.executor.get_holdings()
+            if result.get("pnl"):
+                self.risk.update_balance(result["pnl"])
+            self.notify(f"✅ Paper {order['action'].upper()} filled: {result['amount']:.6f} {self.symbol} @ {result['price']:.2f}")
+        else:
+            self.notify(f"⚠️ Live {order['action'].upper()} Order Execution Failed/Not Implemented. Result: {result}")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def prepare_model(self):
+        """开始接收行情前加载 AI 模型；没有已保存的模型时用预热 K 线训练一次（在线程中执行，不阻塞事件循环）"""
+        predictor = getattr(self.signal_generator, "predictor", None)
+        if predictor is None or predictor.model is not None:
+            return
+
+        def prepare():
+            if not predictor.load():
+                print("[Live] No saved model found, training with the warm-up candles...")
+                predictor.train_rolling(self.stream.frame())
+        try:
+            await asyncio.to_thread(prepare)
+        except Exception as e:
+            print(f"[Live] WARN: Could not prepare the AI model: {e}. It will be loaded on the first candle.")
+
+    async def _on_close(self, stream):
+        try:
+            # 信号计算（含首次调用时可能的模型训练）在线程中执行，账户轮询、订单跟踪和 WebSocket 心跳不被阻塞；
+            # 行情读取协程等待本回调返回，期间到达的消息留在连接缓冲区中，决策仍按 K 线顺序逐根进行
+            order = await asyncio.to_thread(self.decide, stream.frame())
+            if order:
+                self._submitting += 1
+                self._spawn(self._execute(order))
+        except Exception as e:
+            err_msg = f"[Live] ❌ An error occurred while processing the candle: {e}"
+            print(err_msg)
+            traceback.print_exc()
+            self.notify(f"{err_msg}\n{traceback.format_exc()}")
+
+    # --- 生命周期 ---
+    def stop(self):
+        self._stopped = True
+        self.stream.stop()
+
+    async def run(self):
+        """初始化账户与行情后并发运行：行情（流式或轮询）、账户轮询、订单跟踪"""
+        if self.paper:
+            self.risk.set_balance(self.initial_balance)
+        elif not await self.refresh_account():
+            self.notify("⚠️ Warning: Could not fetch initial balance/holdings. Using default balance.")
+            self.risk.set_balance(self.initial_balance)
+        await self.load_market_limits()
+        print(f"[Live] Balance: {self.risk.current_balance:.2f} {self.quote_currency}, account holdings: {self.account_holdings:.6f} {self.base_currency} "
+              f"(not managed by the strategy), min amount: {self.min_amount}, min cost: {self.min_cost}")
+        await self.warm_up()
+        await self.prepare_model()
+
+        market = self.stream.run() if self.mode == "stream" else self._poll_loop()
+        loops = [] if self.paper else [self._account_loop(), self._order_loop()]
+        background = [self._spawn(loop) for loop in loops]
+        print(f"[Live] Engine started ({self.mode} mode). Symbol: {self.symbol}, Timeframe: {self.timeframe}.")
+        try:
+            await market
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
@@ -1,34 +1,35 @@
 # core/market_state.py
 
 import pandas as pd
-from ta.trend import ADXIndicator
-from ta.volatility import AverageTrueRange
-from utils.indicators import calculate_bollinger_bands
+from core.feature_frame import FeatureFrame
 
 class MarketStateDetector:
-    def __init__(self, adx_threshold=30, atr_window=14):
+    def __init__(self, adx_threshold=30, atr_window=14, trend_cutoff=0.7, range_cutoff=0.005):
         self.adx_threshold = adx_threshold
         self.atr_window = atr_window
+        self.trend_cutoff = trend_cutoff # 综合得分高于该值判定为趋势
+        self.range_cutoff = range_cutoff # 综合得分低于该值判定为震荡
 
-    def detect_state(self, df: pd.DataFrame) -> str:
+    def detect_state(self, df: pd.DataFrame, features: FeatureFrame = None) -> str:
         if len(df) < self.atr_window + 10:
             return "unknown"
 
+        # 复用调用方已计算好的特征帧，窗口不一致时重新构建
+        if features is None or not features.matches(df) or features.atr_window != self.atr_window:
+            features = FeatureFrame(df, atr_window=self.atr_window)
+
         try:
             # ADX计算
-            adx = ADXIndicator(high=df['high'], low=df['low'], close=df['close'], window=14).adx()
-            latest_adx = adx.iloc[-1]
+            latest_adx = features['ta_adx'].iloc[-1]
 
             # ATR计算
-            atr = AverageTrueRange(high=df['high'], low=df['low'], close=df['close'], window=self.atr_window).average_true_range()
-            latest_atr = atr.iloc[-1]
+            latest_atr = features['atr'].iloc[-1]
             close_price = df['close'].iloc[-1]
             atr_ratio = latest_atr / close_price
 
             # 布林带宽度
-            df = calculate_bollinger_bands(df, window=20)
-            bb_width = (df['upper'] - df['lower']) / df['ma']
-            avg_bb_width = bb_width[-20:-1].mean()
+            bb_width = features['bb_width']
+            avg_bb_width = bb_width.iloc[-20:-1].mean()
             current_bb_width = bb_width.iloc[-1]
 
             # 成交量分析
@@ -37,8 +38,8 @@ class MarketStateDetector:
             volume_spike = current_volume > 2 * avg_volume
 
             # 波动率和成交量趋势
-            volatility = df['close'].rolling(20).std().iloc[-1]
-            avg_volatility = df['close'].rolling(20).std()[-20:-1].mean()
+            volatility = features['volatility'].iloc[-1]
+            avg_volatility = features['volatility'].iloc[-20:-1].mean()
             volume_trend = (current_volume - df['volume'].iloc[-5]) / df['volume'].iloc[-5]
 
             # 综合判断
@@ -55,9 +56,9 @@ class MarketStateDetector:
                           volatility_weight * (volatility / avg_volatility) +
                           volume_trend_weight * max(0, volume_trend))
 
-            if trend_score > 0.7:
+            if trend_score > self.trend_cutoff:
                 return "trending"
-            elif trend_score < 0.005:
+            elif trend_score < self.range_cutoff:
                 return "ranging"
             else:
                 return "neutral"
@@ -0,0 +1,143 @@
+# core/model_registry.py
+# AI 模型注册表：
+# - 内存缓存：按 (训练窗口, 特征集哈希) 缓存训练好的模型，同一窗口不会重复训练
+#   （参数扫描的多个信号组、走步分析的重复窗口都会命中）；滚动训练只写内存，不做磁盘 I/O；
+# - 版本化持久化：只在显式 save 时写盘，每个版本一个目录 (models/registry/<name>/v0001/)，
+#   先写临时目录再原子重命名，最后原子更新 LATEST 指针；
+# - 惰性加载：第一次需要模型时才从磁盘读取最新版本。
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from core.feature_frame import window_key
+
+REGISTRY_DIR = "models/registry"
+LATEST_FILE = "LATEST"
+
+
+def feature_hash(feature_names, params=None):
+    """特征列（含顺序）与模型参数的短哈希：特征或参数变化后旧缓存自动失效"""
+    payload = json.dumps({"features": list(feature_names), "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def training_key(df, feature_names, params=None):
+    """训练缓存键：训练窗口标识 (长度 + 首尾时间戳 + 最后收盘价) + 特征集哈希"""
+    return window_key(df) + (feature_hash(feature_names, params),)
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR, name="xgboost", max_cached=256):
+        """
+        Args:
+            root (str): 持久化根目录。
+            name (str): 模型名称（子目录名）。
+            max_cached (int): 内存缓存最多保留的模型数（LRU 淘汰）。
+        """
+        self.root = root
+        self.name = name
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model_dir(self):
+        return os.path.join(self.root, self.name)
+
+    # --- 内存缓存 ---
+    def get(self, key):
+        """返回缓存的模型条目 (dict)，没有时返回 None"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def put(self, key, model, scaler=None, metadata=None):
+        entry = {"model": model, "scaler": scaler, "metadata": dict(metadata or {})}
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    # --- 磁盘持久化 ---
+    def versions(self):
+        """已保存的版本号列表（升序）"""
+        if not os.path.isdir(self.model_dir):
+            return []
+        return sorted(int(d[1:]) for d in os.listdir(self.model_dir) if d.startswith("v") and d[1:].isdigit())
+
+    def latest_version(self):
+        path = os.path.join(self.model_dir, LATEST_FILE)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def version_dir(self, version):
+        return os.path.join(self.model_dir, f"v{version:04d}")
+
+    def save(self, model, scaler=None, metadata=None):
+        """把模型保存为新版本并更新 LATEST 指针，返回版本号。写入过程中断不会留下不完整的版本"""
+        import joblib
+
+        os.makedirs(self.model_dir, exist_ok=True)
+        with self._lock:
+            version = (max(self.versions(), default=0)) + 1
+            tmp_dir = os.path.join(self.model_dir, f".v{version:04d}.tmp-{os.getpid()}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            joblib.dump(model, os.path.join(tmp_dir, "model.pkl"))
+            if scaler is not None:
+                joblib.dump(scaler, os.path.join(tmp_dir, "scaler.pkl"))
+            meta = {"version": version, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **(metadata or {})}
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2, default=str)
+            os.rename(tmp_dir, self.version_dir(version))
+
+            latest_tmp = os.path.join(self.model_dir, f".{LATEST_FILE}.tmp-{os.getpid()}")
+            with open(latest_tmp, "w", encoding="utf-8") as f:
+                f.write(str(version))
+            os.replace(latest_tmp, os.path.join(self.model_dir, LATEST_FILE))
+        print(f"[Registry] Saved {self.name} model version {version} to {self.version_dir(version)}")
+        return version
+
+    def load(self, version=None):
+        """从磁盘加载指定版本（默认最新），返回模型条目；没有已保存的版本时返回 None"""
+        version = self.latest_version() if version is None else version
+        if version is None:
+            return None
+        import joblib
+
+        path = self.version_dir(version)
+        scaler_path = os.path.join(path, "scaler.pkl")
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        return {
+            "model": joblib.load(os.path.join(path, "model.pkl")),
+            "scaler": joblib.load(scaler_path) if os.path.exists(scaler_path) else None,
+            "metadata": metadata,
+        }
+
+
+_DEFAULT_REGISTRY = None
+
+
+def default_registry():
+    """进程内共享的注册表（同一进程中的所有 AIPredictor 共用内存缓存）"""
+    global _DEFAULT_REGISTRY
+    if _DEFAULT_REGISTRY is None:
+        _DEFAULT_REGISTRY = ModelRegistry()
+    return _DEFAULT_REGISTRY
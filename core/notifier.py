@@ -1,31 +1,155 @@
 # ✅ 通知模块：core/notifier.py
 # 功能：通过 Telegram Bot 向群组或个人发送交易信号或警报
+# notify() 只把消息放入队列并立即返回；后台线程负责发送：
+# - 短时间内的多条消息合并为一条批量消息发送（减少请求数，避免触发 Telegram 限流）；
+# - 发送失败按指数退避重试，Telegram 不可用时不会给交易循环增加任何延迟；
+# - 复用同一个 requests.Session（连接池 / keep-alive）。
 
 
 # core/notifier.py
 
-from core.config_loader import load_config
+import queue
+import threading
+import time
+
 import requests
 
+TELEGRAM_API_URL = "https://api.telegram.org"
+TELEGRAM_MAX_LENGTH = 4096 # Telegram 单条消息的最大长度
+
+
 class Notifier:
-    def __init__(self, config=None, enabled=True):
-        self.enabled = enabled
-        cfg = load_config().get("telegram", {})
-        self.token = cfg.get("bot_token", "")
-        self.chat_id = cfg.get("chat_id", "")
-        
-        if config is not None:
-            self.token = config.get("notifier", {}).get("telegram_token")
-            self.chat_id = config.get("notifier", {}).get("chat_id")
+    def __init__(self, config=None, enabled=True, batch_window=1.0, max_retries=5, backoff=1.0, max_queue=1000,
+                 api_url=TELEGRAM_API_URL):
+        """
+        Args:
+            config (dict): 已加载的配置（只在构造时读取一次）；为 None 时才从磁盘加载。
+            batch_window (float): 收到第一条消息后再等待多久收集后续消息，合并为一条发送（秒）。
+            max_retries (int): 单批消息发送失败后的最大重试次数，超过后丢弃该批。
+            backoff (float): 重试的初始等待时间（秒），每次失败翻倍。
+            max_queue (int): 队列最大长度，队列满时丢弃新消息（通知不能反压交易循环）。
+            api_url (str): Bot API 地址（可指向本地服务器做测试）。
+        """
+        if config is None:
+            from core.config_loader import load_config
+            config = load_config()
+        telegram_cfg = config.get("telegram", {}) or {}
+        notifier_cfg = config.get("notifier", {}) or {}
+        self.token = notifier_cfg.get("telegram_token") or telegram_cfg.get("bot_token", "")
+        self.chat_id = notifier_cfg.get("chat_id") or telegram_cfg.get("chat_id", "")
+        self.enabled = enabled and bool(self.token) and bool(self.chat_id)
+
+        self.api_url = api_url.rstrip("/")
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.dropped = 0
+        self.sent = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._session = None
+        self._thread = None
+        self._lock = threading.Lock()
 
     def notify(self, message):
-        if not self.enabled or not self.token or not self.chat_id:
+        """非阻塞：消息入队后立即返回，由后台线程发送"""
+        if not self.enabled:
             return
-
-        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
-        payload = {"chat_id": self.chat_id, "text": message}
+        self._ensure_worker()
         try:
-            requests.post(url, data=payload, timeout=5)
-        except Exception as e:
-            print(f"[Notifier] ❌ Telegram Error: {e}")
+            self._queue.put_nowait(str(message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="notifier", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """阻塞等待第一条消息，然后在 batch_window 内收集后续消息；None 表示收到停止标记"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                message = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if message is None:
+                self._queue.task_done()
+                self._queue.put(None) # 先发送已收集的消息，再处理停止标记
+                break
+            batch.append(message)
+        return batch
+
+    @staticmethod
+    def _chunks(messages):
+        """把多条消息拼接为不超过 Telegram 长度限制的若干段文本"""
+        text = ""
+        for message in messages:
+            message = message[:TELEGRAM_MAX_LENGTH]
+            if text and len(text) + 2 + len(message) > TELEGRAM_MAX_LENGTH:
+                yield text
+                text = ""
+            text = f"{text}\n\n{message}" if text else message
+        if text:
+            yield text
+
+    def _send(self, text):
+        if self._session is None:
+            self._session = requests.Session()
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._session.post(url, data={"chat_id": self.chat_id, "text": text}, timeout=5)
+                if response.status_code == 429: # 被限流：按 Telegram 返回的 retry_after 等待
+                    delay = max(delay, response.json().get("parameters", {}).get("retry_after", delay))
+                response.raise_for_status()
+                self.sent += 1
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"[Notifier] ❌ Telegram Error: {e}. Giving up after {attempt + 1} attempts.")
+                    return False
+                print(f"[Notifier] ⚠️ Telegram Error: {e}. Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        return False
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                self._queue.task_done()
+                break
+            for text in self._chunks(batch):
+                self._send(text)
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self, timeout=None):
+        """等待队列中已有的消息发送完毕（或超时）；返回是否全部处理完"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if self._thread is None or not self._thread.is_alive():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
 
+    def close(self, timeout=10):
+        """发送剩余消息后停止后台线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        if self._session is not None:
+            self._session.close()
+            self._session = None
@@ -0,0 +1,76 @@
+# core/replay_server.py
+# 本地 K 线回放 WebSocket 服务器：把历史 K 线按 Binance kline 流的消息格式推送给客户端，
+# 每根 K 线先推送若干条未收盘的中间状态，再推送收盘消息 (x=true)。用于在不连接交易所的情况下测试实时链路。
+#
+# 用法：python -m core.replay_server core/data/historical/BTCUSDT_4h_new.csv --interval 0.5
+
+import asyncio
+import json
+import time
+
+from core.data_store import read_ohlcv, to_epoch_ms
+from core.downloader import symbol_to_filename, timeframe_to_ms
+
+
+def kline_message(row, symbol, timeframe, closed, close_price=None):
+    """构造一条 Binance 格式的 kline 消息；row 为 [开盘时间毫秒, open, high, low, close, volume]"""
+    step = timeframe_to_ms(timeframe)
+    ts, open_, high, low, close, volume = row
+    return json.dumps({
+        "e": "kline",
+        "E": int(time.time() * 1000),
+        "s": symbol_to_filename(symbol),
+        "k": {
+            "t": int(ts), "T": int(ts) + step - 1, "s": symbol_to_filename(symbol), "i": timeframe,
+            "o": str(open_), "h": str(high), "l": str(low),
+            "c": str(close if close_price is None else close_price), "v": str(volume), "x": closed,
+        },
+    })
+
+
+async def serve_replay(df, host="127.0.0.1", port=8765, symbol="BTC/USDT", timeframe="4h", interval=0.1, updates_per_candle=2):
+    """
+    启动回放服务器并返回 websockets 的 Server 对象（调用方负责 close）。每个连接的客户端都会从头收到完整回放。
+
+    Args:
+        df (pd.DataFrame): 要回放的 K 线。
+        interval (float): 相邻两根 K 线收盘消息之间的间隔（秒）。
+        updates_per_candle (int): 每根 K 线收盘前推送的未收盘中间消息数。
+    """
+    import websockets
+
+    rows = df.assign(timestamp=to_epoch_ms(df["timestamp"]))[["timestamp", "open", "high", "low", "close", "volume"]].values.tolist()
+
+    async def handler(ws, *args):
+        for row in rows:
+            for k in range(updates_per_candle):
+                # 未收盘的中间状态：收盘价从开盘价逐步走向最终收盘价
+                partial = row[1] + (row[4] - row[1]) * (k + 1) / (updates_per_candle + 1)
+                await ws.send(kline_message(row, symbol, timeframe, False, close_price=partial))
+                await asyncio.sleep(interval / (updates_per_candle + 1))
+            await ws.send(kline_message(row, symbol, timeframe, True))
+            await asyncio.sleep(interval / (updates_per_candle + 1))
+
+    server = await websockets.serve(handler, host, port)
+    print(f"[Replay] Serving {len(rows)} candles on ws://{host}:{port}")
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="K 线回放 WebSocket 服务器")
+    parser.add_argument("data_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeframe", default="4h")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--last-n", type=int, default=None)
+    args = parser.parse_args()
+
+    async def main():
+        server = await serve_replay(read_ohlcv(args.data_file, last_n=args.last_n), args.host, args.port,
+                                    timeframe=args.timeframe, interval=args.interval)
+        await server.wait_closed()
+
+    asyncio.run(main())
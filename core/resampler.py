@@ -0,0 +1,117 @@
+# core/resampler.py
+# 多周期 K 线：从单一基础周期（1m 或 1h）的列式存储向量化聚合出 15m / 1h / 4h / 1d 等更高周期，
+# 结果缓存为独立的列式文件；基础数据增长后自动失效，只重新聚合最后一个（可能未完整的）周期之后的数据。
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.data_store import OHLCVStore, to_epoch_ms
+from core.downloader import timeframe_to_ms
+
+
+def resample_ohlcv(df, timeframe, base_timeframe=None, drop_partial=True):
+    """
+    把升序 K 线聚合为更高周期：open 取第一根、high 取最大、low 取最小、close 取最后一根、volume 求和。
+    周期按 UTC epoch 对齐（与交易所一致）。
+
+    Args:
+        df (pd.DataFrame): 基础周期 K 线，timestamp 可为字符串 / datetime / 毫秒整数。
+        timeframe (str): 目标周期，例如 '4h'。
+        base_timeframe (str): 基础周期，用于判断最后一个周期是否已收盘；None 时不做判断。
+        drop_partial (bool): 是否丢弃数据末尾尚未收盘的周期。
+
+    Returns:
+        pd.DataFrame: 目标周期 K 线，timestamp 为毫秒整数（周期开盘时间）。
+    """
+    step = timeframe_to_ms(timeframe)
+    ts = to_epoch_ms(df["timestamp"])
+    if len(ts) == 0:
+        return pd.DataFrame({c: np.array([], dtype=np.int64 if c == "timestamp" else np.float64)
+                             for c in ["timestamp", "open", "high", "low", "close", "volume"]})
+    buckets = ts // step * step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]) # 每个周期第一根 K 线的位置
+    ends = np.r_[starts[1:], len(ts)] - 1
+
+    out = pd.DataFrame({
+        "timestamp": buckets[starts],
+        "open": df["open"].to_numpy(dtype=np.float64)[starts],
+        "high": np.maximum.reduceat(df["high"].to_numpy(dtype=np.float64), starts),
+        "low": np.minimum.reduceat(df["low"].to_numpy(dtype=np.float64), starts),
+        "close": df["close"].to_numpy(dtype=np.float64)[ends],
+        "volume": np.add.reduceat(df["volume"].to_numpy(dtype=np.float64), starts),
+    })
+    if drop_partial and base_timeframe is not None:
+        # 最后一个周期的最后一根基础 K 线不是该周期的最后一根时，说明该周期尚未收盘
+        if ts[-1] + timeframe_to_ms(base_timeframe) < buckets[-1] + step:
+            out = out.iloc[:-1]
+    return out
+
+
+def align_closed(higher, base_timestamps, timeframe):
+    """
+    把高周期 K 线对齐到基础周期的每一根 K 线上：每根基础 K 线只能看到在它开盘时已经收盘的最近一根高周期 K 线，
+    避免未来函数。返回与 base_timestamps 等长的 DataFrame（没有已收盘的高周期 K 线时为 NaN）。
+    """
+    step = timeframe_to_ms(timeframe)
+    higher_close_time = to_epoch_ms(higher["timestamp"]) + step
+    base_ts = to_epoch_ms(base_timestamps)
+    # 基础 K 线的时间戳是开盘时间，高周期 K 线在 close_time 收盘，close_time <= base_ts 即可使用
+    pos = np.searchsorted(higher_close_time, base_ts, side="right") - 1
+    aligned = higher.reset_index(drop=True).reindex(np.where(pos >= 0, pos, -1))
+    return aligned.reset_index(drop=True)
+
+
+class TimeframeCache:
+    """
+    以单一基础周期存储为数据源的多周期缓存。
+    派生文件保存在 cache_dir/{base 文件名}__{timeframe}.arrow，schema 元数据记录生成时基础数据的行数和最后时间戳；
+    基础数据增长时只重新聚合最后一个派生周期之后的部分，基础数据被改写（如补缺口）时整体重建。
+    """
+
+    def __init__(self, base_path, base_timeframe="1m", cache_dir=None):
+        self.base = OHLCVStore(base_path)
+        self.base_timeframe = base_timeframe
+        self.base_step = timeframe_to_ms(base_timeframe)
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(base_path) or ".", "cache")
+
+    def path_for(self, timeframe):
+        stem = os.path.splitext(os.path.basename(self.base.path))[0]
+        return os.path.join(self.cache_dir, f"{stem}__{timeframe}.arrow")
+
+    def _base_state(self, ts):
+        return {"base_rows": len(ts), "base_last": int(ts[-1]) if len(ts) else -1}
+
+    def refresh(self, timeframe):
+        """确保 timeframe 的派生文件与基础数据一致，返回派生存储对象"""
+        step = timeframe_to_ms(timeframe)
+        if step % self.base_step != 0:
+            raise ValueError(f"Cannot derive {timeframe} from {self.base_timeframe} candles")
+        derived = OHLCVStore(self.path_for(timeframe))
+        base_ts = self.base.read_arrays(["timestamp"])["timestamp"]
+        state = self._base_state(base_ts)
+        meta = derived.metadata()
+        if meta.get("base_rows") == str(state["base_rows"]) and meta.get("base_last") == str(state["base_last"]):
+            return derived # 缓存命中
+
+        old_rows, old_last = int(meta.get("base_rows", -1)), int(meta.get("base_last", -1))
+        grew_at_end = (derived.exists() and old_last >= 0 and state["base_last"] > old_last
+                       and np.searchsorted(base_ts, old_last, side="right") == old_rows)
+        if grew_at_end:
+            # 增量：此前最后一根基础 K 线所在周期之前的派生 K 线都已收盘且不会变化，只需从该周期开始重新聚合
+            resume_from = old_last // step * step
+            new_part = resample_ohlcv(self.base.read(as_datetime=False, start=resume_from), timeframe, self.base_timeframe)
+            derived.append(new_part, metadata=state)
+            print(f"[Resampler] {timeframe}: appended {len(new_part)} bars from {pd.to_datetime(resume_from, unit='ms')}.")
+        else:
+            full = resample_ohlcv(self.base.read(as_datetime=False), timeframe, self.base_timeframe)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            derived.write(full, metadata=state)
+            print(f"[Resampler] {timeframe}: rebuilt {len(full)} bars from {state['base_rows']} {self.base_timeframe} candles.")
+        return derived
+
+    def get(self, timeframe, start=None, end=None, columns=None, last_n=None):
+        """读取派生周期 K 线（参数含义同 OHLCVStore.read）；timeframe 等于基础周期时直接读取基础数据"""
+        store = self.base if timeframe == self.base_timeframe else self.refresh(timeframe)
+        return store.read(columns=columns, start=start, end=end, last_n=last_n)
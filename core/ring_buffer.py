@@ -0,0 +1,72 @@
+# core/ring_buffer.py
+# 固定容量的 OHLCV 环形缓冲区（实盘唯一的数据结构）：
+# - 列式存储：int64 时间戳 (epoch 毫秒) + float64 open/high/low/close/volume，全部在构造时一次性分配；
+# - 追加 O(1)，不产生新的内存分配；
+# - 采用“双倍镜像”布局：每个值同时写入位置 i 和 i + capacity，最近 N 根 K 线在内存中始终连续，
+#   因此可以直接返回 ndarray / DataFrame 的零拷贝视图。
+# 注意：视图直接引用缓冲区内存，下一次 append 之后内容会变化；需要跨 K 线保留数据时请先 copy()。
+
+import numpy as np
+import pandas as pd
+
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class OHLCVRingBuffer:
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self._ts = np.zeros(2 * capacity, dtype=np.int64)
+        self._cols = {name: np.zeros(2 * capacity, dtype=np.float64) for name in PRICE_FIELDS}
+        self._head = 0 # 下一次写入的位置 (0 <= head < capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _write(self, pos, ts, values):
+        for p in (pos, pos + self.capacity):
+            self._ts[p] = ts
+            for name, value in zip(PRICE_FIELDS, values):
+                self._cols[name][p] = value
+
+    def append(self, ts, open_, high, low, close, volume):
+        """追加一根 K 线，缓冲区满时覆盖最旧的一根"""
+        self._write(self._head, ts, (open_, high, low, close, volume))
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def update_last(self, ts, open_, high, low, close, volume):
+        """原地替换最后一根 K 线（例如同一根 K 线的修正数据）"""
+        if not self._size:
+            return self.append(ts, open_, high, low, close, volume)
+        self._write((self._head - 1) % self.capacity, ts, (open_, high, low, close, volume))
+
+    def extend(self, rows):
+        """批量追加 [[ts, o, h, l, c, v], ...]"""
+        for row in rows:
+            self.append(int(row[0]), *(float(v) for v in row[1:6]))
+
+    def last_timestamp(self):
+        return int(self._ts[self._head - 1 + self.capacity]) if self._size else None
+
+    def _span(self, n=None):
+        n = self._size if n is None else min(n, self._size)
+        end = self._head + self.capacity
+        return end - n, end
+
+    def view(self, name, n=None):
+        """最近 n 根（默认全部）K 线某一列的只读零拷贝视图；name 为 timestamp/open/high/low/close/volume"""
+        start, end = self._span(n)
+        arr = (self._ts if name == "timestamp" else self._cols[name])[start:end]
+        arr.flags.writeable = False
+        return arr
+
+    def arrays(self, n=None):
+        """最近 n 根 K 线的 {列名: 只读视图}"""
+        return {name: self.view(name, n) for name in ("timestamp",) + PRICE_FIELDS}
+
+    def frame(self, n=None):
+        """最近 n 根 K 线的 DataFrame（列直接引用缓冲区内存，timestamp 为 datetime64[ms] 视图）"""
+        arrays = self.arrays(n)
+        arrays["timestamp"] = arrays["timestamp"].view("datetime64[ms]")
+        return pd.DataFrame(arrays, copy=False)
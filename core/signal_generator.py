@@ -3,21 +3,23 @@
 import pandas as pd
 from strategies.mean_reversion import MeanReversionStrategy
 from strategies.trend_following import TrendFollowStrategy
-from utils.indicators import calculate_rsi, calculate_bollinger_bands, calculate_adx
-from utils.indicators import detect_hammer, detect_engulfing, detect_doji, calculate_pattern_probability, calc_macd, calc_stochrsi
+from utils.indicators import detect_hammer, detect_engulfing, detect_doji
 from core.market_state import MarketStateDetector
 from core.data_loader import MarketDataLoader
+from core.feature_frame import FeatureFrame, SIGNAL_COLUMNS
 from .ai_model import AIPredictor
 
 class SignalGenerator:
     def __init__(self, config):
         self.config = config
-        self.rsi_period = config.get("signal_generator", {}).get("rsi_period", 14)
-        self.mean_reversion = MeanReversionStrategy()
-        self.trend_following = TrendFollowStrategy()
-        self.market_state = MarketStateDetector()
+        sg_cfg = config.get("signal_generator", {})
+        self.rsi_period = sg_cfg.get("rsi_period", 14)
+        # 策略 / 市场状态参数可通过 signal_generator.{mean_reversion,trend_following,market_state} 覆盖（参数扫描使用）
+        self.mean_reversion = MeanReversionStrategy(**sg_cfg.get("mean_reversion", {}))
+        self.trend_following = TrendFollowStrategy(**sg_cfg.get("trend_following", {}))
+        self.market_state = MarketStateDetector(**sg_cfg.get("market_state", {}))
         self.loader = MarketDataLoader(symbol="BTC/USDT", timeframe="4h", limit=1000)
-        self.predictor = AIPredictor()
+        self.predictor = AIPredictor(config=config)
         self.weights = {
             'rsi': 0.16,
             'bb_width': 0.14,
@@ -30,29 +32,16 @@ class SignalGenerator:
             'engulfing_up_prob': 0.08
         }
 
-    def generate(self, df: pd.DataFrame) -> dict:
+    def generate(self, df: pd.DataFrame, features: FeatureFrame = None) -> dict:
         signals = []
 
-        # 技术指标计算
-        df = df.copy()
-        df['rsi'] = calculate_rsi(df['close'], window=14)
-        df = calculate_bollinger_bands(df, window=20)
-        df['bb_width'] = (df['upper'] - df['lower']) / df['ma']
-        df['adx'] = calculate_adx(df)
-        df['volume_change'] = df['volume'] / df['volume'].shift(1)
-        df['macd'], df['macd_signal'], df['macd_hist'] = calc_macd(df['close'])
-        df['stoch_rsi'] = calc_stochrsi(df['close'])
-        df['hammer_up_prob'], _ = calculate_pattern_probability(df, detect_hammer, lookback=5)
-        df['doji_up_prob'], _ = calculate_pattern_probability(df, detect_doji, lookback=5)
-        df['engulfing_up_prob'], _ = calculate_pattern_probability(df, lambda d: detect_engulfing(d)[0] and detect_engulfing(d)[1] == "bullish", lookback=5)
-        df['engulfing_down_prob'], _ = calculate_pattern_probability(df, lambda d: detect_engulfing(d)[0] and detect_engulfing(d)[1] == "bearish", lookback=5)
-        df['trend'] = df['close'].pct_change(5).shift(1)
-        df['volume_trend'] = df['volume'].pct_change(5).shift(1)
-        df['volatility'] = df['close'].rolling(20).std()
-        df['price_range'] = (df['high'] - df['low']) / df['close']
+        # 技术指标计算（特征帧只计算一次，市场状态识别和 AI 预测共享；回测引擎会传入预计算好的特征帧）
+        if features is None or not features.matches(df):
+            features = FeatureFrame(df)
+        df = features.frame(SIGNAL_COLUMNS)
 
         # 市场状态识别
-        market_condition = self.market_state.detect_state(df)
+        market_condition = self.market_state.detect_state(df, features=features)
         print(f"[SignalGenerator] Market Condition: {market_condition}")
 
         # 打印调试信息
@@ -64,10 +53,10 @@ class SignalGenerator:
         is_doji = detect_doji(df)
         is_engulfing, engulfing_type = detect_engulfing(df)
 
-        hammer_up_prob, _ = calculate_pattern_probability(df, detect_hammer, lookback=5)
-        doji_up_prob, _ = calculate_pattern_probability(df, detect_doji, lookback=5)
-        engulfing_up_prob, _ = calculate_pattern_probability(df, lambda d: detect_engulfing(d)[0] and detect_engulfing(d)[1] == "bullish", lookback=5)
-        engulfing_down_prob, _ = calculate_pattern_probability(df, lambda d: detect_engulfing(d)[0] and detect_engulfing(d)[1] == "bearish", lookback=5)
+        hammer_up_prob = df['hammer_up_prob'].iloc[-1]
+        doji_up_prob = df['doji_up_prob'].iloc[-1]
+        engulfing_up_prob = df['engulfing_up_prob'].iloc[-1]
+        engulfing_down_prob = df['engulfing_down_prob'].iloc[-1]
 
         print(f"[SignalGenerator] K-Line Patterns - Hammer: {is_hammer}, Doji: {is_doji}, Engulfing: {is_engulfing} ({engulfing_type})")
         print(f"[SignalGenerator] Probabilities - Hammer Up: {hammer_up_prob:.2f}, Doji Up: {doji_up_prob:.2f}, Engulfing Up: {engulfing_up_prob:.2f}, Engulfing Down: {engulfing_down_prob:.2f}")
@@ -111,7 +100,7 @@ class SignalGenerator:
             # core/signal_generator.py (部分代码)
 
             # AI模型预测（移到 signal_data 检查之前）
-            ai_prediction, ai_confidence = self.predictor.predict(df)
+            ai_prediction, ai_confidence = self.predictor.predict(df, features=features)
             print(f"[SignalGenerator] AI Prediction: {ai_prediction}, Confidence: {ai_confidence:.2f}")
 
             # 策略信号生成
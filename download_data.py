@@ -1,45 +1,38 @@
 # download_data.py
+# 并发、可断点续传地下载历史 K 线，写入列式存储 (core/data/historical/{SYMBOL}_{timeframe}.store.arrow)。
+# 中断后重新运行同一命令会从检查点继续；--fake 使用本地模拟交易所（无需联网），必须用 --store 指定其他路径，
+# 避免模拟数据混入默认存储。
 
-import ccxt
-import pandas as pd
-import time
-from datetime import datetime
+import argparse
+import os
 
-def fetch_ohlcv(symbol='BTC/USDT', timeframe='4h', since=None, limit=1000):
-    exchange = ccxt.binance()
-    if since:
-        since = exchange.parse8601(since)
-    ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
-    df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-    return df
+from core.downloader import HistoricalDownloader, default_store_path
 
-def save_data(df, filename):
-    df.to_csv(filename, index=False)
 
-if __name__ == "__main__":
-    start_date = '2023-01-01T00:00:00Z'
-    end_date = '2024-01-01T00:00:00Z'
-    limit = 1000
+def create_exchange(fake=False, timeframe="4h"):
+    if fake:
+        from core.fake_exchange import FakeExchange
+        return FakeExchange(timeframe=timeframe, latency=0.05)
+    import ccxt
+    return ccxt.binance({'enableRateLimit': False}) # 限速由下载器的令牌桶统一控制
 
-    all_data = []
-    current_time = start_date
 
-    while True:
-        print(f"Fetching data from {current_time}...")
-        df = fetch_ohlcv(since=current_time, limit=limit)
-        if not df.empty:
-            all_data.append(df)
-            last_timestamp = df['timestamp'].iloc[-1]
-            end_date_dt = pd.to_datetime(end_date).tz_localize(None)  # 移除时区信息
-            if last_timestamp >= end_date_dt:
-                break
-            current_time = last_timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')
-            time.sleep(1)
-        else:
-            break
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="下载历史 K 线到列式存储")
+    parser.add_argument("--symbol", default="BTC/USDT")
+    parser.add_argument("--timeframe", default="4h")
+    parser.add_argument("--start", default="2023-01-01T00:00:00Z")
+    parser.add_argument("--end", default="2024-01-01T00:00:00Z")
+    parser.add_argument("--store", default=None, help="存储文件路径，默认 core/data/historical/{SYMBOL}_{timeframe}.store.arrow")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0, help="每秒最多请求数")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟交易所")
+    args = parser.parse_args()
+    if args.fake and (args.store is None or os.path.abspath(args.store) == os.path.abspath(default_store_path(args.symbol, args.timeframe))):
+        parser.error("--fake 会写入模拟数据，请用 --store 指定默认存储以外的路径")
 
-    full_df = pd.concat(all_data, ignore_index=True)
-    full_df = full_df.drop_duplicates(subset=['timestamp'])
-    save_data(full_df, 'core/data/historical/BTCUSDT_4h_new.csv')
-    print(f"Data saved to core/data/historical/BTCUSDT_4h_new.csv")
\ No newline at end of file
+    downloader = HistoricalDownloader(
+        create_exchange(args.fake, args.timeframe), symbol=args.symbol, timeframe=args.timeframe,
+        store_path=args.store, max_workers=args.workers, rate=args.rate
+    )
+    downloader.download(args.start, args.end)
@@ -0,0 +1,19 @@
+# export_model.py
+# 把 AI 模型导出为 XGBoost 原生格式 (UBJ / JSON)，实盘通过 core.inference.FastPredictor 加载（不导入 xgboost / sklearn）。
+# 用法：python export_model.py                       导出注册表最新版本
+#       python export_model.py --version 3 --output models/export/xgboost.json
+import argparse
+
+from core.ai_model import AIPredictor
+from core.config_loader import load_config
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出 AI 模型为 XGBoost 原生格式，供实盘推理使用")
+    parser.add_argument("--version", type=int, default=None, help="注册表版本，默认最新")
+    parser.add_argument("--output", default=None, help="输出路径（.ubj 或 .json），默认使用 ai_model.export_path")
+    args = parser.parse_args()
+
+    predictor = AIPredictor(config=load_config())
+    if not predictor.load(args.version, prefer_export=False):
+        raise SystemExit("[Export] No model to export; train and save one first.")
+    predictor.export(args.output)
@@ -1,23 +1,31 @@
-import ccxt
-import pandas as pd
+# fetch_binance_data.py
+# 增量同步 core/data/historical 下的 K 线数据：只下载最后一根已存 K 线之后的数据，并补齐内部缺口，
+# 按时间戳去重后追加到列式存储（不再覆盖整个文件）。
+# 存储不存在但有同名 CSV 时，先把 CSV 一次性转换为列式存储再同步。
+# --fake 使用本地模拟交易所，必须用 --store 指定其他路径，避免模拟数据混入 CSV 的列式文件。
 
-# 初始化 Binance
-exchange = ccxt.binance()
+import argparse
+import os
 
-# 参数设置
-symbol = "BTC/USDT"
-timeframe = "4h"
-limit = 1000  # 可修改为更大，如1500
+from core.data_store import store_path_for
+from core.downloader import HistoricalDownloader, symbol_to_filename
+from download_data import create_exchange
 
-# 获取数据
-ohlcv = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="增量同步历史 K 线")
+    parser.add_argument("--symbol", default="BTC/USDT")
+    parser.add_argument("--timeframe", default="4h")
+    parser.add_argument("--start", default=None, help="存储为空时的起始时间，例如 2023-01-01")
+    parser.add_argument("--no-fill-gaps", action="store_true", help="不检测 / 补齐内部缺口")
+    parser.add_argument("--store", default=None, help="存储文件路径，默认为同名 CSV 的列式文件")
+    parser.add_argument("--fake", action="store_true", help="使用本地模拟交易所")
+    args = parser.parse_args()
+    if args.fake and args.store is None:
+        parser.error("--fake 会写入模拟数据，请用 --store 指定 CSV 列式文件以外的路径")
 
-# 转换为 DataFrame
-df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
-df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+    csv_path = os.path.join("core/data/historical", f"{symbol_to_filename(args.symbol)}_{args.timeframe}.csv")
+    store_path = args.store or store_path_for(csv_path) # 下载器会先用同名 CSV 初始化尚不存在的列式文件
 
-# 保存路径（你的项目中指定位置）
-save_path = r"F:\量化交易算法\smartbtc_v1\core\data\historical\BTCUSDT_4h.csv"
-df.to_csv(save_path, index=False)
-
-print(f"✅ 数据已保存到：{save_path}")
+    downloader = HistoricalDownloader(create_exchange(args.fake, args.timeframe), symbol=args.symbol,
+                                      timeframe=args.timeframe, store_path=store_path)
+    downloader.sync(start=args.start, fill_gaps=not args.no_fill_gaps)
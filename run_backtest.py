@@ -4,7 +4,9 @@
 import pandas as pd
 import time
 import os
+import argparse
 import traceback # 用于打印更详细的错误信息
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal, ROUND_DOWN # 用于更精确的计算和截断
 
 
@@ -12,6 +14,7 @@ from core.data_loader import MarketDataLoader
 from core.signal_generator import SignalGenerator
 from core.executor import TradeExecutor
 from core.risk_manager import RiskManager
+from core.backtest_engine import BacktestEngine
 from core.notifier import Notifier # 回测中通常禁用
 from core.config_loader import load_config
 
@@ -36,7 +39,7 @@ def run_backtest(data_file, log_file_path, config):
     ai_cfg = config.get("ai_model", {})
     min_data_points_for_signal = ai_cfg.get("window_size", 180) + 20 # 需要足够数据计算指标+AI特征
 
-    loader = MarketDataLoader(symbol=symbol, timeframe=timeframe)
+    loader = MarketDataLoader(symbol=symbol, timeframe=timeframe, limit=None) # 回测使用整个数据文件
     loader.data_path = data_file
     df_full = loader.get_ohlcv()
 
@@ -53,7 +56,6 @@ def run_backtest(data_file, log_file_path, config):
     notifier = Notifier(config, enabled=False) # 回测时禁用通知
 
     # --- 2. 准备回测环境 ---
-    logs = []
     initial_balance = risk.initial_balance # 从 RiskManager 获取初始资金
     risk.set_balance(initial_balance) # 确保设置当前余额
     print(f"[Backtest] Initial Balance: {initial_balance:.2f} USDT")
@@ -61,203 +63,22 @@ def run_backtest(data_file, log_file_path, config):
     # 回测起点，确保有足够数据计算指标和 AI 特征
     start_index = min_data_points_for_signal
 
-    # 用于跟踪当前持仓状态和 SL/TP (非常重要！)
-    active_trade = None # None 表示无持仓, 否则存储交易详情 e.g., {'entry_price': X, 'amount': Y, 'sl': Z, 'tp': W}
-
     # AI 模型初始训练 (如果需要) - 注意这里的训练数据范围
-    train_size = int(len(df_full) * 0.8) # 或者使用固定的点数？
     train_df_initial = df_full.iloc[:start_index] # 使用回测开始前的数据进行初始训练更合理
     print(f"[Backtest] Performing initial AI model training using first {start_index} data points...")
     try:
-         signal_generator.predictor.train(train_df_initial) # 假设 predictor 有 train 方法
+         signal_generator.predictor.train_rolling(train_df_initial) # 训练窗口为最近 window_size 根 K 线
     except Exception as e:
          print(f"[Backtest] WARNING: Initial AI training failed: {e}")
 
-    # --- 3. 回测主循环 ---
-    print(f"[Backtest] Starting main loop from index {start_index}...")
-    for i in range(start_index, len(df_full)):
-        # 准备当前 K 线及之前的数据窗口
-        window_df = df_full.iloc[:i+1].copy() # 包含当前 K 线的数据窗口
-        executor.update_data(window_df) # 更新 executor 的数据用于滑点计算
-
-        current_price_high = window_df['high'].iloc[-1]
-        current_price_low = window_df['low'].iloc[-1]
-        current_price_close = window_df['close'].iloc[-1] # 通常用收盘价做决策，但 SL/TP 可能被 H/L 触发
-        current_timestamp = window_df['timestamp'].iloc[-1]
-
-        # 打印进度 (可选)
-        if i % 100 == 0:
-             print(f"[Backtest] Processing index {i}/{len(df_full)-1} | Time: {current_timestamp} | Balance: {risk.current_balance:.2f}")
-
-        # --- 3a. 检查是否触发止损或止盈 (优先处理退出) ---
-        exit_executed_this_step = False
-        if active_trade:
-            triggered_exit_price = None
-            exit_reason = None
-
-            # 检查止损 (假设做多，检查最低价是否低于止损价)
-            if current_price_low <= active_trade['sl']:
-                triggered_exit_price = active_trade['sl'] # 假设在止损价精确成交 (更保守)
-                exit_reason = "Stop Loss"
-            # 检查止盈 (假设做多，检查最高价是否高于止盈价)
-            elif current_price_high >= active_trade['tp']:
-                triggered_exit_price = active_trade['tp'] # 假设在止盈价精确成交 (更保守)
-                exit_reason = "Take Profit"
-
-            if triggered_exit_price is not None:
-                exit_executed_this_step = True
-                print(f"[Backtest] {i}: {exit_reason} triggered at price ~{triggered_exit_price:.2f}!")
-                exit_order = {
-                    "symbol": symbol,
-                    "action": "sell",
-                    "amount": active_trade['amount'], # 卖出持有的全部数量
-                    "price": triggered_exit_price, # 使用触发价格作为信号价 (模拟时执行价会被滑点调整)
-                    "timestamp": current_timestamp,
-                    "structure": f"exit_{exit_reason.lower().replace(' ', '_')}",
-                    "confidence": 1.0 # 强制退出
-                }
-                print(f"[Backtest] {i}: Attempting to execute {exit_reason} exit SELL order. Amount: {active_trade['amount']:.8f}")
-                result = executor.execute(exit_order)
-                if result and result.get("pnl") is not None:
-                    logs.append(result)
-                    pnl_from_trade = result["pnl"]
-                    risk.update_balance(pnl_from_trade) # 更新余额
-                    print(f"[Backtest] {i}: {exit_reason} SELL executed. PnL: {pnl_from_trade:.2f}, New Balance: {risk.current_balance:.2f}")
-                    active_trade = None # 平仓后清除持仓状态
-                else:
-                    print(f"[Backtest] {i}: {exit_reason} SELL execution failed or no PnL returned. Critical error simulation might be needed.")
-                    # 在真实交易中，如果退出失败是非常严重的问题
-                    active_trade = None # 即使执行失败，也假设已尝试平仓，避免循环尝试
-
-        # 如果本轮已执行退出，则跳过后续的入场信号检查
-        if exit_executed_this_step:
-            continue
-
-        # --- 3b. 检查风控是否暂停交易 ---
-        # (将检查放在这里，避免在触发SL/TP退出后还阻止退出)
-        if not risk.validate_trade(0, 0): # 传入虚拟值触发检查 trading_paused
-            if active_trade: # 如果有持仓，即使暂停也要允许因信号平仓
-                 print(f"[Backtest] {i}: Trading paused (Max Drawdown), but holding position. Checking for SELL signal...")
-            else:
-                 # print(f"[Backtest] {i}: Trading paused (Max Drawdown). Skipping signal generation.")
-                 continue # 如果无持仓且暂停，则跳过
-
-        # --- 3c. 生成交易信号 ---
-        signal = None
-        try:
-             # print(f"[Backtest] {i}: Generating signal...") # 减少日志噪音
-             signal = signal_generator.generate(window_df)
-        except Exception as e:
-             print(f"[Backtest] {i}: ERROR during signal generation: {e}")
-             # traceback.print_exc() # 取消注释以查看详细错误
-
-        # --- 3d. 处理入场和信号平仓 ---
-        if signal:
-            action = signal["action"]
-            confidence = signal.get("confidence", 0.0) # 确保 confidence 存在
-            structure = signal.get("structure", "unknown")
-
-            # --- 处理买入信号 (仅当无持仓时) ---
-            if action == "buy" and active_trade is None:
-                if risk.trading_paused: # 再次检查，如果刚才是因为持仓而没跳过
-                    print(f"[Backtest] {i}: Trading paused (Max Drawdown). Skipping BUY signal.")
-                    continue
-
-                print(f"[Backtest] {i}: BUY signal received. Confidence: {confidence:.2f}. Current Price: {current_price_close:.2f}")
-
-                # a. 计算 ATR
-                atr = risk.calculate_atr(window_df)
-                if atr <= 0:
-                    print(f"[Backtest] {i}: ATR calculation failed or returned zero. Skipping BUY.")
-                    continue
-
-                # b. 计算止损价
-                stop_loss_price, take_profit_price = risk.calculate_sl_tp_prices(current_price_close, atr, action)
-                if stop_loss_price is None or stop_loss_price <= 0 or take_profit_price is None or take_profit_price <= stop_loss_price:
-                    print(f"[Backtest] {i}: Failed to calculate valid SL/TP prices (SL: {stop_loss_price}, TP: {take_profit_price}). Skipping BUY.")
-                    continue
-                print(f"[Backtest] {i}: Calculated SL: {stop_loss_price:.2f}, TP: {take_profit_price:.2f} (ATR: {atr:.4f})")
-
-                # c. 计算基于风险的头寸规模 (单位: BTC)
-                order_size_btc = risk.calculate_position_size(
-                    entry_price=current_price_close,
-                    stop_loss_price=stop_loss_price,
-                    symbol=symbol
-                )
-                if order_size_btc <= 0:
-                    print(f"[Backtest] {i}: Calculated position size is zero or negative ({order_size_btc:.8f}). Check risk settings or balance. Skipping BUY.")
-                    continue
-                print(f"[Backtest] {i}: Calculated dynamic position size: {order_size_btc:.8f} BTC")
-
-                # d. 验证交易 (风控暂停和资金)
-                if not risk.validate_trade(order_size_btc, current_price_close):
-                    required_quote_approx = order_size_btc * current_price_close
-                    print(f"[Backtest] {i}: Trade validation failed (Risk paused or insufficient funds). Required USDT: ~{required_quote_approx:.2f}, Balance: {risk.current_balance:.2f}. Skipping BUY.")
-                    continue
-
-                # e. 创建订单字典
-                order = {
-                    "symbol": symbol,
-                    "action": action,
-                    "amount": order_size_btc,  # 使用动态计算的 BTC 数量
-                    "price": current_price_close, # 信号价格
-                    "timestamp": current_timestamp,
-                    "structure": structure,
-                    "confidence": confidence,
-                }
-
-                # f. 执行订单
-                print(f"[Backtest] {i}: Attempting to execute BUY order...")
-                result = executor.execute(order)
-
-                if result and result.get('amount') > 0: # 确保成功执行且数量大于0
-                    logs.append(result)
-                    # 记录活动交易的状态
-                    active_trade = {
-                        'entry_price': result['price'], # 记录实际执行价格
-                        'amount': result['amount'],     # 记录实际执行数量
-                        'sl': stop_loss_price,          # 记录止损价
-                        'tp': take_profit_price,          # 记录止盈价
-                        'entry_time': current_timestamp
-                    }
-                    print(f"[Backtest] {i}: BUY executed successfully. Amount: {result['amount']:.8f}, Exec Price: {result['price']:.2f}. Active Trade: {active_trade}")
-                else:
-                    print(f"[Backtest] {i}: BUY execution failed or resulted in zero amount.")
-
-            # --- 处理卖出信号 (仅当有持仓时，作为平仓信号) ---
-            elif action == "sell" and active_trade is not None:
-                print(f"[Backtest] {i}: SELL signal received (Exit Signal). Confidence: {confidence:.2f}. Exiting current position.")
-                # 创建卖出订单以平掉所有仓位
-                exit_order = {
-                    "symbol": symbol,
-                    "action": "sell",
-                    "amount": active_trade['amount'], # 卖出持有的全部数量
-                    "price": current_price_close,    # 使用当前收盘价作为信号价
-                    "timestamp": current_timestamp,
-                    "structure": f"exit_signal_{structure}", # 标记为信号退出
-                    "confidence": confidence
-                }
-                print(f"[Backtest] {i}: Attempting to execute SELL order (Signal Exit). Amount: {active_trade['amount']:.8f}")
-                result = executor.execute(exit_order)
-                if result and result.get("pnl") is not None:
-                    logs.append(result)
-                    pnl_from_trade = result["pnl"]
-                    risk.update_balance(pnl_from_trade) # 更新余额
-                    print(f"[Backtest] {i}: SELL executed (Signal Exit). PnL: {pnl_from_trade:.2f}, New Balance: {risk.current_balance:.2f}")
-                    active_trade = None # 平仓后清除持仓状态
-                else:
-                    print(f"[Backtest] {i}: SELL execution (Signal Exit) failed or no PnL returned.")
-                    active_trade = None # 即使失败也假设尝试退出
-
-        # --- 3e. AI 模型滚动训练 (如果启用) ---
-        update_interval = 7 * 6 # 假设每 7 天 (4h * 6 = 1 天) 更新一次
-        if i > start_index and i % update_interval == 0:
-            print(f"[Backtest] {i}: Updating AI model...")
-            try:
-                 # 使用到当前行为止的数据进行训练 (可能需要调整 predictor 的方法)
-                 signal_generator.predictor.train_rolling(window_df)
-            except Exception as e:
-                 print(f"[Backtest] WARNING: AI model rolling update failed at index {i}: {e}")
+    # --- 3. 回测主循环 (事件驱动引擎：特征整段计算一次，按索引逐根推进) ---
+    engine = BacktestEngine(
+        df_full, config, signal_generator, executor, risk,
+        start_index=start_index,
+        window_length=min_data_points_for_signal,
+        retrain_interval=ai_cfg.get("retrain_interval", 7 * 6) # 默认每 7 天 (4h * 6 = 1 天) 更新一次
+    )
+    logs = engine.run()
 
     # --- 4. 回测结束与报告 ---
     final_balance = risk.current_balance
@@ -318,7 +139,50 @@ def run_backtest(data_file, log_file_path, config):
         }
 
 
+def _run_backtest_part(job):
+    """进程池工作函数：运行单个数据分段，异常时返回 None 而不是中断整个批次"""
+    data_file, log_file_path, config = job
+    try:
+        return run_backtest(data_file, log_file_path, config)
+    except Exception as e:
+        print(f"[Backtest] ❌ Part {os.path.basename(data_file)} failed: {e}")
+        traceback.print_exc()
+        return None
+
+
+def run_backtests_parallel(data_files, log_dir, config, max_workers=None):
+    """
+    并行运行多个相互独立的数据分段（每段有自己的 RiskManager / Executor / 日志文件）。
+
+    Args:
+        data_files (list): 数据文件路径列表，第 i 个文件的日志写入 trade_log_part_{i}.csv。
+        log_dir (str): 日志目录。
+        config (dict): 配置字典。
+        max_workers (int): 进程数，None 时读取 backtest.max_workers，仍为空则使用 CPU 核数；1 表示串行运行。
+
+    Returns:
+        list: 按 data_files 顺序排列的结果摘要（失败的分段被跳过）。
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    jobs = [(data_file, os.path.join(log_dir, f"trade_log_part_{i}.csv"), config) for i, data_file in enumerate(data_files, 1)]
+    if max_workers is None:
+        max_workers = config.get("backtest", {}).get("max_workers") or os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(jobs)))
+
+    if max_workers == 1:
+        results = [_run_backtest_part(job) for job in jobs]
+    else:
+        print(f"[Backtest] Running {len(jobs)} parts on {max_workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_run_backtest_part, jobs)) # map 保证结果顺序与输入一致
+    return [r for r in results if r]
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartBTC 分段回测")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数 (默认读取 backtest.max_workers 或 CPU 核数, 1 为串行)")
+    args = parser.parse_args()
+
     config = load_config("config/settings.yaml") # 明确指定配置文件路径
 
     # 定义数据文件列表 (从您的 GitHub 结构推断)
@@ -338,16 +202,10 @@ if __name__ == "__main__":
     else:
         print(f"Found {len(valid_data_files)} data files to process.")
 
-        all_results = []
         log_dir = "logs"
-        os.makedirs(log_dir, exist_ok=True) # 确保日志目录存在
 
-        # --- 运行回测 ---
-        for i, data_file in enumerate(valid_data_files, 1):
-            log_path = os.path.join(log_dir, f"trade_log_part_{i}.csv")
-            part_results = run_backtest(data_file, log_path, config)
-            if part_results:
-                all_results.append(part_results)
+        # --- 运行回测 (各分段相互独立，使用进程池并行) ---
+        all_results = run_backtests_parallel(valid_data_files, log_dir, config, max_workers=args.workers)
 
         # --- 聚合结果 (示例) ---
         if all_results:
@@ -363,5 +221,6 @@ if __name__ == "__main__":
             # 简单计算总 PnL 供参考，但不完全准确
             total_pnl_sum = df_results['total_pnl'].sum()
             print(f"Sum of PnL across all parts: {total_pnl_sum:.2f} USDT (Note: Not a perfect portfolio simulation)")
+            print("For a continuous out-of-sample equity curve, run: python -m analysis.walk_forward")
         else:
             print("\nNo results generated from backtests.")
\ No newline at end of file
@@ -1,9 +1,10 @@
 # split_data.py
 
 import pandas as pd
+from core.data_store import read_ohlcv
 
 def split_data(input_file, output_prefix, split_size=730):
-    df = pd.read_csv(input_file)
+    df = read_ohlcv(input_file)
     df['timestamp'] = pd.to_datetime(df['timestamp'])
 
     total_rows = len(df)
@@ -0,0 +1,34 @@
+# tests/test_data_loader.py
+# MarketDataLoader.get_ohlcv：不带范围的整段查询保留至少 100 行的检查，按范围 / 最后 N 根的查询按请求返回。
+
+import os
+
+from core.data_loader import MarketDataLoader
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "core", "data", "historical", "BTCUSDT_4h.csv")
+
+
+def make_loader(limit=1000):
+    loader = MarketDataLoader(limit=limit)
+    loader.data_path = DATA_FILE
+    return loader
+
+
+def test_bounded_queries_return_short_results():
+    loader = make_loader()
+    df = loader.get_ohlcv(last_n=50)
+    assert len(df) == 50
+
+    full = loader.get_ohlcv()
+    start, end = full["timestamp"].iloc[10], full["timestamp"].iloc[29]
+    window = loader.get_ohlcv(start=start, end=end, columns=["close"])
+    assert len(window) == 20
+    assert list(window.columns) == ["timestamp", "close"]
+    assert window["close"].tolist() == full["close"].iloc[10:30].tolist()
+
+
+def test_unbounded_query_keeps_minimum_rows():
+    assert len(make_loader().get_ohlcv()) >= 100
+    assert make_loader(limit=50).get_ohlcv() is None
+    assert make_loader(limit=50).get_ohlcv(min_rows=0) is not None
+    assert make_loader().get_ohlcv(last_n=50, min_rows=100) is None
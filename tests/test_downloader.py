@@ -0,0 +1,124 @@
+# tests/test_downloader.py
+# 下载器的断点续传：在带随机失败和缺失 K 线的本地模拟交易所上下载一段历史，
+# 中途中断后从检查点续传，检查存储内容与交易所一致；交易所补上缺失的 K 线后，增量同步补齐所有缺口。
+# 默认存储路径不能是 CSV 的同名列式文件（否则 read_ohlcv 会读到下载的部分数据），--fake 不能写入默认路径。
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_store import OHLCVStore, read_ohlcv, store_path_for, to_epoch_ms
+from core.downloader import HistoricalDownloader, find_gaps
+from core.fake_exchange import FakeExchange
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+CSV_FILE = os.path.join(ROOT, "core", "data", "historical", "BTCUSDT_4h.csv")
+START, END = "2023-01-01", "2023-03-01"
+STEP = 60 * 60 * 1000
+
+
+class InterruptAfter:
+    """在 calls 次请求之后所有请求都失败，模拟下载进程中途中断"""
+
+    def __init__(self, exchange, calls):
+        self.exchange = exchange
+        self.remaining = calls
+
+    def fetch_ohlcv(self, *args, **kwargs):
+        self.remaining -= 1
+        if self.remaining < 0:
+            raise ConnectionError("interrupted")
+        return self.exchange.fetch_ohlcv(*args, **kwargs)
+
+
+def make_downloader(exchange, tmp_path, max_workers):
+    return HistoricalDownloader(exchange, "BTC/USDT", "1h", store_path=str(tmp_path / "BTCUSDT_1h.arrow"),
+                                page_limit=100, pages_per_chunk=2, max_workers=max_workers, rate=10000,
+                                max_retries=10, backoff=0.0)
+
+
+@pytest.fixture
+def exchange():
+    start_ms = int(to_epoch_ms([START])[0])
+    missing = {start_ms + k * STEP for k in (5, 6, 7, 450, 1000)}
+    return FakeExchange("1h", start=START, end="2023-02-28 23:00", seed=3, fail_rate=0.2, missing=missing)
+
+
+def test_interrupted_download_resumes_from_checkpoints(exchange, tmp_path):
+    interrupted = make_downloader(InterruptAfter(exchange, calls=12), tmp_path, max_workers=1)
+    with pytest.raises(ConnectionError):
+        interrupted.download(START, END)
+    chunks = interrupted.plan_chunks(*(int(v) for v in to_epoch_ms([START, END])))
+    finished = [c for c in chunks if os.path.exists(interrupted._checkpoint_path(c))]
+    assert 0 < len(finished) < len(chunks)
+    assert not interrupted.store.exists()
+
+    resumed = make_downloader(exchange, tmp_path, max_workers=4)
+    total = resumed.download(START, END)
+    assert not os.path.exists(resumed.checkpoint_dir)
+    # 已完成的分块不再请求：每个未完成分块 2 页，失败重试额外计数
+    calls_per_chunk = resumed.requests / (len(chunks) - len(finished))
+    assert calls_per_chunk < 2 / (1 - exchange.fail_rate) + 1
+
+    start_ms, end_ms = (int(v) for v in to_epoch_ms([START, END]))
+    expected = np.array([ts for ts in range(start_ms, end_ms, STEP) if ts not in exchange.missing])
+    stored = OHLCVStore(resumed.store_path).read(as_datetime=False)
+    assert total == len(expected)
+    np.testing.assert_array_equal(stored["timestamp"].to_numpy(), expected)
+    candles = np.array([exchange.candle(ts)[1:] for ts in expected])
+    np.testing.assert_allclose(stored[["open", "high", "low", "close", "volume"]].to_numpy(), candles)
+
+    # 只剩交易所缺失的 K 线形成的缺口
+    assert find_gaps(expected, STEP) == find_gaps(stored["timestamp"], STEP)
+    assert len(find_gaps(stored["timestamp"], STEP)) == 3
+
+
+def test_sync_fills_gaps_once_exchange_has_data(exchange, tmp_path):
+    downloader = make_downloader(exchange, tmp_path, max_workers=4)
+    downloader.download(START, END)
+    assert find_gaps(downloader.store.read_arrays(["timestamp"])["timestamp"], STEP)
+
+    exchange.missing.clear() # 交易所补上了之前缺失的 K 线
+    added = downloader.sync(fill_gaps=True)
+    timestamps = downloader.store.read_arrays(["timestamp"])["timestamp"]
+    assert added == 5
+    assert find_gaps(timestamps, STEP) == []
+    assert len(np.unique(timestamps)) == len(timestamps)
+
+
+def test_default_store_does_not_shadow_csv(exchange, tmp_path, monkeypatch):
+    historical = tmp_path / "core" / "data" / "historical"
+    historical.mkdir(parents=True)
+    csv_path = historical / "BTCUSDT_1h.csv"
+    csv_path.write_bytes(open(CSV_FILE, "rb").read())
+    monkeypatch.chdir(tmp_path)
+    before = read_ohlcv(str(csv_path.relative_to(tmp_path)))
+
+    downloader = HistoricalDownloader(exchange, "BTC/USDT", "1h", page_limit=100, max_workers=4,
+                                      rate=10000, max_retries=10, backoff=0.0)
+    downloader.download(START, END)
+    assert downloader.store_path != store_path_for(str(csv_path.relative_to(tmp_path)))
+    pd.testing.assert_frame_equal(read_ohlcv(str(csv_path.relative_to(tmp_path))), before)
+
+
+def test_csv_shadow_store_is_seeded_from_csv(exchange, tmp_path):
+    csv_path = tmp_path / "BTCUSDT_1h.csv"
+    csv = pd.read_csv(CSV_FILE)
+    csv.to_csv(csv_path, index=False)
+    downloader = make_downloader(exchange, tmp_path, max_workers=4)
+    assert downloader.store_path == store_path_for(str(csv_path))
+
+    downloader.download(START, END)
+    assert len(read_ohlcv(str(csv_path))) == len(downloader.store) > len(csv)
+    stored = downloader.store.read(as_datetime=False)
+    assert set(to_epoch_ms(csv["timestamp"])) <= set(stored["timestamp"])
+
+
+def test_fake_download_refuses_default_store():
+    result = subprocess.run([sys.executable, "download_data.py", "--fake"], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "--store" in result.stderr
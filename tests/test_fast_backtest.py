@@ -0,0 +1,57 @@
+# tests/test_fast_backtest.py
+# 快速回测与事件驱动回测的一致性：在分段数据文件上分别运行 collect_signals + run_fast_backtest 和 BacktestEngine，
+# 两者的交易记录（入场 / 出场时间、成交价、数量、盈亏）必须相同。
+# 第 4 段的回测起点恰好是一根止损 K 线上的训练点，引擎跳过该次训练，快速回测的模型轨迹必须与之一致。
+
+import contextlib
+import io
+import os
+
+import numpy as np
+import pytest
+
+from core.backtest_engine import BacktestEngine
+from core.config_loader import load_config
+from core.data_store import read_ohlcv
+from core.executor import TradeExecutor
+from core.fast_backtest import collect_signals, run_fast_backtest
+from core.risk_manager import RiskManager
+from core.signal_generator import SignalGenerator
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "core", "data", "historical")
+SPLIT_FILES = [f"BTCUSDT_4h_split_part_{k}.csv" for k in (1, 2, 3, 4)]
+
+
+def run_event_backtest(df, config, start_index, tmp_path):
+    signal_generator = SignalGenerator(config)
+    executor = TradeExecutor(config, simulate=True, df=df)
+    risk = RiskManager(config)
+    risk.pause_log = str(tmp_path / "drawdown_monitor.log")
+    signal_generator.predictor.train_rolling(df.iloc[:start_index])
+    engine = BacktestEngine(df, config, signal_generator, executor, risk, start_index=start_index,
+                            window_length=start_index, retrain_interval=config["ai_model"]["retrain_interval"])
+    return engine.run(), risk
+
+
+@pytest.mark.parametrize("name", SPLIT_FILES)
+def test_fast_backtest_matches_event_engine(name, tmp_path):
+    config = load_config()
+    df = read_ohlcv(os.path.join(DATA_DIR, name))
+    start_index = config["ai_model"]["window_size"] + 20
+    with contextlib.redirect_stdout(io.StringIO()):
+        signals = collect_signals(df, config, start_index)
+        summary, trades = run_fast_backtest(df, signals, config, start_index=start_index, return_trades=True)
+        logs, risk = run_event_backtest(df, config, start_index, tmp_path)
+
+    timestamps = df["timestamp"].astype(str).tolist()
+    buys = [log for log in logs if log["action"] == "buy"]
+    sells = [log for log in logs if log["action"] == "sell"]
+    assert [str(log["timestamp"]) for log in buys] == [timestamps[t["entry_index"]] for t in trades]
+    closed = [t for t in trades if t["pnl"] is not None]
+    assert [str(log["timestamp"]) for log in sells] == [timestamps[t["exit_index"]] for t in closed]
+    np.testing.assert_allclose([log["price"] for log in buys], [t["entry_price"] for t in trades])
+    np.testing.assert_allclose([log["amount"] for log in buys], [t["amount"] for t in trades])
+    np.testing.assert_allclose([log["price"] for log in sells], [t["exit_price"] for t in closed])
+    np.testing.assert_allclose([log["pnl"] for log in sells], [t["pnl"] for t in closed])
+    assert summary["num_trades"] == len(sells)
+    assert summary["final_balance"] == pytest.approx(risk.current_balance)
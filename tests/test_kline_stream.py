@@ -0,0 +1,153 @@
+# tests/test_kline_stream.py
+# KlineStream 接本地回放服务器 (core/replay_server.py)：收盘消息只计数一次、未收盘的中间消息只更新 latest；
+# 断线重连后服务端从头重放时，重复的收盘 K 线（包括断线前最后一根）被忽略；
+# 断线期间错过的 K 线在重连后的第一条收盘消息到达时通过 REST (FakeExchange.fetch_ohlcv) 补齐，缓冲区没有缺口。
+
+import asyncio
+import socket
+
+import numpy as np
+import pandas as pd
+
+from core.data_store import to_epoch_ms
+from core.fake_exchange import FakeExchange
+from core.kline_stream import KlineStream
+from core.replay_server import serve_replay
+
+START = "2023-01-01"
+STEP = 4 * 60 * 60 * 1000
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def candles(exchange, count):
+    rows = [exchange.candle(exchange.start_ms + k * STEP) for k in range(count)]
+    return pd.DataFrame(rows, columns=["timestamp", "open", "high", "low", "close", "volume"]).assign(
+        timestamp=lambda d: pd.to_datetime(d["timestamp"], unit="ms"))
+
+
+class Recorder:
+    """on_close 回调：记录每次收盘时缓冲区最后一根 K 线，收盘数达到 wait_for 指定的数量后置位对应事件"""
+
+    def __init__(self):
+        self.closes = []
+        self.waiters = []
+
+    def wait_for(self, count):
+        event = asyncio.Event()
+        self.waiters.append((count, event))
+        return event
+
+    def __call__(self, stream):
+        self.closes.append(stream.last_closed_timestamp())
+        for count, event in self.waiters:
+            if stream.closed_count >= count:
+                event.set()
+
+
+async def run_until(stream, event, timeout=20):
+    task = asyncio.create_task(stream.run())
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    finally:
+        stream.stop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def make_stream(port, recorder, backfill=None):
+    return KlineStream("BTC/USDT", "4h", url=f"ws://127.0.0.1:{port}", capacity=100, on_close=recorder,
+                       backfill=backfill, reconnect_delay=0.05, max_reconnect_delay=0.2)
+
+
+def test_replay_closes_are_counted_once():
+    df = candles(FakeExchange("4h", start=START), 20)
+
+    async def scenario():
+        port = free_port()
+        recorder = Recorder()
+        stream = make_stream(port, recorder)
+        server = await serve_replay(df, port=port, interval=0.02, updates_per_candle=3)
+        try:
+            await run_until(stream, recorder.wait_for(len(df)))
+        finally:
+            server.close()
+            await server.wait_closed()
+        return stream, recorder
+
+    stream, recorder = asyncio.run(scenario())
+    expected = to_epoch_ms(df["timestamp"]).tolist()
+    assert stream.closed_count == len(df)
+    assert recorder.closes == expected
+    frame = stream.frame()
+    np.testing.assert_allclose(frame[["open", "high", "low", "close", "volume"]].to_numpy(),
+                               df[["open", "high", "low", "close", "volume"]].to_numpy())
+    assert stream.latest[0] == expected[-1]
+
+
+def test_reconnect_replay_ignores_duplicate_closes():
+    df = candles(FakeExchange("4h", start=START), 20)
+
+    async def scenario():
+        port = free_port()
+        recorder = Recorder()
+        stream = make_stream(port, recorder)
+        first = await serve_replay(df.iloc[:10], port=port, interval=0.02)
+        task = asyncio.create_task(run_until(stream, recorder.wait_for(len(df))))
+        await asyncio.wait_for(recorder.wait_for(10).wait(), 20)
+        first.close() # 断开连接；新服务器从第 6 根开始重放，第 6~10 根（含断线前最后一根）都是重复的收盘消息
+        await first.wait_closed()
+        second = await serve_replay(df.iloc[5:], port=port, interval=0.02)
+        try:
+            await task
+        finally:
+            second.close()
+            await second.wait_closed()
+        return stream, recorder
+
+    stream, recorder = asyncio.run(scenario())
+    expected = to_epoch_ms(df["timestamp"]).tolist()
+    assert stream.closed_count == len(df)
+    assert recorder.closes == expected
+    assert stream.frame()["close"].tolist() == df["close"].tolist()
+
+
+def test_dropped_connection_is_backfilled_without_gaps():
+    exchange = FakeExchange("4h", start=START, end="2023-01-05 20:00")
+    df = candles(exchange, 30)
+    requests = []
+
+    def backfill(since):
+        requests.append(since)
+        return exchange.fetch_ohlcv("BTC/USDT", "4h", since=since, limit=100)
+
+    async def scenario():
+        port = free_port()
+        recorder = Recorder()
+        stream = make_stream(port, recorder, backfill=backfill)
+        first = await serve_replay(df.iloc[:12], port=port, interval=0.02)
+        task = asyncio.create_task(run_until(stream, recorder.wait_for(22)))
+        await asyncio.wait_for(recorder.wait_for(12).wait(), 20)
+        first.close() # 断线期间第 13~20 根收盘，重连后直接收到第 21 根
+        await first.wait_closed()
+        second = await serve_replay(df.iloc[20:], port=port, interval=0.02)
+        try:
+            await task
+        finally:
+            second.close()
+            await second.wait_closed()
+        return stream, recorder
+
+    stream, recorder = asyncio.run(scenario())
+    expected = to_epoch_ms(df["timestamp"]).tolist()
+    assert requests == [expected[12]]
+    assert stream.closed_count == 22 # 补齐的 K 线不触发收盘回调
+    assert recorder.closes == expected[:12] + expected[20:]
+    timestamps = np.asarray(to_epoch_ms(stream.frame()["timestamp"]))
+    np.testing.assert_array_equal(timestamps, expected)
+    np.testing.assert_array_equal(np.diff(timestamps), STEP)
+    assert stream.frame()["close"].tolist() == df["close"].tolist()
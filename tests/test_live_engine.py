@@ -0,0 +1,150 @@
+# tests/test_live_engine.py
+# LiveEngine 的行情 -> 决策 -> 下单链路：FakeExchange 提供预热 K 线、账户和订单，本地回放服务器推送之后的收盘 K 线，
+# 按脚本给出买入 / 卖出信号。纸面模式由模拟执行器立即成交；实盘模式通过 FakeExchange 下单，
+# 持仓由订单跟踪循环根据成交量更新，账户中原有的基础货币不被卖出。
+# 耗时的信号计算（例如首次调用时训练模型）在线程中执行，不阻塞事件循环。
+
+import asyncio
+import socket
+import time
+
+import pandas as pd
+import pytest
+
+from core.config_loader import load_config
+from core.executor import TradeExecutor
+from core.fake_exchange import FakeExchange
+from core.live_engine import LiveEngine
+from core.replay_server import serve_replay
+from core.risk_manager import RiskManager
+
+START = "2023-01-01"
+STEP = 4 * 60 * 60 * 1000
+WARMUP = 250 # FakeExchange 上已收盘的 K 线数；回放从之后的 K 线开始
+SCRIPT = {1: "buy", 4: "sell", 7: "buy", 10: "sell"} # 第 n 根收盘 K 线上的信号
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ScriptedGenerator:
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, df, features=None):
+        self.calls += 1
+        action = SCRIPT.get(self.calls, "hold")
+        return {"action": action, "structure": "scripted", "confidence": 1.0}
+
+
+class SlowGenerator(ScriptedGenerator):
+    """第一次调用耗时 1 秒（模拟没有已保存模型时的首次训练）"""
+
+    def generate(self, df, features=None):
+        if self.calls == 0:
+            time.sleep(1.0)
+        return super().generate(df, features)
+
+
+class ListNotifier:
+    def __init__(self):
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+class SubmitExecutor(TradeExecutor):
+    """实盘执行器：把市价单提交到 FakeExchange，返回 submitted 状态，成交由 LiveEngine 的订单跟踪循环处理"""
+
+    def __init__(self, config, exchange):
+        super().__init__(config, simulate=False)
+        self.exchange = exchange
+
+    def execute(self, order):
+        result = self.exchange.create_order(order["symbol"], "market", order["action"], order["amount"])
+        return {"status": "submitted", "order_id": result["id"]}
+
+
+def replay_frame(exchange, first, count):
+    rows = [exchange.candle(exchange.start_ms + (first + k) * STEP) for k in range(count)]
+    return pd.DataFrame(rows, columns=["timestamp", "open", "high", "low", "close", "volume"]).assign(
+        timestamp=lambda d: pd.to_datetime(d["timestamp"], unit="ms"))
+
+
+def run_engine(paper, balance=None, closes=12, generator=None):
+    exchange = FakeExchange("4h", start=START, balance=balance)
+    exchange.end_ms = exchange.start_ms + (WARMUP - 1) * STEP
+    df = replay_frame(exchange, WARMUP, closes)
+
+    async def scenario():
+        port = free_port()
+        config = load_config().with_overrides({
+            "live.mode": "stream", "live.ws_url": f"ws://127.0.0.1:{port}", "live.balance_interval": 0.1,
+            "live.order_poll_interval": 0.05, "risk.max_position_risk_pct": 0.002,
+        })
+        executor = TradeExecutor(config, simulate=True) if paper else SubmitExecutor(config, exchange)
+        engine = LiveEngine(config, exchange, generator or ScriptedGenerator(), executor, RiskManager(config), ListNotifier())
+        on_close = engine.stream.on_close
+
+        async def stop_after_last(stream):
+            await on_close(stream)
+            if stream.closed_count >= closes:
+                engine.stop()
+        engine.stream.on_close = stop_after_last
+
+        async def heartbeat():
+            # 记录事件循环两次调度之间的最长间隔
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.02)
+                now = time.perf_counter()
+                engine.max_loop_gap = max(getattr(engine, "max_loop_gap", 0.0), now - last)
+                last = now
+
+        server = await serve_replay(df, port=port, interval=0.2)
+        beat = asyncio.create_task(heartbeat())
+        try:
+            await asyncio.wait_for(engine.run(), 30)
+            await asyncio.gather(*engine._tasks, return_exceptions=True)
+        finally:
+            beat.cancel()
+            server.close()
+            await server.wait_closed()
+        return engine, exchange
+
+    return asyncio.run(scenario())
+
+
+def test_paper_engine_trades_on_stream_closes():
+    engine, exchange = run_engine(paper=True)
+    assert engine.stream.closed_count == 12
+    assert engine.signal_generator.calls == 12
+    fills = [m for m in engine.notifier.messages if m.startswith("✅ Paper")]
+    assert [m.split()[2] for m in fills] == ["BUY", "SELL", "BUY", "SELL"]
+    assert engine.holdings == 0.0
+    assert engine.risk.current_balance != pytest.approx(engine.initial_balance)
+    assert exchange.orders == {}
+
+
+def test_live_engine_places_orders_through_exchange():
+    engine, exchange = run_engine(paper=False, balance={"USDT": 10000.0, "BTC": 0.5})
+    orders = list(exchange.orders.values())
+    assert [o["side"] for o in orders] == ["buy", "sell", "buy", "sell"]
+    assert orders[0]["amount"] == orders[1]["amount"] > 0
+    assert orders[2]["amount"] == orders[3]["amount"] > 0
+    assert engine.pending_orders == {}
+    assert engine.holdings == 0.0
+    assert exchange.balance["BTC"] == pytest.approx(0.5) # 账户原有的 BTC 不属于策略持仓，不会被卖出
+    assert engine.account_holdings == pytest.approx(0.5)
+
+
+def test_slow_decision_does_not_block_event_loop():
+    engine, exchange = run_engine(paper=False, generator=SlowGenerator())
+    assert engine.max_loop_gap < 0.5
+    # 慢决策期间到达的收盘消息之后按顺序逐根处理（期间积压的信号可能因订单未终结被跳过）
+    assert engine.signal_generator.calls == 12
+    assert list(exchange.orders.values())[0]["side"] == "buy"
@@ -0,0 +1,69 @@
+# tests/test_streaming_indicators.py
+# 流式指标与批量指标的一致性：把自带的 4h 历史数据逐根喂给 IndicatorState.update，
+# 每根 K 线的输出都必须与 utils/indicators.py 中批量函数在整段数据上的结果一致。
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_store import read_ohlcv
+from utils.indicators import calc_macd, calc_stochrsi, calculate_adx, calculate_bollinger_bands, calculate_rsi
+from utils.streaming_indicators import IndicatorState
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "..", "core", "data", "historical", "BTCUSDT_4h.csv")
+RTOL = 1e-9
+
+
+@pytest.fixture(scope="module")
+def history():
+    return read_ohlcv(DATA_FILE)
+
+
+@pytest.fixture(scope="module")
+def streamed(history):
+    state = IndicatorState()
+    rows = [dict(state.update(bar)) for bar in history[["open", "high", "low", "close", "volume"]].to_dict("records")]
+    assert state.bars_seen == len(history)
+    return pd.DataFrame(rows, index=history.index)
+
+
+def assert_parity(streamed_values, batch_values):
+    np.testing.assert_allclose(streamed_values.to_numpy(dtype=float), batch_values.to_numpy(dtype=float),
+                               rtol=RTOL, atol=1e-9, equal_nan=True)
+
+
+def test_rsi(history, streamed):
+    assert_parity(streamed["rsi"], calculate_rsi(history["close"]))
+
+
+def test_bollinger_bands(history, streamed):
+    bands = calculate_bollinger_bands(history)
+    for name in ("ma", "std", "upper", "lower"):
+        assert_parity(streamed[name], bands[name])
+    assert_parity(streamed["bb_width"], (bands["upper"] - bands["lower"]) / bands["ma"])
+
+
+def test_adx(history, streamed):
+    assert_parity(streamed["adx"], calculate_adx(history))
+
+
+def test_macd(history, streamed):
+    macd, macd_signal, macd_hist = calc_macd(history["close"])
+    assert_parity(streamed["macd"], macd)
+    assert_parity(streamed["macd_signal"], macd_signal)
+    assert_parity(streamed["macd_hist"], macd_hist)
+
+
+def test_stoch_rsi(history, streamed):
+    assert_parity(streamed["stoch_rsi"], calc_stochrsi(history["close"]))
+
+
+def test_from_history_matches_incremental_updates(history, streamed):
+    """预热 + 继续逐根更新与从头逐根更新得到相同的状态"""
+    split = len(history) // 2
+    state, warm = IndicatorState.from_history(history.iloc[:split])
+    assert_parity(warm["adx"], streamed["adx"].iloc[:split])
+    tail = [state.update(bar) for bar in history.iloc[split:][["open", "high", "low", "close", "volume"]].to_dict("records")]
+    assert_parity(pd.DataFrame(tail)["macd"], streamed["macd"].iloc[split:].reset_index(drop=True))
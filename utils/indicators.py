@@ -110,6 +110,87 @@ def calculate_pattern_probability(df, pattern_func, lookback=5):
     avg_change = np.mean(pattern_occurrences)
     return up_prob, avg_change
 
+# 向量化形态引擎：一次性计算整段序列的形态掩码和条件概率
+def detect_pattern_masks(df):
+    """
+    一次性计算整段数据的 K 线形态布尔掩码。
+    第 i 行的结果与 detect_xxx(df.iloc[:i+1]) 完全一致。
+    返回包含 hammer / doji / bullish_engulfing / bearish_engulfing 四列的 DataFrame。
+    """
+    open_ = df['open'].to_numpy(dtype=float)
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+    n = len(df)
+    idx = np.arange(n)
+
+    body = np.abs(close - open_)
+    lower_shadow = np.minimum(open_, close) - low
+    upper_shadow = high - np.maximum(open_, close)
+    candle_range = high - low
+
+    # 锤头线：前 4 根收盘价（不含当前）的涨跌幅之和 < -2%，至少需要 5 根 K 线
+    trend = df['close'].pct_change().rolling(3, min_periods=1).sum().shift(1).to_numpy(dtype=float)
+    hammer = (lower_shadow > 2 * body) & (upper_shadow < body) & (body > 0) & (trend < -0.02) & (idx >= 4)
+
+    doji = (body < 0.05 * candle_range) & (candle_range > 0)
+
+    prev_open = np.roll(open_, 1)
+    prev_close = np.roll(close, 1)
+    has_prev = idx >= 1
+    bullish = has_prev & (prev_close < prev_open) & (close > open_) & (open_ <= prev_close) & (close >= prev_open)
+    bearish = has_prev & (prev_close > prev_open) & (close < open_) & (open_ >= prev_close) & (close <= prev_open)
+
+    return pd.DataFrame({
+        'hammer': hammer,
+        'doji': doji,
+        'bullish_engulfing': bullish,
+        'bearish_engulfing': bearish,
+    }, index=df.index)
+
+def rolling_pattern_probability(df, mask, lookback=5):
+    """
+    calculate_pattern_probability 的向量化版本。
+    mask 为形态布尔序列；返回 (up_prob, avg_change) 两个与 df 等长的 Series，
+    第 t 行只使用在 t 时刻已经实现的未来收益（形态位置 i <= t - lookback），
+    最后一行与 calculate_pattern_probability(df, ...) 的标量结果一致。
+    """
+    close = df['close'].to_numpy(dtype=float)
+    mask = np.asarray(mask, dtype=bool)
+    n = len(close)
+
+    hits = np.zeros(n, dtype=float)
+    ups = np.zeros(n, dtype=float)
+    changes = np.zeros(n, dtype=float)
+    if n > lookback:
+        current = close[:-lookback]
+        future = close[lookback:]
+        change = (future - current) / current
+        occurred = mask[:-lookback]
+        # 第 i 根的形态在第 i + lookback 根时才知道结果
+        hits[lookback:] = occurred
+        ups[lookback:] = occurred & (change > 0)
+        changes[lookback:] = np.where(occurred, change, 0.0)
+
+    count = np.cumsum(hits)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        up_prob = np.where(count > 0, np.cumsum(ups) / count, 0.0)
+        avg_change = np.where(count > 0, np.cumsum(changes) / count, 0.0)
+    return pd.Series(up_prob, index=df.index), pd.Series(avg_change, index=df.index)
+
+def calculate_pattern_probabilities(df, lookback=5):
+    """
+    计算所有内置形态的滚动条件概率，返回 DataFrame：
+    hammer_up_prob / doji_up_prob / engulfing_up_prob / engulfing_down_prob
+    """
+    masks = detect_pattern_masks(df)
+    result = pd.DataFrame(index=df.index)
+    result['hammer_up_prob'], _ = rolling_pattern_probability(df, masks['hammer'], lookback)
+    result['doji_up_prob'], _ = rolling_pattern_probability(df, masks['doji'], lookback)
+    result['engulfing_up_prob'], _ = rolling_pattern_probability(df, masks['bullish_engulfing'], lookback)
+    result['engulfing_down_prob'], _ = rolling_pattern_probability(df, masks['bearish_engulfing'], lookback)
+    return result
+
 # 新增：从 signal_generator.py 移动来的函数
 def calc_macd(close, fast=12, slow=26, signal=9):
     exp1 = close.ewm(span=fast, adjust=False).mean()
@@ -0,0 +1,220 @@
+# utils/streaming_indicators.py
+# 增量（流式）指标引擎：每来一根新 K 线只做 O(1) 更新，
+# 数值上与 utils/indicators.py 中的批量函数保持一致（同样的滚动均值 / EMA 定义）。
+
+from collections import deque
+import math
+
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+
+def _safe_div(a, b):
+    """按 pandas/numpy 语义做除法：x/0 -> ±inf，0/0 -> NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.float64(a) / np.float64(b))
+
+
+class RollingWindow:
+    """固定长度滑动窗口，维护运行和，窗口内出现 NaN 时返回 NaN（等价于 pandas rolling 的默认 min_periods）"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.nan_count = 0
+
+    def push(self, value):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if math.isnan(old):
+                self.nan_count -= 1
+            else:
+                self.total -= old
+        self.values.append(value)
+        if math.isnan(value):
+            self.nan_count += 1
+        else:
+            self.total += value
+
+    @property
+    def ready(self):
+        return len(self.values) == self.window and self.nan_count == 0
+
+    def mean(self):
+        return self.total / self.window if self.ready else NAN
+
+    def std(self):
+        # 窗口长度是常数，直接对缓冲区求样本标准差，避免运行平方和的精度损失
+        return float(np.std(self.values, ddof=1)) if self.ready else NAN
+
+    def min(self):
+        return min(self.values) if self.ready else NAN
+
+    def max(self):
+        return max(self.values) if self.ready else NAN
+
+
+class EMA:
+    """与 Series.ewm(span=..., adjust=False).mean() 一致的指数移动平均"""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = NAN
+
+    def update(self, x):
+        if math.isnan(self.value):
+            self.value = x
+        elif not math.isnan(x):
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+
+class StreamingRSI:
+    """calculate_rsi 的流式版本（简单滚动均值，非 Wilder 平滑）"""
+
+    def __init__(self, window=14):
+        self.gains = RollingWindow(window)
+        self.losses = RollingWindow(window)
+        self.prev_close = None
+
+    def update(self, close):
+        if self.prev_close is None:
+            # delta.where(delta > 0, 0) 会把首个 NaN 差分也替换为 0
+            gain = loss = 0.0
+        else:
+            delta = close - self.prev_close
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+        self.prev_close = close
+        self.gains.push(gain)
+        self.losses.push(loss)
+        rs = _safe_div(self.gains.mean(), self.losses.mean())
+        return 100 - _safe_div(100, 1 + rs)
+
+
+class StreamingBollinger:
+    """calculate_bollinger_bands 的流式版本，返回 (ma, std, upper, lower)"""
+
+    def __init__(self, window=20, num_std=2):
+        self.closes = RollingWindow(window)
+        self.num_std = num_std
+
+    def update(self, close):
+        self.closes.push(close)
+        ma = self.closes.mean()
+        std = self.closes.std()
+        return ma, std, ma + self.num_std * std, ma - self.num_std * std
+
+
+class StreamingADX:
+    """calculate_adx 的流式版本（TR / DM / DX 均为简单滚动均值）"""
+
+    def __init__(self, period=14):
+        self.tr = RollingWindow(period)
+        self.plus_dm = RollingWindow(period)
+        self.minus_dm = RollingWindow(period)
+        self.dx = RollingWindow(period)
+        self.prev_high = None
+        self.prev_low = None
+        self.prev_close = None
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            plus_dm = minus_dm = NAN
+            tr = high - low
+        else:
+            plus_dm = max(high - self.prev_high, 0.0)
+            minus_dm = abs(min(low - self.prev_low, 0.0))
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+
+        self.tr.push(tr)
+        self.plus_dm.push(plus_dm)
+        self.minus_dm.push(minus_dm)
+
+        atr = self.tr.mean()
+        plus_di = 100 * _safe_div(self.plus_dm.mean(), atr)
+        minus_di = 100 * _safe_div(self.minus_dm.mean(), atr)
+        dx = _safe_div(abs(plus_di - minus_di), plus_di + minus_di) * 100
+        self.dx.push(dx)
+        return self.dx.mean()
+
+
+class StreamingMACD:
+    """calc_macd 的流式版本，返回 (macd, macd_signal, macd_hist)"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, close):
+        macd = self.fast.update(close) - self.slow.update(close)
+        macd_signal = self.signal.update(macd)
+        return macd, macd_signal, macd - macd_signal
+
+
+class StreamingStochRSI:
+    """calc_stochrsi 的流式版本"""
+
+    def __init__(self, rsi_period=14, stoch_period=14):
+        self.rsi = StreamingRSI(rsi_period)
+        self.history = RollingWindow(stoch_period)
+
+    def update(self, close):
+        rsi = self.rsi.update(close)
+        self.history.push(rsi)
+        lo, hi = self.history.min(), self.history.max()
+        return _safe_div(rsi - lo, hi - lo)
+
+
+class IndicatorState:
+    """
+    汇总所有流式指标的状态对象。
+    每根新 K 线调用一次 update(bar)，以 O(1) 的代价返回最新指标值字典，
+    字段名与 SignalGenerator / AIPredictor 中使用的列名一致。
+    """
+
+    def __init__(self, rsi_window=14, bb_window=20, bb_std=2, adx_period=14,
+                 macd_fast=12, macd_slow=26, macd_signal=9, stoch_period=14):
+        self.rsi = StreamingRSI(rsi_window)
+        self.bollinger = StreamingBollinger(bb_window, bb_std)
+        self.adx = StreamingADX(adx_period)
+        self.macd = StreamingMACD(macd_fast, macd_slow, macd_signal)
+        self.stoch_rsi = StreamingStochRSI(rsi_window, stoch_period)
+        self.bars_seen = 0
+        self.latest = {}
+
+    def update(self, bar):
+        """bar: 包含 open/high/low/close/volume 的 dict 或 Series"""
+        high = float(bar["high"])
+        low = float(bar["low"])
+        close = float(bar["close"])
+
+        ma, std, upper, lower = self.bollinger.update(close)
+        macd, macd_signal, macd_hist = self.macd.update(close)
+        self.latest = {
+            "rsi": self.rsi.update(close),
+            "ma": ma,
+            "std": std,
+            "upper": upper,
+            "lower": lower,
+            "bb_width": _safe_div(upper - lower, ma),
+            "adx": self.adx.update(high, low, close),
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "macd_hist": macd_hist,
+            "stoch_rsi": self.stoch_rsi.update(close),
+        }
+        self.bars_seen += 1
+        return self.latest
+
+    @classmethod
+    def from_history(cls, df, **kwargs):
+        """用历史数据预热状态（例如实盘启动时），返回 (state, 每根K线的指标 DataFrame)"""
+        state = cls(**kwargs)
+        rows = [state.update(bar) for bar in df[["open", "high", "low", "close", "volume"]].to_dict("records")]
+        return state, pd.DataFrame(rows, index=df.index)